@@ -0,0 +1,136 @@
+"""
+Benchmark de sincronización con Drive contra el servidor local de
+benchmarks/fake_drive.py (no toca el Drive real ni la base de datos).
+
+Por cada tamaño de biblioteca crea canciones sintéticas y mide, a través del
+planificador igual que las vistas:
+    download_all_files (en frío y sin cambios), upload_kfn,
+    verificar_audio y clean_drive.
+
+Uso:
+    python benchmarks/bench_drive_sync.py [--canciones 10,100,1000] [--kb 256]
+                                          [--latencia 20] [--limite 0.02] [--rps 0]
+
+Reporta por operación: tiempo total, operaciones/s, MB/s servidos por el
+Drive simulado, latencia p50/p95 y cantidad de respuestas fallidas.
+
+El limitador de la aplicación sigue activo (DRIVE_RATE, por defecto 10
+peticiones/s); para medir el servidor y no el limitador, súbalo:
+    DRIVE_RATE=200 DRIVE_RATE_MAX=500 python benchmarks/bench_drive_sync.py
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fake_drive import FakeDrive, sembrar_biblioteca  # noqa: E402
+
+
+def _preparar_entorno(base_dir: str, url: str, **ajustes):
+    os.environ["DRIVE_API_ENDPOINT"] = url
+    os.environ["PATH_LOGS"] = os.path.join(base_dir, "logs")
+    os.environ["PATH_JOBS"] = ""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ms_karafun.settings")
+    import django
+    from django.conf import settings
+    try:
+        django.setup()
+    except ModuleNotFoundError:
+        # Sin settings del proyecto: basta una configuración mínima sin base de datos.
+        settings.configure(DATABASES={}, INSTALLED_APPS=[], USE_TZ=True, **ajustes)
+        django.setup()
+
+
+def _percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method="inclusive")[int(p) - 1]
+
+
+def _medir(drive: FakeDrive, nombre: str, fn, keys: list) -> dict:
+    from karafun_manager.utils.scheduler import get_scheduler, DRIVE
+    latencias = []
+
+    def tarea(key):
+        inicio = time.perf_counter()
+        resultado = fn(key)
+        latencias.append(time.perf_counter() - inicio)
+        ok = resultado if isinstance(resultado, bool) else bool(resultado and resultado.get("success"))
+        return ok
+
+    enviados = drive.metricas["bytes_enviados"] + drive.metricas["bytes_recibidos"]
+    peticiones = drive.metricas["peticiones"]
+    inicio = time.perf_counter()
+    resultados = get_scheduler().map(DRIVE, tarea, keys)
+    total = time.perf_counter() - inicio
+    movidos = drive.metricas["bytes_enviados"] + drive.metricas["bytes_recibidos"] - enviados
+    return {
+        "operacion": nombre,
+        "canciones": len(keys),
+        "total_s": total,
+        "ops_s": len(keys) / total if total else 0.0,
+        "mb_s": movidos / total / (1024 * 1024) if total else 0.0,
+        "p50_ms": _percentil(latencias, 50) * 1000,
+        "p95_ms": _percentil(latencias, 95) * 1000,
+        "peticiones": drive.metricas["peticiones"] - peticiones,
+        "fallidas": resultados.count(False),
+    }
+
+
+def ejecutar(tamanos: list, kb: int, latencia: float, limite: float, rps: float) -> list:
+    base_dir = tempfile.mkdtemp(prefix="bench_drive_")
+    drive = FakeDrive(latencia, limite, rps)
+    url = drive.iniciar()
+    _preparar_entorno(base_dir, url)
+    from karafun_manager.repositories import cancion_repository
+    from karafun_manager.utils import drive_manager
+    filas = []
+    for n in tamanos:
+        drive.reiniciar()
+        path_main = os.path.join(base_dir, f"songs_{n}")
+        os.makedirs(path_main, exist_ok=True)
+        os.environ["PATH_MAIN"] = path_main
+        parent_id, keys = sembrar_biblioteca(drive, n, kb, prefijo=f"B{n}_")
+        # Sin base de datos: se precarga el parámetro de la carpeta kia_songs.
+        cancion_repository.CancionRepository.invalidar_parametros()
+        cancion_repository._parametros.obtener("kia_folder", lambda: parent_id, 10 ** 9)
+        drive_manager.precargar_carpetas(keys)
+        filas.append(_medir(drive, "download_all_files", drive_manager.download_all_files, keys))
+        filas.append(_medir(drive, "download_all_files (sin cambios)", drive_manager.download_all_files, keys))
+        for key in keys:
+            with open(os.path.join(path_main, key, "kara_fun.kfn"), "ab") as f:
+                f.write(os.urandom(1024))
+        filas.append(_medir(drive, "upload_kfn", drive_manager.upload_kfn, keys))
+        filas.append(_medir(drive, "upload_kfn (sin cambios)", drive_manager.upload_kfn, keys))
+        filas.append(_medir(drive, "verificar_audio", lambda key: drive_manager.verificar_audio(key, 6), keys))
+        filas.append(_medir(drive, "clean_drive", lambda key: drive_manager.clean_drive(key, 1), keys))
+    drive.detener()
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de drive_manager contra un Drive simulado.")
+    parser.add_argument("--canciones", default="10,100,1000", help="tamaños de biblioteca separados por coma")
+    parser.add_argument("--kb", type=int, default=256, help="tamaño de cada audio/KFN sintético")
+    parser.add_argument("--latencia", type=float, default=20, help="ms añadidos por el servidor a cada petición")
+    parser.add_argument("--limite", type=float, default=0.0, help="probabilidad de 429/403 de cuota")
+    parser.add_argument("--rps", type=float, default=0, help="peticiones/s aceptadas por el servidor (0 = sin límite)")
+    args = parser.parse_args()
+    tamanos = [int(t) for t in args.canciones.split(",") if t.strip()]
+    filas = ejecutar(tamanos, args.kb, args.latencia, args.limite, args.rps)
+    print()
+    print(f"{'operación':<34}{'n':>6}{'total s':>10}{'ops/s':>10}{'MB/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'pet.':>8}{'fallos':>8}")
+    for f in filas:
+        print(
+            f"{f['operacion']:<34}{f['canciones']:>6}{f['total_s']:>10.2f}{f['ops_s']:>10.1f}{f['mb_s']:>9.1f}"
+            f"{f['p50_ms']:>10.1f}{f['p95_ms']:>10.1f}{f['peticiones']:>8}{f['fallidas']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark del escritor de KFN: compara el escritor anterior (lee cada
+archivo completo en memoria) contra la copia por bloques de kfn_io.
+
+Uso:
+    python benchmarks/bench_kfn_writer.py [--mb 150] [--repeticiones 3]
+
+Cada escritor corre en un proceso independiente para medir su RSS máximo.
+"""
+import argparse
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from karafun_manager.utils.kfn_io import copiar_archivo  # noqa: E402
+
+MIEMBROS = [("fondo.jpg", 3, 0.05), ("main.mp3", 2, 0.5), ("no_vocals.mp3", 2, 0.45)]
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        pico = getattr(info, "peak_wset", None) or getattr(info, "peak_rss", None)
+        if pico:
+            return pico / (1024 * 1024)
+    except ImportError:
+        pass
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB, macOS bytes.
+    return maxrss / 1024 if sys.platform.startswith("linux") else maxrss / (1024 * 1024)
+
+
+def _write_header(f, archivos):
+    f.write(b"KFNB")
+    f.write(b"ENDH" + bytes([1]) + struct.pack("<I", 0xFFFFFFFF))
+    f.write(struct.pack("<I", len(archivos)))
+    offset = 0
+    for nombre, tipo, length in archivos:
+        n = nombre.encode("utf-8")
+        f.write(struct.pack("<I", len(n)) + n)
+        f.write(struct.pack("<IIIII", tipo, length, offset, length, 0))
+        offset += length
+
+
+def escritor_anterior(rutas, destino):
+    # Igual que antes: todo el contenido se carga antes de escribir.
+    contenidos = []
+    for ruta, tipo in rutas:
+        with open(ruta, "rb") as f:
+            contenidos.append((os.path.basename(ruta), tipo, f.read()))
+    with open(destino, "wb") as f:
+        _write_header(f, [(n, t, len(c)) for n, t, c in contenidos])
+        for _, _, c in contenidos:
+            f.write(c)
+
+
+def escritor_streaming(rutas, destino):
+    archivos = [(os.path.basename(r), t, os.stat(r).st_size) for r, t in rutas]
+    with open(destino, "wb") as f:
+        _write_header(f, archivos)
+        for (ruta, _), (_, _, length) in zip(rutas, archivos):
+            copiar_archivo(f, ruta, length)
+
+
+def _run(nombre, rutas, destino, cola):
+    escritor = escritor_anterior if nombre == "anterior" else escritor_streaming
+    inicio = time.perf_counter()
+    escritor(rutas, destino)
+    cola.put((time.perf_counter() - inicio, _peak_rss_mb()))
+
+
+def _crear_fuentes(directorio, total_mb):
+    rutas = []
+    bloque = os.urandom(1024 * 1024)
+    for nombre, tipo, fraccion in MIEMBROS:
+        ruta = os.path.join(directorio, nombre)
+        with open(ruta, "wb") as f:
+            for _ in range(max(1, int(total_mb * fraccion))):
+                f.write(bloque)
+        rutas.append((ruta, tipo))
+    return rutas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=150, help="Tamaño total de los archivos fuente en MB")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        rutas = _crear_fuentes(tmp, args.mb)
+        print(f"Fuentes: {args.mb} MB en {len(rutas)} archivos")
+        print(f"{'escritor':<12}{'tiempo (s)':>12}{'RSS pico (MB)':>16}")
+        for nombre in ("anterior", "streaming"):
+            tiempos, picos = [], []
+            for i in range(args.repeticiones):
+                destino = os.path.join(tmp, f"{nombre}_{i}.kfn")
+                cola = ctx.Queue()
+                p = ctx.Process(target=_run, args=(nombre, rutas, destino, cola))
+                p.start()
+                tiempo, pico = cola.get()
+                p.join()
+                tiempos.append(tiempo)
+                picos.append(pico)
+                os.remove(destino)
+            print(f"{nombre:<12}{min(tiempos):>12.3f}{max(picos):>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Carga concurrente sobre la aplicación servida con WSGI (waitress) y con ASGI
+(uvicorn + views_async), contra el Drive simulado de benchmarks/fake_drive.py.
+
+Cada petición es un syncDrive de una sola key: casi todo su tiempo es espera
+de red, el caso en que ASGI no necesita un hilo por petición. Cada servidor
+corre en su propio proceso; se mide peticiones/s, latencia p50/p95, errores
+y los hilos máximos del proceso del servidor.
+
+Uso:
+    python benchmarks/bench_servidor.py [--canciones 50] [--peticiones 400]
+                                        [--concurrencia 64] [--latencia 50]
+                                        [--hilos-wsgi 4]
+
+Conviene subir el limitador de Drive para medir los servidores y no a él:
+    DRIVE_RATE=1000 DRIVE_RATE_MAX=2000 python benchmarks/bench_servidor.py
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from benchmarks.bench_drive_sync import _percentil, _preparar_entorno  # noqa: E402
+from benchmarks.fake_drive import FakeDrive, sembrar_biblioteca  # noqa: E402
+
+PUERTOS = {"wsgi": 5101, "asgi": 5102}
+
+
+def servir(modo: str, puerto: int, url_drive: str, parent_id: str, base_dir: str, hilos_wsgi: int):
+    """Proceso hijo: levanta la aplicación con el servidor indicado."""
+    os.environ["VISTAS_ASYNC"] = "true" if modo == "asgi" else "false"
+    os.environ["PATH_MAIN"] = os.path.join(base_dir, f"songs_{modo}")
+    os.makedirs(os.environ["PATH_MAIN"], exist_ok=True)
+    _preparar_entorno(base_dir, url_drive, ROOT_URLCONF="karafun_manager.urls", ALLOWED_HOSTS=["*"])
+    from karafun_manager.repositories import cancion_repository
+    # Sin base de datos: se precarga el parámetro de la carpeta kia_songs.
+    cancion_repository._parametros.obtener("kia_folder", lambda: parent_id, 10 ** 9)
+    if modo == "wsgi":
+        import waitress
+        from django.core.wsgi import get_wsgi_application
+        waitress.serve(get_wsgi_application(), host="127.0.0.1", port=puerto, threads=hilos_wsgi,
+                       connection_limit=1000, backlog=2048, _quiet=True)
+    else:
+        import uvicorn
+        uvicorn.run("ms_karafun.asgi:application", host="127.0.0.1", port=puerto,
+                    loop="ms_karafun.asgi:selector_loop", log_level="warning", backlog=2048)
+
+
+def _post(url: str, datos: dict, timeout: float = 300) -> dict:
+    req = urllib.request.Request(url, data=json.dumps(datos).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        return json.loads(r.read())
+
+
+def _esperar(url: str, proceso: subprocess.Popen, timeout: float = 60):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El servidor terminó con código {proceso.returncode}")
+        try:
+            with urllib.request.urlopen(url + "check/", timeout=2):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"El servidor no respondió en {timeout} s")
+
+
+def medir(modo: str, args, url_drive: str, parent_id: str, keys: list, base_dir: str) -> dict:
+    puerto = PUERTOS[modo]
+    proceso = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--servir", modo, "--puerto", str(puerto),
+        "--drive", url_drive, "--parent", parent_id, "--base", base_dir, "--hilos-wsgi", str(args.hilos_wsgi),
+    ], cwd=RAIZ)
+    url = f"http://127.0.0.1:{puerto}/"
+    try:
+        _esperar(url, proceso)
+        servidor = psutil.Process(proceso.pid)
+        hilos_max = servidor.num_threads()
+        midiendo = threading.Event()
+        midiendo.set()
+
+        def muestrear():
+            nonlocal hilos_max
+            while midiendo.is_set():
+                try:
+                    hilos_max = max(hilos_max, servidor.num_threads())
+                except psutil.Error:
+                    return
+                time.sleep(0.05)
+
+        muestreo = threading.Thread(target=muestrear, daemon=True)
+        muestreo.start()
+        latencias, errores = [], 0
+        lock = threading.Lock()
+
+        def peticion(i):
+            nonlocal errores
+            inicio = time.perf_counter()
+            try:
+                ok = _post(url + "syncDrive/", {"keys": [keys[i % len(keys)]]}).get("success")
+            except OSError:
+                ok = False
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+                if not ok:
+                    errores += 1
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrencia) as pool:
+            list(pool.map(peticion, range(args.peticiones)))
+        total = time.perf_counter() - inicio
+        midiendo.clear()
+        muestreo.join()
+        return {
+            "servidor": "WSGI (waitress)" if modo == "wsgi" else "ASGI (uvicorn)",
+            "peticiones": args.peticiones,
+            "total_s": total,
+            "rps": args.peticiones / total if total else 0.0,
+            "p50_ms": _percentil(latencias, 50) * 1000,
+            "p95_ms": _percentil(latencias, 95) * 1000,
+            "errores": errores,
+            "hilos_max": hilos_max,
+        }
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(10)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga concurrente WSGI vs ASGI contra un Drive simulado.")
+    parser.add_argument("--canciones", type=int, default=50, help="canciones sintéticas en el Drive simulado")
+    parser.add_argument("--kb", type=int, default=64, help="tamaño de cada audio/KFN sintético")
+    parser.add_argument("--peticiones", type=int, default=400, help="peticiones syncDrive por servidor")
+    parser.add_argument("--concurrencia", type=int, default=64, help="clientes simultáneos")
+    parser.add_argument("--latencia", type=float, default=50, help="ms añadidos por el Drive simulado a cada petición")
+    parser.add_argument("--hilos-wsgi", type=int, default=4, help="hilos de waitress (su valor por defecto es 4)")
+    parser.add_argument("--servir", choices=sorted(PUERTOS), help=argparse.SUPPRESS)
+    parser.add_argument("--puerto", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--drive", help=argparse.SUPPRESS)
+    parser.add_argument("--parent", help=argparse.SUPPRESS)
+    parser.add_argument("--base", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.servir:
+        servir(args.servir, args.puerto, args.drive, args.parent, args.base, args.hilos_wsgi)
+        return
+    base_dir = tempfile.mkdtemp(prefix="bench_servidor_")
+    drive = FakeDrive(args.latencia, 0.0, 0)
+    url_drive = drive.iniciar()
+    parent_id, keys = sembrar_biblioteca(drive, args.canciones, args.kb)
+    filas = []
+    for modo in ("wsgi", "asgi"):
+        filas.append(medir(modo, args, url_drive, parent_id, keys, base_dir))
+    drive.detener()
+    print()
+    print(f"{'servidor':<18}{'pet.':>7}{'total s':>10}{'pet./s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errores':>9}{'hilos':>8}")
+    for f in filas:
+        print(
+            f"{f['servidor']:<18}{f['peticiones']:>7}{f['total_s']:>10.2f}{f['rps']:>10.1f}"
+            f"{f['p50_ms']:>10.1f}{f['p95_ms']:>10.1f}{f['errores']:>9}{f['hilos_max']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
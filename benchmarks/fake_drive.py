@@ -0,0 +1,492 @@
+"""
+Servidor local que imita el subconjunto de Google Drive v3 que usa
+drive_manager, para medir y probar sin tocar el Drive real.
+
+Soporta files.list (con filtros q), files.get / get_media (con Range),
+files.create / files.update (metadatos y subida reanudable), files.delete,
+peticiones batch y changes (getStartPageToken / list). Puede inyectar latencia
+y respuestas de límite de cuota (429 / 403 userRateLimitExceeded).
+
+Uso:
+    python benchmarks/fake_drive.py [--port 8765] [--latencia 20] [--limite 0.02]
+                                    [--rps 0] [--canciones 100] [--kb 256]
+
+Luego, en el .env de la aplicación:
+    DRIVE_API_ENDPOINT=http://127.0.0.1:8765/
+"""
+import argparse
+import email.parser
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+
+def _ahora() -> str:
+    t = datetime.now(timezone.utc)
+    return t.strftime("%Y-%m-%dT%H:%M:%S.") + f"{t.microsecond // 1000:03d}Z"
+
+
+def _error(status: int, reason: str, message: str):
+    body = {"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}}
+    return status, {"Content-Type": "application/json; charset=UTF-8"}, json.dumps(body).encode("utf-8")
+
+
+def _json(status: int, datos) -> tuple:
+    return status, {"Content-Type": "application/json; charset=UTF-8"}, json.dumps(datos).encode("utf-8")
+
+
+# --- Filtros q de files.list -------------------------------------------------
+
+_TOKEN = re.compile(r"\s*(?:(\()|(\))|'((?:[^'\\]|\\.)*)'|(!=|=|<=|>=|<|>)|([A-Za-z_][\w.]*))")
+
+
+def _tokens(q: str) -> list:
+    tokens, pos = [], 0
+    q = q.strip()
+    while pos < len(q):
+        m = _TOKEN.match(q, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Consulta inválida cerca de: {q[pos:pos + 20]!r}")
+        abre, cierra, texto, op, palabra = m.groups()
+        if abre:
+            tokens.append(("(", None))
+        elif cierra:
+            tokens.append((")", None))
+        elif texto is not None:
+            tokens.append(("str", re.sub(r"\\(.)", r"\1", texto)))
+        elif op:
+            tokens.append(("op", op))
+        else:
+            tokens.append(("word", palabra))
+        pos = m.end()
+    return tokens
+
+
+def compilar_q(q: str):
+    """Convierte una consulta q de Drive en una función archivo -> bool."""
+    tokens = _tokens(q) if q else []
+    pos = 0
+
+    def ver():
+        return tokens[pos] if pos < len(tokens) else (None, None)
+
+    def tomar():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def palabra(valor):
+        t = ver()
+        return t[0] == "word" and t[1].lower() == valor
+
+    def expr():
+        izq = termino()
+        while palabra("or"):
+            tomar()
+            der = termino()
+            izq = (lambda a, b: lambda f: a(f) or b(f))(izq, der)
+        return izq
+
+    def termino():
+        izq = unario()
+        while palabra("and"):
+            tomar()
+            der = unario()
+            izq = (lambda a, b: lambda f: a(f) and b(f))(izq, der)
+        return izq
+
+    def unario():
+        if palabra("not"):
+            tomar()
+            interno = unario()
+            return lambda f: not interno(f)
+        if ver()[0] == "(":
+            tomar()
+            interno = expr()
+            if tomar()[0] != ")":
+                raise ValueError("Falta ')' en la consulta")
+            return interno
+        return condicion()
+
+    def valor():
+        tipo, v = tomar()
+        if tipo == "str":
+            return v
+        if tipo == "word" and v.lower() in ("true", "false"):
+            return v.lower() == "true"
+        raise ValueError(f"Valor inválido: {v!r}")
+
+    def condicion():
+        tipo, v = tomar()
+        if tipo == "str":
+            # 'valor' in parents
+            if not palabra("in"):
+                raise ValueError("Se esperaba 'in'")
+            tomar()
+            _, campo = tomar()
+            return lambda f: v in f.get(campo, [])
+        campo = v
+        if palabra("contains"):
+            tomar()
+            esperado = valor()
+            return lambda f: esperado in str(f.get(campo, ""))
+        _, op = tomar()
+        esperado = valor()
+        comparar = {
+            "=": lambda a, b: a == b,
+            "!=": lambda a, b: a != b,
+            "<": lambda a, b: a < b,
+            "<=": lambda a, b: a <= b,
+            ">": lambda a, b: a > b,
+            ">=": lambda a, b: a >= b,
+        }[op]
+        return lambda f: comparar(f.get(campo), esperado)
+
+    if not tokens:
+        return lambda f: True
+    filtro = expr()
+    if pos != len(tokens):
+        raise ValueError("Consulta con elementos sobrantes")
+    return filtro
+
+
+# --- Estado del Drive simulado -----------------------------------------------
+
+class FakeDrive:
+    def __init__(self, latencia_ms: float = 0, prob_limite: float = 0.0, rps_max: float = 0):
+        self.latencia_ms = latencia_ms
+        self.prob_limite = prob_limite
+        self.rps_max = rps_max
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self.archivos = {}
+        self.contenidos = {}
+        self.cambios = []
+        self.sesiones = {}
+        self._tokens = rps_max
+        self._ultimo = time.monotonic()
+        self.metricas = {"peticiones": 0, "limitadas": 0, "bytes_enviados": 0, "bytes_recibidos": 0}
+        self._server = None
+        self.url = None
+
+    # Datos --------------------------------------------------------------------
+
+    def crear(self, name: str, parents: list = None, mime: str = "application/octet-stream", contenido: bytes = b"") -> str:
+        with self._lock:
+            file_id = f"fake{next(self._ids):08d}"
+            meta = {"id": file_id, "name": name, "mimeType": mime, "parents": list(parents or []), "trashed": False}
+            self.archivos[file_id] = meta
+            if mime != FOLDER_MIME:
+                self._set_contenido(file_id, contenido)
+            else:
+                meta["modifiedTime"] = _ahora()
+                self.cambios.append(file_id)
+            return file_id
+
+    def crear_carpeta(self, name: str, parent: str = None) -> str:
+        return self.crear(name, [parent] if parent else [], FOLDER_MIME)
+
+    def _set_contenido(self, file_id: str, contenido: bytes):
+        meta = self.archivos[file_id]
+        self.contenidos[file_id] = bytes(contenido)
+        meta["size"] = str(len(contenido))
+        meta["md5Checksum"] = hashlib.md5(contenido).hexdigest()
+        meta["modifiedTime"] = _ahora()
+        self.cambios.append(file_id)
+
+    def _eliminar(self, file_id: str):
+        hijos = [f for f, m in self.archivos.items() if file_id in m.get("parents", [])]
+        for hijo in hijos:
+            self._eliminar(hijo)
+        self.archivos.pop(file_id, None)
+        self.contenidos.pop(file_id, None)
+        self.cambios.append(file_id)
+
+    def reiniciar(self):
+        with self._lock:
+            self.archivos.clear()
+            self.contenidos.clear()
+            self.cambios.clear()
+            self.sesiones.clear()
+            for clave in self.metricas:
+                self.metricas[clave] = 0
+
+    # Servidor -----------------------------------------------------------------
+
+    def iniciar(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        drive = self
+
+        class Handler(_Handler):
+            fake = drive
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}/"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def detener(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # Inyección de latencia y límites ------------------------------------------
+
+    def _limitar(self):
+        if self.latencia_ms:
+            time.sleep(self.latencia_ms / 1000)
+        with self._lock:
+            self.metricas["peticiones"] += 1
+            limitada = self.prob_limite and random.random() < self.prob_limite
+            if not limitada and self.rps_max:
+                ahora = time.monotonic()
+                self._tokens = min(self.rps_max, self._tokens + (ahora - self._ultimo) * self.rps_max)
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                else:
+                    limitada = True
+            if limitada:
+                self.metricas["limitadas"] += 1
+        if not limitada:
+            return None
+        if random.random() < 0.5:
+            return _error(429, "rateLimitExceeded", "Rate Limit Exceeded")
+        return _error(403, "userRateLimitExceeded", "User Rate Limit Exceeded")
+
+    # Despacho -----------------------------------------------------------------
+
+    def despachar(self, method: str, ruta: str, headers: dict, body: bytes) -> tuple:
+        partes = urlsplit(ruta)
+        path = partes.path
+        params = {k: v[0] for k, v in parse_qs(partes.query, keep_blank_values=True).items()}
+        try:
+            with self._lock:
+                if path.startswith("/upload/session/"):
+                    return self._subir_bloque(path.rsplit("/", 1)[1], headers, body)
+                if path.startswith("/upload/drive/v3/files"):
+                    return self._iniciar_sesion(method, path, params, body)
+                if path == "/drive/v3/changes/startPageToken":
+                    return _json(200, {"kind": "drive#startPageToken", "startPageToken": str(len(self.cambios))})
+                if path == "/drive/v3/changes":
+                    return self._listar_cambios(params)
+                if path == "/drive/v3/files":
+                    if method == "GET":
+                        return self._listar(params)
+                    if method == "POST":
+                        meta = json.loads(body or b"{}")
+                        file_id = self.crear(meta.get("name", "Sin título"), meta.get("parents"), meta.get("mimeType", "application/octet-stream"))
+                        return _json(200, self.archivos[file_id])
+                m = re.fullmatch(r"/drive/v3/files/([^/]+)", path)
+                if m:
+                    return self._archivo(method, m.group(1), params, headers, body)
+            return _error(404, "notFound", f"Ruta no soportada: {method} {path}")
+        except ValueError as e:
+            return _error(400, "invalid", str(e))
+
+    def _listar(self, params: dict) -> tuple:
+        filtro = compilar_q(params.get("q", ""))
+        page_size = int(params.get("pageSize") or 100)
+        inicio = int(params.get("pageToken") or 0)
+        encontrados = [m for m in self.archivos.values() if filtro(m)]
+        pagina = encontrados[inicio:inicio + page_size]
+        respuesta = {"kind": "drive#fileList", "files": pagina}
+        if inicio + page_size < len(encontrados):
+            respuesta["nextPageToken"] = str(inicio + page_size)
+        return _json(200, respuesta)
+
+    def _listar_cambios(self, params: dict) -> tuple:
+        inicio = int(params.get("pageToken") or 0)
+        page_size = int(params.get("pageSize") or 100)
+        ids = self.cambios[inicio:inicio + page_size]
+        cambios = []
+        for file_id in ids:
+            meta = self.archivos.get(file_id)
+            cambios.append({"kind": "drive#change", "fileId": file_id, "removed": meta is None, "file": meta})
+        respuesta = {"kind": "drive#changeList", "changes": cambios}
+        if inicio + page_size < len(self.cambios):
+            respuesta["nextPageToken"] = str(inicio + page_size)
+        else:
+            respuesta["newStartPageToken"] = str(len(self.cambios))
+        return _json(200, respuesta)
+
+    def _archivo(self, method: str, file_id: str, params: dict, headers: dict, body: bytes) -> tuple:
+        meta = self.archivos.get(file_id)
+        if meta is None:
+            return _error(404, "notFound", f"File not found: {file_id}.")
+        if method == "DELETE":
+            self._eliminar(file_id)
+            return 204, {}, b""
+        if method == "PATCH":
+            cambios = json.loads(body or b"{}")
+            for campo in ("name", "trashed", "mimeType"):
+                if campo in cambios:
+                    meta[campo] = cambios[campo]
+            meta["modifiedTime"] = _ahora()
+            self.cambios.append(file_id)
+            return _json(200, meta)
+        if params.get("alt") != "media":
+            return _json(200, meta)
+        contenido = self.contenidos.get(file_id, b"")
+        rango = headers.get("range")
+        if not rango:
+            return 200, {"Content-Type": "application/octet-stream"}, contenido
+        inicio, _, fin = rango.split("=", 1)[1].partition("-")
+        inicio = int(inicio)
+        fin = min(int(fin) if fin else len(contenido) - 1, len(contenido) - 1)
+        if inicio >= len(contenido):
+            return 416, {"Content-Range": f"bytes */{len(contenido)}"}, b""
+        return 206, {
+            "Content-Type": "application/octet-stream",
+            "Content-Range": f"bytes {inicio}-{fin}/{len(contenido)}",
+        }, contenido[inicio:fin + 1]
+
+    def _iniciar_sesion(self, method: str, path: str, params: dict, body: bytes) -> tuple:
+        if params.get("uploadType") != "resumable":
+            return _error(400, "badRequest", "Solo se admite uploadType=resumable")
+        m = re.fullmatch(r"/upload/drive/v3/files(?:/([^/]+))?", path)
+        file_id = m.group(1) if m else None
+        if file_id and file_id not in self.archivos:
+            return _error(404, "notFound", f"File not found: {file_id}.")
+        sesion = uuid.uuid4().hex
+        self.sesiones[sesion] = {"file_id": file_id, "meta": json.loads(body or b"{}"), "datos": bytearray()}
+        return 200, {"Location": f"{self.url}upload/session/{sesion}"}, b""
+
+    def _subir_bloque(self, sesion_id: str, headers: dict, body: bytes) -> tuple:
+        sesion = self.sesiones.get(sesion_id)
+        if sesion is None:
+            return _error(404, "notFound", "Sesión de subida inexistente.")
+        rango, _, total = headers.get("content-range", "bytes */*").rpartition("/")
+        rango = rango.split(" ", 1)[1]
+        datos = sesion["datos"]
+        if rango != "*":
+            inicio = int(rango.split("-", 1)[0])
+            # Un bloque que se repite tras un corte se recorta a lo que falta.
+            if inicio <= len(datos):
+                datos[inicio:] = body
+        if total != "*" and len(datos) >= int(total):
+            del self.sesiones[sesion_id]
+            file_id = sesion["file_id"]
+            if file_id is None:
+                meta = sesion["meta"]
+                file_id = self.crear(meta.get("name", "Sin título"), meta.get("parents"), meta.get("mimeType", "application/octet-stream"), bytes(datos))
+            else:
+                self._set_contenido(file_id, bytes(datos))
+            return _json(200, self.archivos[file_id])
+        encabezados = {"Range": f"bytes=0-{len(datos) - 1}"} if datos else {}
+        return 308, encabezados, b""
+
+    def despachar_lote(self, content_type: str, body: bytes) -> tuple:
+        mensaje = email.parser.BytesParser().parsebytes(b"Content-Type: " + content_type.encode("ascii") + b"\r\n\r\n" + body)
+        frontera = f"batch_{uuid.uuid4().hex}"
+        salida = []
+        for parte in mensaje.get_payload():
+            content_id = parte["Content-ID"].strip()[1:-1]
+            crudo = parte.get_payload(decode=False)
+            linea, _, resto = crudo.lstrip().partition("\n")
+            method, ruta, _ = linea.strip().split(" ", 2)
+            cabeceras, _, cuerpo = resto.replace("\r\n", "\n").partition("\n\n")
+            hdrs = {}
+            for h in cabeceras.splitlines():
+                if ":" in h:
+                    k, v = h.split(":", 1)
+                    hdrs[k.strip().lower()] = v.strip()
+            status, r_headers, r_body = self.despachar(method, ruta, hdrs, cuerpo.encode("utf-8"))
+            lineas = [f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}"]
+            lineas += [f"{k}: {v}" for k, v in r_headers.items()]
+            lineas.append(f"Content-Length: {len(r_body)}")
+            salida.append(
+                f"--{frontera}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                + "\r\n".join(lineas) + "\r\n\r\n" + r_body.decode("utf-8") + "\r\n"
+            )
+        salida.append(f"--{frontera}--\r\n")
+        return 200, {"Content-Type": f"multipart/mixed; boundary={frontera}"}, "".join(salida).encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake: FakeDrive = None
+
+    def log_message(self, format, *args):  # noqa: A002 - silencioso
+        pass
+
+    def _atender(self):
+        largo = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(largo) if largo else b""
+        headers = {k.lower(): v for k, v in self.headers.items()}
+        limitada = self.fake._limitar()
+        if limitada:
+            status, r_headers, r_body = limitada
+        elif self.path.startswith("/batch/"):
+            status, r_headers, r_body = self.fake.despachar_lote(headers.get("content-type", ""), body)
+        else:
+            status, r_headers, r_body = self.fake.despachar(self.command, self.path, headers, body)
+        with self.fake._lock:
+            self.fake.metricas["bytes_recibidos"] += len(body)
+            self.fake.metricas["bytes_enviados"] += len(r_body)
+        self.send_response(status)
+        for k, v in r_headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(r_body)))
+        self.end_headers()
+        if r_body and self.command != "HEAD":
+            self.wfile.write(r_body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _atender
+
+
+# --- Biblioteca sintética ----------------------------------------------------
+
+ARCHIVOS_CANCION = ("main.mp3", "no_vocals.mp3", "kara_fun.kfn", "Song.ini")
+
+
+def sembrar_biblioteca(drive: FakeDrive, canciones: int, kb: int = 256, prefijo: str = "BENCH") -> tuple:
+    """Crea kia_songs con `canciones` carpetas; devuelve (id de kia_songs, keys)."""
+    parent_id = drive.crear_carpeta("kia_songs")
+    keys = []
+    for i in range(canciones):
+        key = f"{prefijo}{i:05d}"
+        folder_id = drive.crear_carpeta(key, parent_id)
+        for nombre in ARCHIVOS_CANCION:
+            tamano = 2 * 1024 if nombre == "Song.ini" else kb * 1024
+            drive.crear(nombre, [folder_id], contenido=random.randbytes(tamano))
+        keys.append(key)
+    return parent_id, keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local de Google Drive v3 para pruebas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0, help="ms añadidos a cada petición")
+    parser.add_argument("--limite", type=float, default=0.0, help="probabilidad de responder 429/403 de cuota")
+    parser.add_argument("--rps", type=float, default=0, help="peticiones/s antes de limitar (0 = sin límite)")
+    parser.add_argument("--canciones", type=int, default=0, help="canciones sintéticas a crear")
+    parser.add_argument("--kb", type=int, default=256, help="tamaño de cada audio/KFN sintético")
+    args = parser.parse_args()
+    drive = FakeDrive(args.latencia, args.limite, args.rps)
+    url = drive.iniciar(args.host, args.port)
+    print(f"Fake Drive escuchando en {url}")
+    if args.canciones:
+        parent_id, keys = sembrar_biblioteca(drive, args.canciones, args.kb)
+        print(f"kia_songs = {parent_id} ({len(keys)} canciones: {keys[0]} .. {keys[-1]})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        drive.detener()
+
+
+if __name__ == "__main__":
+    main()
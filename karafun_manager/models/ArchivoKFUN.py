@@ -9,4 +9,8 @@ class ArchivoKFUN:
     length_out: int
     offset: int
     flags: int
-    file: Optional[bytes] = None
\ No newline at end of file
+    file: Optional[bytes] = None
+    # Ruta en disco del contenido; se copia por bloques al escribir el KFN.
+    path: Optional[str] = None
+    # Posición del contenido dentro de `path` (miembros copiados de otro KFN).
+    source_offset: int = 0
\ No newline at end of file
@@ -0,0 +1,15 @@
+from dataclasses import dataclass
+from typing import Optional
+
+REEMPLAZAR = "reemplazar"
+AGREGAR = "agregar"
+ELIMINAR = "eliminar"
+
+@dataclass
+class OperacionKFN:
+    tipo: str
+    filename: str
+    # AGREGAR: archivo en disco que se agrega (o reemplaza) dentro del KFN.
+    path: Optional[str] = None
+    # REEMPLAZAR: contenido en memoria (p. ej. Song.ini).
+    contenido: Optional[bytes] = None
@@ -1,12 +1,23 @@
-from django.db import connections
+from karafun_manager.repositories.db_pool import get_db_pool, get_async_db_pool
+from karafun_manager.repositories.parametro_cache import ParametroCache
+from karafun_manager.utils.metrics import medir_db
 from karafun_manager.utils.print import _log_print
 import logging
 from karafun_manager.utils import logs
 logger =  logging.getLogger(__name__)
 
+# Compartida por todas las instancias del repositorio.
+_parametros = ParametroCache()
+
 class CancionRepository:
+    # Segundos que se conservan los parámetros antes de volver a consultarlos.
+    TTL_PARAMETROS = 300
+
     def get_parent_folder(self):
-        with connections['default'].cursor() as cursor:
+        return _parametros.obtener("kia_folder", self._get_parent_folder, self.TTL_PARAMETROS)
+
+    def _get_parent_folder(self):
+        with get_db_pool().connection() as conn, conn.cursor() as cursor, medir_db("sps_kia_folder", "uno"):
             cursor.execute("select * from public.sps_kia_folder()")
             result = cursor.fetchone()
         if result:
@@ -16,7 +27,7 @@ class CancionRepository:
         return ''
 
     def get_song_ini(self, cancion_id):
-        with connections['default'].cursor() as cursor:
+        with get_db_pool().connection() as conn, conn.cursor() as cursor, medir_db("sps_song_ini", "uno"):
             cursor.execute(
                 """
                 select * from public.sps_song_ini(%s)
@@ -34,15 +45,26 @@ class CancionRepository:
         return None
 
     def get_porcentaje_kfn(self):
-        with connections['default'].cursor()  as cursor:
+        return _parametros.obtener("porcentaje_kfn", self._get_porcentaje_kfn, self.TTL_PARAMETROS)
+
+    def _get_porcentaje_kfn(self):
+        with get_db_pool().connection() as conn, conn.cursor() as cursor, medir_db("sps_porcentaje_kfn", "uno"):
             cursor.execute("select * from public.sps_porcentaje_kfn()")
             result = cursor.fetchone()
         if result:
             return result[0]
         return 80
 
+    @staticmethod
+    def invalidar_parametros(clave: str = None):
+        _parametros.invalidar(clave)
+
+    @staticmethod
+    def metricas_parametros() -> dict:
+        return _parametros.metricas()
+
     def update_porcentaje_avance(self, cancion_id, porcentaje):
-        with connections['default'].cursor() as cursor:
+        with get_db_pool().connection() as conn, conn.cursor() as cursor, medir_db("spu_porcentaje_avance", "uno"):
             cursor.execute(
                 """
                 select * from public.spu_porcentaje_avance(%s, %s)
@@ -51,7 +73,7 @@ class CancionRepository:
             )
 
     def update_song_ini(self, key, song_ini, render_ini):
-        with connections['default'].cursor() as cursor:
+        with get_db_pool().connection() as conn, conn.cursor() as cursor, medir_db("spu_song_ini_2", "uno"):
             cursor.execute(
                 """
                 select * from public.spu_song_ini_2(%s, %s, %s)
@@ -68,4 +90,150 @@ class CancionRepository:
             return False
         msg = _log_print("WARNING", "La función spu_song_ini_2 no devolvió resultados.")
         logger.warning(msg)
-        return False
\ No newline at end of file
+        return False
+
+    # Versiones async (vistas ASGI): mismas consultas sobre el pool de psycopg
+    # async, sin ocupar un hilo mientras se espera a la base de datos.
+
+    async def get_song_ini_async(self, cancion_id):
+        pool = await get_async_db_pool()
+        async with pool.connection() as conn, conn.cursor() as cursor:
+            with medir_db("sps_song_ini", "async"):
+                await cursor.execute(
+                    """
+                    select * from public.sps_song_ini(%s)
+                    """,
+                    [cancion_id]
+                )
+                result = await cursor.fetchone()
+        if result:
+            return {
+                "songini": result[0],
+                "letra": result[1]
+            }
+        msg = _log_print("WARNING",f"No se encontro Song.ini para la canción con ID: {cancion_id}")
+        logger.warning(msg)
+        return None
+
+    async def update_porcentaje_avance_async(self, cancion_id, porcentaje):
+        pool = await get_async_db_pool()
+        async with pool.connection() as conn, conn.cursor() as cursor:
+            with medir_db("spu_porcentaje_avance", "async"):
+                await cursor.execute(
+                    """
+                    select * from public.spu_porcentaje_avance(%s, %s)
+                    """,
+                    [ cancion_id, porcentaje]
+                )
+
+    # Versiones por lotes: todas las sentencias viajan en un solo pipeline
+    # (executemany) en lugar de una ida y vuelta por canción.
+
+    # Devuelve {cancion_id: {"songini", "letra"} | None} con una sola consulta.
+    def get_song_inis(self, cancion_ids: list) -> dict:
+        ids = list(dict.fromkeys(cancion_ids))
+        if not ids:
+            return {}
+        with get_db_pool().connection() as conn, conn.cursor() as cursor, medir_db("sps_song_ini", "lote"):
+            cursor.executemany(
+                """
+                select * from public.sps_song_ini(%s)
+                """,
+                [[cancion_id] for cancion_id in ids],
+                returning=True
+            )
+            filas = _filas_por_sentencia(cursor)
+        resultado = {}
+        for cancion_id, fila in zip(ids, filas):
+            if fila:
+                resultado[cancion_id] = {
+                    "songini": fila[0],
+                    "letra": fila[1]
+                }
+            else:
+                msg = _log_print("WARNING",f"No se encontro Song.ini para la canción con ID: {cancion_id}")
+                logger.warning(msg)
+                resultado[cancion_id] = None
+        return resultado
+
+    # avances: lista de (cancion_id, porcentaje). Se aplican en una transacción;
+    # si una fila falla se reintenta fila por fila para no perder las demás.
+    # Devuelve {cancion_id: bool}.
+    def update_porcentajes_avance(self, avances: list) -> dict:
+        if not avances:
+            return {}
+        sql = """
+                    select * from public.spu_porcentaje_avance(%s, %s)
+                    """
+        parametros = [[cancion_id, porcentaje] for cancion_id, porcentaje in avances]
+        try:
+            with get_db_pool().connection() as conn, medir_db("spu_porcentaje_avance", "lote"), conn.transaction(), conn.cursor() as cursor:
+                cursor.executemany(sql, parametros)
+            return {cancion_id: True for cancion_id, _ in avances}
+        except Exception as e:
+            msg = _log_print("WARNING",f"Falló el lote de porcentajes ({len(avances)} canciones), se aplica fila por fila: {e}")
+            logger.warning(msg)
+        filas = _por_fila("spu_porcentaje_avance", sql, parametros, [cancion_id for cancion_id, _ in avances], leer=False)
+        return {cancion_id: fila is not False for (cancion_id, _), fila in zip(avances, filas)}
+
+    # cambios: lista de (key, song_ini, render_ini). Se aplican en una
+    # transacción; si una fila falla se reintenta fila por fila para no perder
+    # las demás. Devuelve {key: bool} según el retorno de spu_song_ini_2 para
+    # cada fila.
+    def update_song_inis(self, cambios: list) -> dict:
+        if not cambios:
+            return {}
+        sql = """
+                    select * from public.spu_song_ini_2(%s, %s, %s)
+                    """
+        parametros = [[key, song_ini, render_ini] for key, song_ini, render_ini in cambios]
+        try:
+            with get_db_pool().connection() as conn, medir_db("spu_song_ini_2", "lote"), conn.transaction(), conn.cursor() as cursor:
+                cursor.executemany(sql, parametros, returning=True)
+                filas = _filas_por_sentencia(cursor)
+        except Exception as e:
+            msg = _log_print("WARNING",f"Falló el lote de song_ini ({len(cambios)} canciones), se aplica fila por fila: {e}")
+            logger.warning(msg)
+            filas = _por_fila("spu_song_ini_2", sql, parametros, [key for key, _, _ in cambios])
+        resultado = {}
+        for (key, _, _), fila in zip(cambios, filas):
+            if fila and len(fila[0]) > 0:
+                retorno = fila[0]
+                if retorno[0] == '0':
+                    resultado[key] = True
+                    continue
+                msg = _log_print("WARNING", f"Error al actualizar song_ini - {key}: {retorno[1]}")
+                logger.warning(msg)
+            elif fila is not False:
+                msg = _log_print("WARNING", f"La función spu_song_ini_2 no devolvió resultados - {key}.")
+                logger.warning(msg)
+            resultado[key] = False
+        return resultado
+
+# Ejecuta `sql` una vez por fila, cada una en su savepoint dentro de una misma
+# transacción: las filas que fallan se revierten solas y se informan. Devuelve
+# la primera fila de cada sentencia (o () si `leer` es False), False si falló.
+def _por_fila(procedimiento: str, sql: str, parametros: list, claves: list, leer: bool = True) -> list:
+    filas = [False] * len(parametros)
+    try:
+        with get_db_pool().connection() as conn, medir_db(procedimiento, "fila"), conn.transaction(), conn.cursor() as cursor:
+            for i, (clave, params) in enumerate(zip(claves, parametros)):
+                try:
+                    with conn.transaction():
+                        cursor.execute(sql, params)
+                        filas[i] = cursor.fetchone() if leer else ()
+                except Exception as e:
+                    msg = _log_print("ERROR",f"{procedimiento} falló para {clave}: {e}")
+                    logger.error(msg)
+    except Exception as e:
+        msg = _log_print("ERROR",f"No se pudo ejecutar {procedimiento} para {len(parametros)} filas: {e}")
+        logger.error(msg)
+        return [False] * len(parametros)
+    return filas
+
+# Primera fila de cada sentencia de un executemany(returning=True), en orden.
+def _filas_por_sentencia(cursor) -> list:
+    filas = [cursor.fetchone()]
+    while cursor.nextset():
+        filas.append(cursor.fetchone())
+    return filas
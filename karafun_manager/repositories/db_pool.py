@@ -0,0 +1,128 @@
+import atexit
+import threading
+from django.db import connections
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from ms_karafun import config
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+# Pool acotado de conexiones a Postgres compartido por todos los hilos del
+# proceso. Los hilos de los lotes piden prestada una conexión y la devuelven
+# al terminar, en lugar de abrir (TLS + autenticación) una conexión por hilo.
+# Usa los mismos parámetros que la conexión 'default' de Django.
+class DbPool:
+    def __init__(self):
+        self.pool = ConnectionPool(
+            kwargs=_parametros_conexion(),
+            min_size=config.get_db_pool_min(),
+            max_size=max(config.get_db_pool_min(), config.get_db_pool_max()),
+            timeout=config.get_db_pool_timeout(),
+            max_lifetime=config.get_db_pool_max_lifetime(),
+            max_idle=config.get_db_pool_max_idle(),
+            # Verifica la conexión antes de entregarla; las caídas se reemplazan.
+            check=ConnectionPool.check_connection,
+            name="karafun",
+            open=False,
+        )
+        self.pool.open(wait=False)
+        msg = _log_print("INFO",f"Pool de base de datos abierto ({self.pool.min_size}-{self.pool.max_size} conexiones).")
+        logger.info(msg)
+
+    def connection(self):
+        return self.pool.connection()
+
+    def cerrar(self):
+        self.pool.close()
+
+    def metricas(self) -> dict:
+        return _metricas(self.pool)
+
+# Versión asyncio del pool para las vistas async (ASGI). Debe abrirse y usarse
+# desde el event loop del servidor.
+class AsyncDbPool:
+    def __init__(self):
+        params = _parametros_conexion()
+        # El cursor de Django es síncrono: la conexión async usa el suyo.
+        params.pop('cursor_factory', None)
+        self.pool = AsyncConnectionPool(
+            kwargs=params,
+            min_size=config.get_db_pool_min(),
+            max_size=max(config.get_db_pool_min(), config.get_db_pool_max()),
+            timeout=config.get_db_pool_timeout(),
+            max_lifetime=config.get_db_pool_max_lifetime(),
+            max_idle=config.get_db_pool_max_idle(),
+            check=AsyncConnectionPool.check_connection,
+            name="karafun-async",
+            open=False,
+        )
+        self._abierto = False
+
+    async def abrir(self):
+        if self._abierto:
+            return
+        self._abierto = True
+        await self.pool.open(wait=False)
+        msg = _log_print("INFO",f"Pool async de base de datos abierto ({self.pool.min_size}-{self.pool.max_size} conexiones).")
+        logger.info(msg)
+
+    def connection(self):
+        return self.pool.connection()
+
+    def metricas(self) -> dict:
+        return _metricas(self.pool)
+
+def _parametros_conexion() -> dict:
+    params = connections['default'].get_connection_params()
+    # Igual que Django: cada sentencia se confirma sola.
+    params['autocommit'] = True
+    return params
+
+def _metricas(pool) -> dict:
+    stats = pool.get_stats()
+    solicitudes = stats.get('requests_num', 0)
+    espera_ms = stats.get('requests_wait_ms', 0)
+    return {
+        'min': stats.get('pool_min'),
+        'max': stats.get('pool_max'),
+        'abiertas': stats.get('pool_size', 0),
+        'disponibles': stats.get('pool_available', 0),
+        'esperando': stats.get('requests_waiting', 0),
+        'solicitudes': solicitudes,
+        'encoladas': stats.get('requests_queued', 0),
+        'espera_total_ms': espera_ms,
+        'espera_media_ms': round(espera_ms / solicitudes, 2) if solicitudes else 0.0,
+        'errores_espera': stats.get('requests_errors', 0),
+        'conexiones_creadas': stats.get('connections_num', 0),
+        'conexiones_fallidas': stats.get('connections_errors', 0),
+        'conexiones_perdidas': stats.get('connections_lost', 0),
+        'devueltas_invalidas': stats.get('returns_bad', 0),
+    }
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool() -> DbPool:
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = DbPool()
+                atexit.register(_db_pool.cerrar)
+    return _db_pool
+
+_async_db_pool = None
+
+async def get_async_db_pool() -> AsyncDbPool:
+    global _async_db_pool
+    if _async_db_pool is None:
+        with _db_pool_lock:
+            if _async_db_pool is None:
+                _async_db_pool = AsyncDbPool()
+    await _async_db_pool.abrir()
+    return _async_db_pool
+
+# Métricas del pool async sin crearlo si aún no se usó.
+def metricas_async_db_pool():
+    return _async_db_pool.metricas() if _async_db_pool is not None else None
@@ -0,0 +1,66 @@
+import threading
+import time
+from concurrent.futures import Future
+
+# Caché en memoria para parámetros que cambian poco (carpeta kia_songs,
+# porcentaje mínimo de digitación...). Cada entrada tiene su propio TTL y,
+# si varios hilos piden la misma clave vencida, solo uno consulta la base de
+# datos y los demás esperan su resultado (single-flight).
+class ParametroCache:
+    def __init__(self):
+        self._entradas = {}
+        self._vuelos = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.compartidos = 0
+
+    def obtener(self, clave: str, cargar, ttl: float):
+        lider = False
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[1] > time.monotonic():
+                self.hits += 1
+                return entrada[0]
+            vuelo = self._vuelos.get(clave)
+            if vuelo is not None:
+                self.compartidos += 1
+            else:
+                self.misses += 1
+                vuelo = Future()
+                self._vuelos[clave] = vuelo
+                lider = True
+        if not lider:
+            return vuelo.result()
+        try:
+            valor = cargar()
+        except BaseException as e:
+            with self._lock:
+                self._vuelos.pop(clave, None)
+            vuelo.set_exception(e)
+            raise
+        with self._lock:
+            # Los valores vacíos no se guardan para reintentar en la próxima llamada.
+            if valor is not None and valor != '':
+                self._entradas[clave] = (valor, time.monotonic() + ttl)
+            self._vuelos.pop(clave, None)
+        vuelo.set_result(valor)
+        return valor
+
+    def invalidar(self, clave: str = None):
+        with self._lock:
+            if clave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(clave, None)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses + self.compartidos
+            return {
+                'entradas': len(self._entradas),
+                'hits': self.hits,
+                'misses': self.misses,
+                'compartidos': self.compartidos,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
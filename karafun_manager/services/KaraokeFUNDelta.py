@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+from typing import List
+from karafun_manager.models.ArchivoKFUN import ArchivoKFUN
+from karafun_manager.models.FormatKFUN import FormatKFUN
+from karafun_manager.models.OperacionKFN import OperacionKFN, REEMPLAZAR, AGREGAR, ELIMINAR
+from karafun_manager.models.TagKFUN import TagKFUN
+from karafun_manager.services.KaraokeFUNForm2 import KaraokeFunForm2
+from karafun_manager.utils import metrics
+from karafun_manager.utils.kfn_archive import KfnArchive
+from karafun_manager.utils.kfn_io import copiar_archivo
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+# Reescribe un KFN existente aplicando solo los cambios indicados: los miembros
+# que no cambian se copian directamente desde el KFN anterior y el resultado
+# reemplaza al original de forma atómica.
+class KaraokeFunDelta(KaraokeFunForm2):
+    def __init__(self, kfn_path: str, operaciones: List[OperacionKFN], audio: str = None):
+        super().__init__(os.path.dirname(kfn_path), None, audio)
+        self.kfn_path = kfn_path
+        self.operaciones = operaciones
+
+    def genera_archivo_kfun(self) -> List[str]:
+        r = ["0", "¡Archivo KFN Recreado con Éxito!"]
+        # Nombre temporal único en la misma carpeta (os.replace no cruza discos).
+        fd, tmp_path = tempfile.mkstemp(prefix="kara_fun.", suffix=".kfn.tmp", dir=os.path.dirname(self.kfn_path))
+        try:
+            with os.fdopen(fd, "wb") as f, KfnArchive(self.kfn_path) as kfn:
+                formato_kfun: FormatKFUN = self._carga_datos(kfn)
+                self.m_file = f
+                # Firma y encabezados
+                self._write_bytes(b"KFNB")
+                for encabezado in formato_kfun.l_tag:
+                    self._write_bytes(encabezado.name.encode("ascii"))
+                    self._write_byte(encabezado.type)
+                    if encabezado.type == 2:
+                        valor = encabezado.value
+                        valor_bytes = valor if isinstance(valor, bytes) else str(valor).encode("utf-8")
+                        self._write_int(len(valor_bytes))
+                        self._write_bytes(valor_bytes)
+                    else:
+                        self._write_int(int(encabezado.value))
+                # Metadatos de archivos
+                archivos = formato_kfun.l_archivo
+                self._write_int(len(archivos))
+                for archivo in archivos:
+                    nombre_bytes = archivo.filename.encode("utf-8")
+                    self._write_int(len(nombre_bytes))
+                    self._write_bytes(nombre_bytes)
+                    self._write_int(archivo.type)
+                    self._write_int(archivo.length_out)
+                    self._write_int(archivo.offset)
+                    self._write_int(archivo.length_in)
+                    self._write_int(archivo.flags)
+                # Contenido: los miembros sin cambios se copian del KFN anterior
+                for archivo in archivos:
+                    if archivo.path:
+                        copiar_archivo(self.m_file, archivo.path, archivo.length_in, archivo.source_offset)
+                    else:
+                        self._write_bytes(archivo.file)
+                f.flush()
+                os.fsync(f.fileno())
+                metrics.contar_kfn_escrito(f.tell())
+            # mkstemp crea el archivo solo para el dueño: conservar los permisos del KFN.
+            shutil.copymode(self.kfn_path, tmp_path)
+            # El mmap ya está cerrado: en Windows no se puede reemplazar un archivo abierto.
+            os.replace(tmp_path, self.kfn_path)
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            msg = _log_print("ERROR",f"No se pudo recrear el KFN: {str(e)}")
+            logger.error(msg)
+            return ["1", msg]
+        msg = _log_print("INFO","Archivo KFN Recreado con Éxito")
+        logger.info(msg)
+        return r
+
+    def _carga_datos(self, kfn: KfnArchive) -> FormatKFUN:
+        kfun = FormatKFUN(
+            l_tag=self._get_encabezado_delta(kfn),
+            l_archivo=[]
+        )
+        eliminados = {op.filename for op in self.operaciones if op.tipo == ELIMINAR}
+        nuevos = {}
+        for op in self.operaciones:
+            if op.tipo in (REEMPLAZAR, AGREGAR):
+                nuevos[op.filename] = op
+        la = []
+        for e in kfn.entries:
+            nombre = e['filename']
+            if nombre in eliminados:
+                continue
+            if nombre in nuevos:
+                la.append(self._get_archivo_op(nuevos.pop(nombre), e['type']))
+                continue
+            # Sin cambios: se referencia el rango de bytes dentro del KFN anterior.
+            la.append(ArchivoKFUN(
+                type=e['type'],
+                filename=nombre,
+                length_in=e['length_in'],
+                length_out=e['length_out'],
+                offset=0,
+                flags=e['flags'],
+                path=kfn.path,
+                source_offset=kfn.data_base + e['offset']
+            ))
+        for op in nuevos.values():
+            la.append(self._get_archivo_op(op))
+        indice = 0
+        for a in la:
+            a.offset = indice
+            indice += a.length_in
+        kfun.l_archivo = la
+        return kfun
+
+    def _get_encabezado_delta(self, kfn: KfnArchive) -> List[TagKFUN]:
+        l = [TagKFUN(t['name'], t['type'], t['value']) for t in kfn.tags]
+        if self.audio:
+            sorc = self._remover_acentos(f"1,I,{self.audio}")
+            for tag in l:
+                if tag.name == "SORC":
+                    tag.value = sorc
+        return l
+
+    def _get_archivo_op(self, op: OperacionKFN, tipo: int = None) -> ArchivoKFUN:
+        if tipo is None:
+            tipo = self._get_tipo(op.filename)
+        if op.tipo == REEMPLAZAR:
+            contenido = op.contenido or b''
+            return ArchivoKFUN(
+                type=tipo,
+                filename=op.filename,
+                length_in=len(contenido),
+                length_out=len(contenido),
+                offset=0,
+                flags=0,
+                file=contenido
+            )
+        archivo = self._get_file(op.path, tipo)
+        archivo.filename = self._remover_acentos(op.filename)
+        return archivo
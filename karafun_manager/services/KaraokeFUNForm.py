@@ -1,3 +1,4 @@
+import os
 import re
 import struct
 from datetime import datetime
@@ -10,6 +11,8 @@ from karafun_manager.models.General import General
 from karafun_manager.models.TagKFUN import TagKFUN
 from ms_karafun import config
 from karafun_manager.utils.print import _log_print
+from karafun_manager.utils import metrics
+from karafun_manager.utils.kfn_io import copiar_archivo
 import logging
 from karafun_manager.utils import logs
 logger = logging.getLogger(__name__)
@@ -62,7 +65,11 @@ class KaraokeFunForm:
                 self._write_int(archivo.flags)
             # Escribir contenido de cada archivo
             for archivo in archivos:
-                self._write_bytes(archivo.file)
+                if archivo.path:
+                    copiar_archivo(self.m_file, archivo.path, archivo.length_in, archivo.source_offset)
+                else:
+                    self._write_bytes(archivo.file)
+            metrics.contar_kfn_escrito(f.tell())
         return r
 
     def _write_int(self, value: int) -> bytes:
@@ -88,7 +95,7 @@ class KaraokeFunForm:
         indice = 0
         for a in la:
             a.offset = indice
-            indice += len(a.file)
+            indice += a.length_in
         kfun.l_archivo = la
         return kfun
 
@@ -137,22 +144,25 @@ class KaraokeFunForm:
         return song_ini_mod
 
     def _get_file(self, path_url: str, tipo: int) -> ArchivoKFUN:
+        # Solo se obtiene el tamaño; el contenido se copia por bloques al escribir.
+        path = str(path_url)
         try:
-            with open(path_url, 'rb') as f:
-                bytes = f.read()
-        except IOError as e:
+            length = os.stat(path).st_size
+        except OSError as e:
             msg = _log_print("ERROR",f"No se pudo leer el archivo en KaraokeFunForm: {str(e)}")
             logger.error(msg)
-            bytes = b''
+            path = None
+            length = 0
         filename = Path(path_url).name
         archivo = ArchivoKFUN(
             type=tipo,
             filename=self._remover_acentos(filename),
-            length_in=len(bytes),
-            length_out=len(bytes),
+            length_in=length,
+            length_out=length,
             offset=0,
             flags=0,
-            file=bytes
+            file=b'' if path is None else None,
+            path=path
         )
         return archivo
 
@@ -6,6 +6,8 @@ from karafun_manager.models.ArchivoKFUN import ArchivoKFUN
 from karafun_manager.models.FormatKFUN import FormatKFUN
 from karafun_manager.models.TagKFUN import TagKFUN
 from karafun_manager.utils.print import _log_print
+from karafun_manager.utils import metrics
+from karafun_manager.utils.kfn_io import copiar_archivo
 from ms_karafun import config
 import logging
 from karafun_manager.utils import logs
@@ -57,7 +59,11 @@ class KaraokeFunForm2:
                 self._write_int(archivo.flags)
             # Escribir contenido de cada archivo
             for archivo in archivos:
-                self._write_bytes(archivo.file)
+                if archivo.path:
+                    copiar_archivo(self.m_file, archivo.path, archivo.length_in, archivo.source_offset)
+                else:
+                    self._write_bytes(archivo.file)
+            metrics.contar_kfn_escrito(f.tell())
         msg = "[INFO] Archivo KFN Recreado con Éxito"
         print(msg)
         logger.info(msg)
@@ -72,7 +78,7 @@ class KaraokeFunForm2:
         indice = 0
         for a in la:
             a.offset = indice
-            indice += len(a.file)
+            indice += a.length_in
         kfun.l_archivo = la
         return kfun
     
@@ -101,35 +107,39 @@ class KaraokeFunForm2:
         for path in Path(self.extract_dir).iterdir():
             if not path.is_file():
                 continue
-            ext = path.suffix.lower()
-            if path.name.lower() == "song.ini":
-                tipo = 1
-            elif ext == ".mp3":
-                tipo = 2
-            elif ext in [".jpg", ".jpeg", ".png"]:
-                tipo = 3
-            else:
-                tipo = 0
-            l.append(self._get_file(str(path), tipo))
+            l.append(self._get_file(str(path), self._get_tipo(path.name)))
         return l
+
+    def _get_tipo(self, filename: str) -> int:
+        ext = Path(filename).suffix.lower()
+        if filename.lower() == "song.ini":
+            return 1
+        if ext == ".mp3":
+            return 2
+        if ext in [".jpg", ".jpeg", ".png"]:
+            return 3
+        return 0
     
     def _get_file(self, path_url: str, tipo: int) -> ArchivoKFUN:
+        # Solo se obtiene el tamaño; el contenido se copia por bloques al escribir.
+        path = str(path_url)
         try:
-            with open(path_url, 'rb') as f:
-                bytes = f.read()
-        except IOError as e:
+            length = os.stat(path).st_size
+        except OSError as e:
             msg = _log_print("ERROR",f"No se pudo leer el archivo en KaraokeFunForm2: {str(e)}")
             logger.error(msg)
-            bytes = b''
+            path = None
+            length = 0
         filename = Path(path_url).name
         archivo = ArchivoKFUN(
             type=tipo,
             filename=self._remover_acentos(filename),
-            length_in=len(bytes),
-            length_out=len(bytes),
+            length_in=length,
+            length_out=length,
             offset=0,
             flags=0,
-            file=bytes
+            file=b'' if path is None else None,
+            path=path
         )
         return archivo
     
@@ -1,5 +1,9 @@
 from django.urls import path
+from ms_karafun import config
+from karafun_manager.utils.metrics import medir_urls
 from . import views
+if config.get_vistas_async():
+    from . import views_async as views
 
 urlpatterns = [
     path('check/', views.check_connection),
@@ -17,5 +21,16 @@ urlpatterns = [
     path('deleteCarpeta/', views.delete_carpeta),
     path('comprobarAudio/', views.comprobar_audio),
     path('validarKFN/', views.comprobar_kfn),
-    path('terminarCancion/', views.terminar_canciones)
-]
\ No newline at end of file
+    path('terminarCancion/', views.terminar_canciones),
+    path('estadoScheduler/', views.estado_scheduler),
+    path('ajustarAnchoBanda/', views.ajustar_ancho_banda),
+    path('estadoDrive/', views.estado_drive),
+    path('estadoDB/', views.estado_db),
+    path('estadoJob/', views.estado_job),
+    path('cancelarJob/', views.cancelar_job),
+    path('listarJobs/', views.listar_jobs),
+    path('metrics', views.metricas)
+]
+
+# Latencia y peticiones por URL para /metrics.
+medir_urls(urlpatterns)
\ No newline at end of file
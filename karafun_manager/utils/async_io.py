@@ -0,0 +1,83 @@
+import asyncio
+from ms_karafun import config
+from karafun_manager.utils.prioridad import con_prioridad, prioridad_actual
+from karafun_manager.utils.scheduler import get_scheduler
+
+# Puente entre las vistas async y el código bloqueante. El event loop nunca
+# espera E/S: las operaciones de Drive, disco o CPU se envían a su carril del
+# planificador (ya acotado) y el resto a hilos limitados por un semáforo.
+
+class _Hilos:
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self.semaforo = asyncio.Semaphore(maximo)
+        self.ocupados = 0
+        self.esperando = 0
+        self.completados = 0
+
+    def metricas(self) -> dict:
+        return {
+            'maximo': self.maximo,
+            'ocupados': self.ocupados,
+            'esperando': self.esperando,
+            'completados': self.completados,
+        }
+
+# Solo se usa desde el hilo del event loop: no necesita lock.
+_hilos = None
+
+def _get_hilos() -> _Hilos:
+    global _hilos
+    if _hilos is None:
+        _hilos = _Hilos(max(1, config.get_async_hilos()))
+    return _hilos
+
+# Ejecuta fn en un hilo, con como mucho ASYNC_HILOS a la vez.
+async def en_hilo(fn, *args, **kwargs):
+    hilos = _get_hilos()
+    hilos.esperando += 1
+    try:
+        await hilos.semaforo.acquire()
+    finally:
+        hilos.esperando -= 1
+    hilos.ocupados += 1
+    try:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    finally:
+        hilos.ocupados -= 1
+        hilos.completados += 1
+        hilos.semaforo.release()
+
+# Recorre un iterador bloqueante desde el loop: cada elemento se pide en un hilo.
+async def iterar_en_hilo(iterador):
+    iterador = iter(iterador)
+    fin = object()
+    try:
+        while True:
+            elemento = await en_hilo(next, iterador, fin)
+            if elemento is fin:
+                return
+            yield elemento
+    finally:
+        cerrar = getattr(iterador, 'close', None)
+        if cerrar is not None:
+            await en_hilo(cerrar)
+
+# Envía fn al carril indicado y espera su resultado sin bloquear el loop. La
+# clase de prioridad se fija al enviar (no hay await dentro del bloque, así
+# que no se mezcla con la de otras peticiones del mismo loop).
+async def en_carril(lane: str, fn, *args, prioridad: str = None, **kwargs):
+    with con_prioridad(prioridad or prioridad_actual()):
+        future = get_scheduler().submit(lane, fn, *args, **kwargs)
+    return await asyncio.wrap_future(future)
+
+# Como Scheduler.map, pero concurrente dentro del loop.
+async def map_carril(lane: str, fn, items, prioridad: str = None) -> list:
+    return list(await asyncio.gather(*(en_carril(lane, fn, item, prioridad=prioridad) for item in items)))
+
+def metricas() -> dict:
+    return _get_hilos().metricas()
+
+# Igual que metricas(), pero sin crear el semáforo si las vistas async no se usan.
+def metricas_si_existen():
+    return _hilos.metricas() if _hilos is not None else None
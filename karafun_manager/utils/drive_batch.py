@@ -0,0 +1,33 @@
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+# Máximo de llamadas que Drive acepta en una sola petición batch.
+MAX_POR_LOTE = 100
+
+# Ejecuta varias peticiones de Drive (delete/get/update/list...) agrupándolas en
+# peticiones batch. Devuelve, en el mismo orden, un dict por petición con
+# 'success', 'resultado' y 'error'; un error en una no afecta a las demás.
+def ejecutar_lote(service, peticiones: list) -> list:
+    resultados = [None] * len(peticiones)
+    def callback(request_id, response, exception):
+        indice = int(request_id)
+        if exception is not None:
+            resultados[indice] = {'success': False, 'resultado': None, 'error': exception}
+        else:
+            resultados[indice] = {'success': True, 'resultado': response, 'error': None}
+    for inicio in range(0, len(peticiones), MAX_POR_LOTE):
+        batch = service.new_batch_http_request(callback=callback)
+        for indice in range(inicio, min(inicio + MAX_POR_LOTE, len(peticiones))):
+            batch.add(peticiones[indice], request_id=str(indice))
+        try:
+            batch.execute()
+        except Exception as e:
+            # Falló la petición batch completa: marcar como error las que no respondieron.
+            msg = _log_print("ERROR",f"Error al ejecutar lote de Drive: {e}")
+            logger.error(msg)
+            for indice in range(inicio, min(inicio + MAX_POR_LOTE, len(peticiones))):
+                if resultados[indice] is None:
+                    resultados[indice] = {'success': False, 'resultado': None, 'error': e}
+    return resultados
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+from datetime import datetime
+from ms_karafun import config
+from karafun_manager.repositories.cancion_repository import CancionRepository
+from karafun_manager.utils.drive_client import get_drive_provider
+from karafun_manager.utils.drive_folders import get_folder_resolver, FOLDER_MIME
+from karafun_manager.utils.drive_manager import download_all_files, download_file
+from karafun_manager.utils.result_cache import get_versiones_carpeta
+from karafun_manager.utils.sync_stats import nueva_sync
+from karafun_manager.utils.scheduler import get_scheduler, DRIVE, TRANSFER
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+CHANGE_FIELDS = "nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, parents, modifiedTime, md5Checksum, size, mimeType, trashed))"
+
+# Solo una sincronización incremental a la vez: comparten el mismo cursor.
+_sync_lock = threading.Lock()
+
+# Devuelve (token, {fileId: key}). El mapa guarda la key de cada archivo visto
+# en ejecuciones anteriores: los cambios de archivos eliminados definitivamente
+# no traen `file` ni sus carpetas.
+def _leer_cursor() -> tuple:
+    path = config.get_path_drive_cursor()
+    if not os.path.isfile(path):
+        return None, {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        return datos.get("start_page_token"), datos.get("archivos", {})
+    except Exception as e:
+        msg = _log_print("WARNING",f"No se pudo leer el cursor de cambios de Drive: {e}")
+        logger.warning(msg)
+        return None, {}
+
+def _guardar_cursor(token: str, archivos: dict):
+    path = config.get_path_drive_cursor()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"start_page_token": token, "archivos": archivos, "actualizado": datetime.now().isoformat()}, f)
+    os.replace(tmp, path)
+
+def _keys_locales() -> set:
+    path_main = config.get_path_main()
+    if not os.path.isdir(path_main):
+        return set()
+    return {d for d in os.listdir(path_main) if os.path.isdir(os.path.join(path_main, d))}
+
+# Sincronización incremental: aplica a las carpetas locales solo los archivos
+# que cambiaron en kia_songs desde la última ejecución (changes.list + cursor).
+# Sin cambios remotos cuesta una sola llamada a la API. El cursor es global,
+# así que los cambios se aplican siempre a todas las keys locales; `keys` solo
+# filtra el resumen de la respuesta. Si alguna descarga falla el cursor no
+# avanza y la siguiente ejecución vuelve a procesar esos cambios.
+def sincronizar_cambios(keys: list = None) -> dict:
+    with _sync_lock:
+        service = get_drive_provider().get_service()
+        parent_folder_id = CancionRepository().get_parent_folder()
+        if not parent_folder_id:
+            return {"success": False, "message": "No se pudo obtener la carpeta principal 'kia_songs'."}
+        locales = _keys_locales()
+        token, archivos = _leer_cursor()
+        if token is None:
+            # Primera ejecución: tomar el cursor antes de la sincronización completa
+            # para no perder cambios que ocurran mientras tanto.
+            nuevo_token = service.changes().getStartPageToken().execute()["startPageToken"] # pylint: disable=no-member
+            completas = sorted(locales | set(keys or []))
+            resultados = get_scheduler().map(DRIVE, download_all_files, completas)
+            fallidos = [k for k, r in zip(completas, resultados) if not r.get("success")]
+            if fallidos:
+                msg = _log_print("WARNING",f"Sincronización completa con {len(fallidos)} key(s) fallidas; el cursor de cambios no se inicializa.")
+                logger.warning(msg)
+                return {"success": False, "message": f"No se pudieron sincronizar {len(fallidos)} key(s).", "fallidos": fallidos}
+            _guardar_cursor(nuevo_token, {})
+            msg = _log_print("INFO",f"Cursor de cambios inicializado; sincronización completa de {len(completas)} key(s).")
+            logger.info(msg)
+            return {"success": True, "message": "Sincronización completa realizada.", "keys": len(completas), "archivos": None}
+        resolver = get_folder_resolver()
+        versiones = get_versiones_carpeta()
+        carpetas = {}
+        cambios = []
+        while True:
+            response = service.changes().list( # pylint: disable=no-member
+                pageToken=token, spaces="drive", pageSize=1000, fields=CHANGE_FIELDS
+            ).execute()
+            for change in response.get("changes", []):
+                f = change.get("file")
+                # La carpeta donde estaba el archivo (si se conoce) cambió su listado.
+                anterior = archivos.pop(change.get("fileId"), None)
+                if anterior:
+                    versiones.incrementar(anterior)
+                if change.get("removed") or not f:
+                    if not anterior:
+                        # Eliminado sin carpeta conocida: puede ser de cualquier key.
+                        versiones.incrementar_todas()
+                    continue
+                if f.get("mimeType") == FOLDER_MIME:
+                    continue
+                for folder_id in f.get("parents", []):
+                    key = _key_de_carpeta(service, folder_id, parent_folder_id, carpetas, resolver)
+                    if not key:
+                        continue
+                    # El listado de la carpeta cambió (también si se envió a la papelera).
+                    archivos[f["id"]] = key
+                    if key != anterior:
+                        versiones.incrementar(key)
+                    if key in locales and not f.get("trashed"):
+                        cambios.append((key, f))
+                    break
+            token = response.get("nextPageToken") or token
+            if "newStartPageToken" in response:
+                nuevo_token = response["newStartPageToken"]
+                break
+        stats = nueva_sync()
+        futures = []
+        for key, f in cambios:
+            dest_dir = os.path.join(config.get_path_main(), key)
+            futures.append(get_scheduler().submit(TRANSFER, download_file, f, dest_dir, stats))
+        for future in futures:
+            future.result()
+        transferencia = stats.to_dict()
+        if transferencia["archivos_fallidos"]:
+            msg = _log_print("WARNING",f"Sincronización incremental con {transferencia['archivos_fallidos']} archivo(s) fallidos; el cursor de cambios no avanza.")
+            logger.warning(msg)
+            return {"success": False, "message": f"No se pudieron sincronizar {transferencia['archivos_fallidos']} archivo(s).", "transferencia": transferencia}
+        _guardar_cursor(nuevo_token, archivos)
+        msg = _log_print("INFO",f"Sincronización incremental: {len(cambios)} archivo(s) actualizados.")
+        logger.info(msg)
+        if keys:
+            cambios = [(k, f) for k, f in cambios if k in keys]
+        return {"success": True, "message": "Sincronización incremental completada.", "keys": len({k for k, _ in cambios}), "archivos": len(cambios), "transferencia": transferencia}
+
+# Devuelve la key de una carpeta si es hija directa de kia_songs.
+def _key_de_carpeta(service, folder_id, parent_folder_id, carpetas, resolver):
+    if folder_id in carpetas:
+        return carpetas[folder_id]
+    key = resolver.key_de(folder_id, parent_folder_id)
+    if key is None:
+        info = service.files().get(fileId=folder_id, fields="id, name, parents, mimeType").execute() # pylint: disable=no-member
+        if info.get("mimeType") == FOLDER_MIME and parent_folder_id in info.get("parents", []):
+            key = info["name"]
+            resolver.registrar(key, folder_id, parent_folder_id)
+    carpetas[folder_id] = key
+    return key
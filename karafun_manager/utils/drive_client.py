@@ -0,0 +1,116 @@
+import threading
+import weakref
+import google_auth_httplib2
+import httplib2
+from googleapiclient.discovery import build
+from google.auth.credentials import AnonymousCredentials
+from google.oauth2 import service_account
+from ms_karafun import config
+from karafun_manager.utils.drive_control import HttpControlado, get_drive_control
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/drive"]
+# Segundos de espera de cada conexión HTTP con Drive.
+HTTP_TIMEOUT = 120
+GOOGLEAPIS = "https://www.googleapis.com/"
+
+# Entrega un cliente de Drive por hilo (httplib2 no es thread-safe) reutilizando
+# las credenciales y la conexión keep-alive de cada hilo entre llamadas. Un
+# cliente vive lo mismo que su hilo: la cantidad ya está acotada por los
+# carriles del planificador y los hilos del servidor.
+class DriveClientProvider:
+    def __init__(self, credentials_file: str):
+        self.credentials_file = credentials_file
+        self._creds = None
+        self._lock = threading.Lock()
+        self._clientes = {}
+        self.creaciones = 0
+        self.reutilizaciones = 0
+        self.descartes = 0
+
+    # Las credenciales (y su token) se comparten por todo el proceso.
+    def _credenciales(self):
+        if self._creds is None:
+            with self._lock:
+                if self._creds is None:
+                    if config.get_drive_api_endpoint():
+                        # El servidor local no valida credenciales.
+                        self._creds = AnonymousCredentials()
+                    else:
+                        self._creds = service_account.Credentials.from_service_account_file(self.credentials_file, scopes=SCOPES)
+        return self._creds
+
+    def get_service(self):
+        hilo = threading.current_thread()
+        with self._lock:
+            entrada = self._clientes.get(hilo.ident)
+            if entrada is not None and entrada[0]() is hilo:
+                self.reutilizaciones += 1
+                return entrada[1]
+        base = httplib2.Http(timeout=HTTP_TIMEOUT)
+        # Drive responde 308 en las subidas reanudables: no es una redirección.
+        base.redirect_codes = base.redirect_codes - {308}
+        endpoint = config.get_drive_api_endpoint()
+        if endpoint:
+            base = HttpLocal(base, endpoint)
+        http = google_auth_httplib2.AuthorizedHttp(self._credenciales(), http=base)
+        # Limitador, reintentos y breaker compartidos por todos los clientes.
+        http = HttpControlado(http, get_drive_control())
+        service = build("drive", "v3", http=http, cache_discovery=False)
+        with self._lock:
+            self.creaciones += 1
+            self._clientes[hilo.ident] = (weakref.ref(hilo), service)
+            self._purgar()
+        return service
+
+    # Descarta los clientes de hilos que ya terminaron. Debe llamarse con el
+    # lock tomado.
+    def _purgar(self):
+        for ident, (ref, _) in list(self._clientes.items()):
+            hilo = ref()
+            if hilo is None or not hilo.is_alive():
+                del self._clientes[ident]
+                self.descartes += 1
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                'clientes': len(self._clientes),
+                'creaciones': self.creaciones,
+                'reutilizaciones': self.reutilizaciones,
+                'descartes': self.descartes,
+            }
+
+# Envía a `endpoint` las peticiones dirigidas a www.googleapis.com (incluidos
+# los lotes y las subidas, que no respetan client_options.api_endpoint).
+class HttpLocal:
+    def __init__(self, http, endpoint: str):
+        self.__dict__['_http'] = http
+        self.__dict__['_endpoint'] = endpoint if endpoint.endswith("/") else f"{endpoint}/"
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._http, name, value)
+
+    def request(self, uri, *args, **kwargs):
+        if uri.startswith(GOOGLEAPIS):
+            uri = self._endpoint + uri[len(GOOGLEAPIS):]
+        return self._http.request(uri, *args, **kwargs)
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def get_drive_provider() -> DriveClientProvider:
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = DriveClientProvider(config.get_path_credentials())
+                msg = _log_print("INFO","Pool de clientes de Drive inicializado (un cliente por hilo).")
+                logger.info(msg)
+    return _provider
@@ -0,0 +1,272 @@
+import random
+import re
+import threading
+import time
+import httplib2
+from ms_karafun import config
+from karafun_manager.utils import metrics
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+# Códigos que se reintentan. 403 solo cuando Drive indica límite de cuota.
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+RAZONES_LIMITE = (b"userRateLimitExceeded", b"rateLimitExceeded")
+# Métodos que se pueden repetir sin efectos duplicados si se perdió la respuesta.
+METODOS_IDEMPOTENTES = {"GET", "HEAD", "PUT", "DELETE"}
+# Método de cada petición dentro del cuerpo multipart de un /batch.
+METODO_EN_LOTE = re.compile(rb"^(GET|HEAD|POST|PUT|PATCH|DELETE) /", re.MULTILINE)
+# Espera base y máxima (segundos) del backoff exponencial.
+ESPERA_BASE = 1.0
+ESPERA_MAXIMA = 32.0
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMI_ABIERTO = "semi_abierto"
+
+class DriveNoDisponibleError(IOError):
+    pass
+
+# Token bucket cuya tasa (peticiones/s) se ajusta AIMD: sube de forma aditiva
+# con cada respuesta correcta y se reduce a la mitad ante un límite de cuota.
+class RateLimiter:
+    def __init__(self, rate: float, rate_min: float, rate_max: float):
+        self.rate_min = max(0.1, rate_min)
+        self.rate_max = max(self.rate_min, rate_max)
+        self.rate = min(self.rate_max, max(self.rate_min, rate))
+        self._tokens = self.rate
+        self._ultimo = time.monotonic()
+        self._ultima_reduccion = 0.0
+        self._lock = threading.Lock()
+        self.esperas = 0
+        self.reducciones = 0
+
+    def adquirir(self):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                capacidad = max(1.0, self.rate)
+                self._tokens = min(capacidad, self._tokens + (ahora - self._ultimo) * self.rate)
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.rate
+                self.esperas += 1
+            time.sleep(espera)
+
+    # +1 petición/s por cada "ventana" de respuestas correctas.
+    def aumentar(self):
+        with self._lock:
+            self.rate = min(self.rate_max, self.rate + 1.0 / max(self.rate, 1.0))
+
+    def reducir(self):
+        with self._lock:
+            ahora = time.monotonic()
+            # Una ráfaga de 429 simultáneos cuenta como una sola señal.
+            if ahora - self._ultima_reduccion < 1.0:
+                return
+            self._ultima_reduccion = ahora
+            self.rate = max(self.rate_min, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            self.reducciones += 1
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                'rate': round(self.rate, 2),
+                'rate_min': self.rate_min,
+                'rate_max': self.rate_max,
+                'esperas': self.esperas,
+                'reducciones': self.reducciones,
+            }
+
+# Tras `umbral` fallos seguidos (5xx o errores de red) deja de llamar a Drive
+# durante `espera` segundos; luego deja pasar una sola petición de prueba.
+class CircuitBreaker:
+    def __init__(self, umbral: int, espera: float):
+        self.umbral = max(1, umbral)
+        self.espera = espera
+        self.estado = CERRADO
+        self._fallos = 0
+        self._abierto_desde = 0.0
+        self._sondeo = False
+        self._lock = threading.Lock()
+        self.aperturas = 0
+        self.rechazos = 0
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == ABIERTO and time.monotonic() - self._abierto_desde >= self.espera:
+                self.estado = SEMI_ABIERTO
+                self._sondeo = False
+            if self.estado == CERRADO:
+                return
+            if self.estado == SEMI_ABIERTO and not self._sondeo:
+                self._sondeo = True
+                return
+            self.rechazos += 1
+        raise DriveNoDisponibleError("Google Drive no disponible: demasiados errores seguidos, reintente en unos segundos.")
+
+    def exito(self):
+        with self._lock:
+            if self.estado != CERRADO:
+                msg = _log_print("INFO","Conexión con Google Drive restablecida.")
+                logger.info(msg)
+            self.estado = CERRADO
+            self._fallos = 0
+            self._sondeo = False
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self.estado == SEMI_ABIERTO or (self.estado == CERRADO and self._fallos >= self.umbral):
+                self.estado = ABIERTO
+                self._abierto_desde = time.monotonic()
+                self._sondeo = False
+                self.aperturas += 1
+                msg = _log_print("WARNING",f"Google Drive no responde ({self._fallos} fallos seguidos); se suspenden las llamadas {self.espera:.0f}s.")
+                logger.warning(msg)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                'estado': self.estado,
+                'fallos_seguidos': self._fallos,
+                'aperturas': self.aperturas,
+                'rechazos': self.rechazos,
+            }
+
+# Estado compartido por todos los clientes de Drive del proceso.
+class DriveControl:
+    def __init__(self):
+        self.limiter = RateLimiter(config.get_drive_rate(), config.get_drive_rate_min(), config.get_drive_rate_max())
+        self.breaker = CircuitBreaker(config.get_drive_breaker_fallos(), config.get_drive_breaker_espera())
+        self.max_reintentos = max(0, config.get_drive_reintentos())
+        self._lock = threading.Lock()
+        self.peticiones = 0
+        self.reintentos = 0
+        self.limites = 0
+
+    def _contar(self, campo: str):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            datos = {'peticiones': self.peticiones, 'reintentos': self.reintentos, 'limites': self.limites}
+        datos['limiter'] = self.limiter.metricas()
+        datos['breaker'] = self.breaker.metricas()
+        return datos
+
+# Envuelve el http de un cliente de Drive: toda petición (incluidos los lotes y
+# las descargas por rango) pasa por el limitador, el breaker y los reintentos.
+class HttpControlado:
+    def __init__(self, http, control: DriveControl):
+        self.__dict__['_http'] = http
+        self.__dict__['_control'] = control
+
+    # googleapiclient lee y ajusta atributos del http (credentials, redirect_codes...).
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._http, name, value)
+
+    def request(self, uri, *args, **kwargs):
+        control = self._control
+        intento = 0
+        # Misma firma que httplib2: request(uri, method, body, headers, ...).
+        method = kwargs.get("method", args[0] if args else "GET")
+        body = kwargs.get("body", args[1] if len(args) > 1 else None)
+        operacion = metrics.operacion_drive(method, uri)
+        enviados = len(body) if isinstance(body, (bytes, str)) else 0
+        reintentable = _es_reintentable(method, uri, body)
+        while True:
+            control.breaker.permitir()
+            control.limiter.adquirir()
+            control._contar('peticiones')
+            inicio = time.perf_counter()
+            try:
+                resp, content = self._http.request(uri, *args, **kwargs)
+            except (OSError, httplib2.HttpLib2Error) as e:
+                metrics.registrar_drive(operacion, "error", time.perf_counter() - inicio, enviados, 0)
+                control.breaker.fallo()
+                if not reintentable or intento >= control.max_reintentos:
+                    raise
+                _esperar(intento, None, f"{type(e).__name__}: {e}")
+                control._contar('reintentos')
+                intento += 1
+                continue
+            except Exception:
+                # Cualquier otro error (p. ej. al refrescar el token) también
+                # cierra la petición de prueba del breaker.
+                metrics.registrar_drive(operacion, "error", time.perf_counter() - inicio, enviados, 0)
+                control.breaker.fallo()
+                raise
+            metrics.registrar_drive(operacion, str(resp.status), time.perf_counter() - inicio, enviados, len(content or b""))
+            if _es_limite(resp, content):
+                control._contar('limites')
+                control.limiter.reducir()
+                control.breaker.exito()
+            elif resp.status in ESTADOS_REINTENTABLES:
+                control.breaker.fallo()
+                if not reintentable:
+                    # Drive pudo haber aplicado la petición: la decide quien llama.
+                    return resp, content
+            else:
+                control.limiter.aumentar()
+                control.breaker.exito()
+                return resp, content
+            if intento >= control.max_reintentos:
+                # googleapiclient convierte la respuesta en HttpError.
+                return resp, content
+            _esperar(intento, resp.get("retry-after"), f"HTTP {resp.status}")
+            control._contar('reintentos')
+            intento += 1
+
+# Los errores de red y 5xx solo se reintentan en peticiones idempotentes: un
+# POST (files.create, lote con escrituras) pudo haberse aplicado aunque se
+# perdiera la respuesta. Las sesiones reanudables sí: iniciar una no crea nada
+# y los bloques se envían con PUT. Un límite de cuota (429) siempre se
+# reintenta porque Drive rechazó la petición sin aplicarla.
+def _es_reintentable(method: str, uri: str, body) -> bool:
+    method = (method or "GET").upper()
+    if method in METODOS_IDEMPOTENTES:
+        return True
+    if "uploadType=resumable" in uri:
+        return True
+    if "/batch" in uri and isinstance(body, (bytes, str)):
+        datos = body if isinstance(body, bytes) else body.encode("utf-8")
+        metodos = {m.decode("ascii") for m in METODO_EN_LOTE.findall(datos)}
+        return bool(metodos) and metodos <= METODOS_IDEMPOTENTES
+    return False
+
+def _es_limite(resp, content) -> bool:
+    if resp.status == 429:
+        return True
+    if resp.status == 403:
+        datos = content if isinstance(content, bytes) else str(content or "").encode("utf-8")
+        return any(r in datos for r in RAZONES_LIMITE)
+    return False
+
+# Backoff exponencial con jitter completo; respeta Retry-After si Drive lo envía.
+def _esperar(intento: int, retry_after, motivo: str):
+    espera = random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * (2 ** intento)))
+    if retry_after and str(retry_after).isdigit():
+        espera = max(espera, float(retry_after))
+    msg = _log_print("WARNING",f"Drive respondió {motivo}; reintento {intento + 1} en {espera:.1f}s.")
+    logger.warning(msg)
+    time.sleep(espera)
+
+_control = None
+_control_lock = threading.Lock()
+
+def get_drive_control() -> DriveControl:
+    global _control
+    if _control is None:
+        with _control_lock:
+            if _control is None:
+                _control = DriveControl()
+    return _control
@@ -0,0 +1,158 @@
+import glob
+import os
+import random
+import time
+from googleapiclient.errors import HttpError
+from karafun_manager.utils.drive_client import get_drive_provider
+from karafun_manager.utils.drive_control import DriveNoDisponibleError, ESPERA_BASE, ESPERA_MAXIMA
+from karafun_manager.utils.kfn_io import copiar_archivo
+from karafun_manager.utils.scheduler import get_scheduler, RANGE
+from karafun_manager.utils.prioridad import get_limite_lote
+from karafun_manager.utils.print import _log_print
+from ms_karafun import config
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+# Reintentos de un mismo tramo ante cortes de red; cada reintento continúa
+# desde el último byte escrito, tras el mismo backoff con jitter de drive_control.
+REINTENTOS = 3
+
+# Descarga un archivo de Drive a `final_path` sin dejar nunca un archivo truncado
+# en esa ruta: se escribe en `.partial`, se reanuda con Range desde lo que ya
+# exista y al terminar se hace fsync + rename. Los archivos grandes se dividen en
+# tramos que se descargan en paralelo (`.partial.N`) y luego se concatenan.
+# `version` (md5Checksum o modifiedTime de Drive) se guarda junto al `.partial`:
+# un parcial de otra revisión del archivo se descarta en lugar de reanudarse.
+def descargar(file_id: str, final_path: str, size: int = None, version: str = None) -> int:
+    chunk_size = config.get_download_chunk_size()
+    partial_path = f"{final_path}.partial"
+    partes = max(1, config.get_download_partes())
+    _preparar_parcial(partial_path, size, version)
+    if size and partes > 1 and size >= config.get_download_umbral_paralelo() and not os.path.exists(partial_path):
+        _descargar_tramos(file_id, partial_path, size, partes, chunk_size)
+    else:
+        with open(partial_path, "ab") as f:
+            _descargar_rango(file_id, f, f.tell(), (size - 1) if size else None, chunk_size, completo=True)
+    with open(partial_path, "rb+") as f:
+        f.flush()
+        os.fsync(f.fileno())
+    descargados = os.path.getsize(partial_path)
+    if size is not None and descargados != size:
+        # No se reanuda: el próximo intento empieza desde cero.
+        _descartar_parcial(partial_path)
+        raise IOError(f"Descarga incompleta de {os.path.basename(final_path)}: {descargados} de {size} bytes")
+    os.replace(partial_path, final_path)
+    _eliminar(f"{partial_path}.version")
+    return descargados
+
+# Descarta el parcial si es de otra versión del archivo remoto (o más grande que
+# él) y registra la versión que se va a descargar.
+def _preparar_parcial(partial_path: str, size: int, version: str):
+    version_path = f"{partial_path}.version"
+    anterior = None
+    if os.path.exists(version_path):
+        with open(version_path, "r", encoding="utf-8") as f:
+            anterior = f.read().strip() or None
+    hay_parcial = os.path.exists(partial_path) or bool(_tramos(partial_path))
+    if hay_parcial:
+        if anterior != version:
+            msg = _log_print("WARNING",f"El archivo {os.path.basename(partial_path)} es de otra versión en Drive; se descarga desde cero.")
+            logger.warning(msg)
+            _descartar_parcial(partial_path)
+        elif size is not None and os.path.exists(partial_path) and os.path.getsize(partial_path) > size:
+            _descartar_parcial(partial_path)
+    if version:
+        with open(version_path, "w", encoding="utf-8") as f:
+            f.write(version)
+    else:
+        _eliminar(version_path)
+
+# Tramos `.partial.N` (y la concatenación `.partial.union`) que quedaron en disco.
+def _tramos(partial_path: str) -> list:
+    patron = glob.escape(partial_path) + ".*"
+    return [p for p in glob.glob(patron) if p.rsplit(".", 1)[1].isdigit() or p.endswith(".union")]
+
+def _descartar_parcial(partial_path: str):
+    for path in [partial_path, f"{partial_path}.version"] + _tramos(partial_path):
+        _eliminar(path)
+
+def _eliminar(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _descargar_tramos(file_id: str, partial_path: str, size: int, partes: int, chunk_size: int):
+    tramo = -(-size // partes)
+    rangos = [(i, i * tramo, min(size, (i + 1) * tramo) - 1) for i in range(partes) if i * tramo < size]
+    futures = [get_scheduler().submit(RANGE, _descargar_tramo, file_id, f"{partial_path}.{i}", inicio, fin, chunk_size)
+               for i, inicio, fin in rangos]
+    for future in futures:
+        future.result()
+    # Concatenar en un .partial temporal para que una caída aquí no deje un
+    # `.partial` que luego se reanudaría como si fuera contiguo.
+    union_path = f"{partial_path}.union"
+    with open(union_path, "wb") as f:
+        for i, inicio, fin in rangos:
+            copiar_archivo(f, f"{partial_path}.{i}", fin - inicio + 1)
+    os.replace(union_path, partial_path)
+    for i, _, _ in rangos:
+        os.remove(f"{partial_path}.{i}")
+
+def _descargar_tramo(file_id: str, path: str, inicio: int, fin: int, chunk_size: int):
+    with open(path, "ab") as f:
+        _descargar_rango(file_id, f, inicio + f.tell(), fin, chunk_size)
+
+# Descarga [inicio, fin] (fin=None: hasta el final) al final de `f`, en bloques
+# de `chunk_size`, usando el cliente de Drive del hilo actual. `completo` indica
+# que `f` es el archivo entero y no un tramo.
+def _descargar_rango(file_id: str, f, inicio: int, fin: int, chunk_size: int, completo: bool = False):
+    service = get_drive_provider().get_service()
+    request = service.files().get_media(fileId=file_id) # pylint: disable=no-member
+    pos = inicio
+    fallos = 0
+    while fin is None or pos <= fin:
+        hasta = pos + chunk_size - 1 if fin is None else min(fin, pos + chunk_size - 1)
+        try:
+            resp, content = request.http.request(request.uri, method="GET", headers={"range": f"bytes={pos}-{hasta}"})
+        except DriveNoDisponibleError:
+            # Circuit breaker abierto: reintentar aquí solo lo mantendría abierto.
+            raise
+        except (OSError, TimeoutError) as e:
+            fallos += 1
+            if fallos > REINTENTOS:
+                raise
+            espera = random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * (2 ** (fallos - 1))))
+            msg = _log_print("WARNING",f"Corte de red al descargar {file_id} (byte {pos}); reintento {fallos} en {espera:.1f}s: {e}")
+            logger.warning(msg)
+            time.sleep(espera)
+            continue
+        if resp.status == 416:
+            # Nada más que leer: el tramo ya estaba completo.
+            break
+        if resp.status not in (200, 206):
+            raise HttpError(resp, content, uri=request.uri)
+        if resp.status == 200:
+            # El servidor ignoró el Range y devolvió el archivo entero.
+            if not completo:
+                raise IOError(f"Drive no respetó el rango bytes={pos}-{hasta} de {file_id}")
+            f.seek(0)
+            f.truncate()
+            pos = 0
+        f.write(content)
+        pos += len(content)
+        get_limite_lote().consumir(len(content))
+        fallos = 0
+        total = _total_content_range(resp)
+        if resp.status == 200 or not content or (total is not None and pos >= total):
+            break
+    f.flush()
+
+def _total_content_range(resp):
+    rango = resp.get("content-range", "")
+    if "/" in rango:
+        total = rango.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    return None
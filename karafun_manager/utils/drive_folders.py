@@ -0,0 +1,105 @@
+import threading
+import time
+from karafun_manager.utils.drive_client import get_drive_provider
+from karafun_manager.utils.drive_listing import listar
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+# Keys por consulta OR: mantiene la query muy por debajo del límite de Drive.
+KEYS_POR_CONSULTA = 50
+# Segundos que se conserva el id de una carpeta.
+TTL_CARPETAS = 6 * 60 * 60
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("'", "\\'")
+
+# Resuelve keys de canciones a ids de carpeta dentro de kia_songs agrupando
+# varias keys por consulta y recordando los resultados entre peticiones.
+class FolderResolver:
+    def __init__(self, ttl: float = TTL_CARPETAS):
+        self.ttl = ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.consultas = 0
+
+    def resolver(self, keys, parent_folder_id: str) -> dict:
+        ahora = time.monotonic()
+        resultado = {}
+        pendientes = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entrada = self._cache.get(key)
+                if entrada is not None and entrada[0] == parent_folder_id and entrada[2] > ahora:
+                    resultado[key] = entrada[1]
+                    self.hits += 1
+                else:
+                    pendientes.append(key)
+                    self.misses += 1
+        if pendientes:
+            service = get_drive_provider().get_service()
+            for i in range(0, len(pendientes), KEYS_POR_CONSULTA):
+                grupo = pendientes[i:i + KEYS_POR_CONSULTA]
+                encontrados = self._consultar(service, grupo, parent_folder_id)
+                resultado.update(encontrados)
+        return resultado
+
+    def resolver_uno(self, key: str, parent_folder_id: str):
+        return self.resolver([key], parent_folder_id).get(key)
+
+    def _consultar(self, service, keys: list, parent_folder_id: str) -> dict:
+        nombres = " or ".join(f"name = '{_escapar(k)}'" for k in keys)
+        query = f"'{parent_folder_id}' in parents and mimeType = '{FOLDER_MIME}' and trashed = false and ({nombres})"
+        encontrados = {}
+        with self._lock:
+            self.consultas += 1
+        try:
+            for f in listar(service, query):
+                # Si hay carpetas duplicadas se conserva la primera, como antes.
+                encontrados.setdefault(f['name'], f['id'])
+        except Exception as e:
+            msg = _log_print("ERROR",f"No se pudieron resolver las carpetas de {len(keys)} key(s) en Drive: {e}")
+            logger.error(msg)
+            raise
+        expira = time.monotonic() + self.ttl
+        with self._lock:
+            for key, folder_id in encontrados.items():
+                self._cache[key] = (parent_folder_id, folder_id, expira)
+        return {k: v for k, v in encontrados.items() if k in keys}
+
+    # Búsqueda inversa: key de un id de carpeta ya resuelto.
+    def key_de(self, folder_id: str, parent_folder_id: str):
+        with self._lock:
+            for key, (parent, cached_id, _) in self._cache.items():
+                if cached_id == folder_id and parent == parent_folder_id:
+                    return key
+        return None
+
+    def registrar(self, key: str, folder_id: str, parent_folder_id: str):
+        with self._lock:
+            self._cache[key] = (parent_folder_id, folder_id, time.monotonic() + self.ttl)
+
+    def invalidar(self, key: str = None):
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                'carpetas': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'consultas': self.consultas,
+            }
+
+_resolver = FolderResolver()
+
+def get_folder_resolver() -> FolderResolver:
+    return _resolver
@@ -0,0 +1,34 @@
+# Tamaño de página para files.list (máximo permitido por Drive).
+PAGE_SIZE = 1000
+# Carpetas por consulta al listar varias a la vez.
+CARPETAS_POR_CONSULTA = 50
+
+# Recorre todas las páginas de files.list y entrega cada archivo en cuanto llega
+# su página, para que el consumidor pueda empezar a trabajar antes del final.
+def listar(service, query: str, fields: str = "id, name", page_size: int = PAGE_SIZE):
+    page_token = None
+    while True:
+        response = service.files().list( # pylint: disable=no-member
+            q=query,
+            spaces='drive',
+            fields=f"nextPageToken, files({fields})",
+            pageSize=page_size,
+            pageToken=page_token
+        ).execute()
+        for f in response.get('files', []):
+            yield f
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+
+# Lista el contenido de varias carpetas con consultas
+# "('a' in parents or 'b' in parents ...)". Cada archivo incluye 'parents'.
+def listar_en_carpetas(service, folder_ids: list, filtro: str = "trashed = false", fields: str = "id, name", page_size: int = PAGE_SIZE):
+    ids = list(dict.fromkeys(folder_ids))
+    if "parents" not in fields:
+        fields = f"{fields}, parents"
+    for i in range(0, len(ids), CARPETAS_POR_CONSULTA):
+        grupo = ids[i:i + CARPETAS_POR_CONSULTA]
+        padres = " or ".join(f"'{folder_id}' in parents" for folder_id in grupo)
+        query = f"({padres}) and {filtro}" if filtro else f"({padres})"
+        yield from listar(service, query, fields, page_size)
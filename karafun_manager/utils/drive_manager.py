@@ -1,66 +1,104 @@
 from datetime import datetime, timezone
-import io
 import os
 import platform
 import subprocess
 from django.conf import settings
 from googleapiclient.errors import HttpError
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-from google.oauth2 import service_account
 from karafun_manager.repositories.cancion_repository import CancionRepository
+from karafun_manager.utils.drive_client import get_drive_provider
+from karafun_manager.utils.drive_folders import get_folder_resolver
+from karafun_manager.utils.drive_batch import ejecutar_lote
+from karafun_manager.utils.drive_download import descargar
+from karafun_manager.utils.drive_upload import subir, get_upload_ids
+from karafun_manager.utils.drive_listing import listar, listar_en_carpetas
+from karafun_manager.utils.hash_cache import get_hash_cache, calcular_md5
 from karafun_manager.utils.karafun_studio import open_karafun
 from karafun_manager.utils.print import _log_print
-from concurrent.futures import ThreadPoolExecutor
+from karafun_manager.utils.result_cache import get_cache_audios, get_versiones_carpeta
+from karafun_manager.utils.scheduler import get_scheduler, TRANSFER
+from karafun_manager.utils.single_flight import single_flight
+from karafun_manager.utils.sync_stats import SyncStats, nueva_sync, get_sync_totales, OMITIDO, DESCARGADO, SUBIDO, FALLIDO
 from ms_karafun import config
 import logging
 from karafun_manager.utils import logs
 logger = logging.getLogger(__name__)
 
-SCOPES = ["https://www.googleapis.com/auth/drive"]
-SERVICE_ACCOUNT_FILE = config.get_path_credentials()
+# Campos necesarios para decidir la sincronización de un archivo.
+DRIVE_FILE_FIELDS = "id, name, modifiedTime, md5Checksum, size"
 
-# Autentica y devuelve un cliente de Google Drive API
+# Devuelve el cliente de Google Drive API del hilo actual (reutilizado entre llamadas)
 def authenticate_drive():
-    creds = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    return build("drive", "v3", credentials=creds, cache_discovery=False)
+    return get_drive_provider().get_service()
 
-def download_file(file, dest_dir):
+# Sincroniza un archivo y anota el resultado en `stats`. Las llamadas
+# concurrentes para la misma ruta comparten una sola transferencia, pero cada
+# una lo registra en su propia sincronización (el acumulado del proceso lo
+# suma una sola vez la ejecución que transfirió).
+def download_file(file, dest_dir, stats: SyncStats = None):
+    resultado = _sincronizar_archivo(file, dest_dir)
+    if resultado is not None and stats is not None:
+        stats.registrar(*resultado, acumular=False)
+
+# Decide por contenido: si el md5Checksum y el tamaño de Drive coinciden con el
+# archivo local no se transfiere nada; el mtime solo define la dirección cuando
+# el contenido difiere (o Drive no expone md5, como en los documentos nativos).
+# Devuelve (resultado, bytes) o None si el archivo no se sincroniza.
+@single_flight("descargar_archivo", clave=lambda file, dest_dir: os.path.join(dest_dir, file['name']))
+def _sincronizar_archivo(file, dest_dir):
     try:
         service = authenticate_drive()
         file_id = file['id']
         file_name = file['name']
         if file_name in ['render_kfn_p1.mp4', 'render_kfn_p1_ensayo.mp4']:
-            return
+            return None
         drive_modified = datetime.strptime(file['modifiedTime'], "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+        drive_md5 = file.get('md5Checksum')
+        drive_size = int(file.get('size') or 0)
         local_path = os.path.join(dest_dir, file_name)
         if os.path.exists(local_path):
+            local_size = os.path.getsize(local_path)
             local_modified = datetime.fromtimestamp(os.path.getmtime(local_path), tz=timezone.utc)
-            if local_modified > drive_modified:
-                msg = _log_print("INFO",f"El archivo local {file_name} es más reciente. Subiendo a Drive...")
-                logger.info(msg)
-                upload_file(service, local_path, file_id)
-                return
-            elif local_modified == drive_modified:
+            if drive_md5:
+                iguales = local_size == drive_size and get_hash_cache().md5(local_path) == drive_md5
+            else:
+                iguales = local_modified == drive_modified
+            if iguales:
                 msg = _log_print("INFO",f"El archivo {file_name} ya está actualizado.")
                 logger.info(msg)
-                return
-            else:
-                msg = _log_print("INFO",f"El archivo en Drive {file_name} es más reciente. Reemplazando...")
+                return _resultado(OMITIDO, local_size)
+            if local_modified > drive_modified:
+                msg = _log_print("INFO",f"El archivo local {file_name} es más reciente. Subiendo a Drive...")
                 logger.info(msg)
-        request = service.files().get_media(fileId=file_id) # pylint: disable=no-member
-        fh = io.FileIO(local_path, 'wb')
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            done = downloader.next_chunk()
+                if upload_file(service, local_path, file_id):
+                    return _resultado(SUBIDO, local_size)
+                return _resultado(FALLIDO)
+            msg = _log_print("INFO",f"El archivo en Drive {file_name} es más reciente. Reemplazando...")
+            logger.info(msg)
+        descargar(file_id, local_path, drive_size if file.get('size') else None, drive_md5 or file['modifiedTime'])
         os.utime(local_path, (drive_modified.timestamp(), drive_modified.timestamp()))
+        if drive_md5:
+            # Solo se registra en la caché un hash comprobado: un archivo dañado
+            # quedaría marcado como actualizado para siempre.
+            local_md5 = calcular_md5(local_path)
+            if local_md5 != drive_md5:
+                os.remove(local_path)
+                msg = _log_print("ERROR",f"El md5 de {file_name} no coincide con Drive ({local_md5} != {drive_md5}); se eliminó la copia local.")
+                logger.error(msg)
+                return _resultado(FALLIDO)
+            get_hash_cache().registrar(local_path, local_md5)
         msg = _log_print("INFO",f"Archivo {file_name} descargado en: {local_path}")
         logger.info(msg)
+        return _resultado(DESCARGADO, os.path.getsize(local_path))
     except Exception as e:
         msg = _log_print("ERROR",f"Error al descargar {file['name']}: {e}")
         logger.error(msg)
+        return _resultado(FALLIDO)
+
+def _resultado(resultado: str, size: int = 0) -> tuple:
+    get_sync_totales().registrar(resultado, size)
+    return resultado, size
 
+@single_flight("sync")
 def download_all_files(song_key: str) -> dict:
     try:
         service = authenticate_drive()
@@ -71,35 +109,51 @@ def download_all_files(song_key: str) -> dict:
             logger.error(msg)
             return {"success": False, "message": "No se pudo obtener la carpeta principal 'kia_songs'."}
         # Paso 2: Buscar la carpeta cuyo nombre sea igual a la key
-        query = f"'{parent_folder_id}' in parents and name = '{song_key}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        response = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()  # pylint: disable=no-member
-        folders = response.get('files', [])
-        if not folders:
+        folder_id = get_folder_resolver().resolver_uno(song_key, parent_folder_id)
+        if not folder_id:
             msg = _log_print("ERROR",f"No se encontró la carpeta con key {song_key}")
             logger.error(msg)
             return {"success": False, "message": f"No se encontró la carpeta con key '{song_key}' en Google Drive."}
-        folder_id = folders[0]['id']
-        # Paso 3: Obtener todos los archivos dentro de la carpeta
+        # Paso 3: Listar los archivos de la carpeta; cada descarga se envía en
+        # cuanto llega su página, sin esperar al final del listado.
         query = f"'{folder_id}' in parents and trashed = false"
-        response = service.files().list(q=query, spaces='drive', fields='files(id, name, modifiedTime)').execute() # pylint: disable=no-member
-        files = response.get('files', [])
-        if not files:
+        dest_dir = os.path.join(config.get_path_main(), song_key)
+        stats = nueva_sync()
+        futures = []
+        for file in listar(service, query, fields=DRIVE_FILE_FIELDS):
+            if not futures:
+                # Paso 4: Crear directorio local
+                os.makedirs(dest_dir, exist_ok=True)
+            # Paso 5: Descargar el archivo
+            futures.append(get_scheduler().submit(TRANSFER, download_file, file, dest_dir, stats))
+        if not futures:
+            # La carpeta pudo eliminarse: resolverla de nuevo la próxima vez.
+            get_folder_resolver().invalidar(song_key)
             msg = _log_print("WARNING",f"No se encontraron archivos en la carpeta {song_key}")
             logger.warning(msg)
             return {"success": False, "message": f"No hay archivos en la carpeta con key '{song_key}'."}
-        # Paso 4: Crear directorio local
-        dest_dir = os.path.join(config.get_path_main(), song_key)
-        os.makedirs(dest_dir, exist_ok=True)
-        # Paso 5: Descargar todos los archivos
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            for file in files:
-                executor.submit(download_file, file, dest_dir)
-        return {"success": True, "message": f"Archivos descargados para la key '{song_key}'."}
+        for future in futures:
+            future.result()
+        if stats.archivos_fallidos:
+            # No ocultar archivos que quedaron sin sincronizar.
+            return {"success": False, "message": f"{stats.archivos_fallidos} archivo(s) de la key '{song_key}' no se pudieron sincronizar.", "transferencia": stats.to_dict()}
+        return {"success": True, "message": f"Archivos descargados para la key '{song_key}'.", "transferencia": stats.to_dict()}
     except HttpError as error:
         msg = _log_print("ERROR",f"Error al acceder a Google Drive: {error}")
         logger.error(msg)
         return {"success": False, "message": "Error de conexión con Google Drive."}
     
+# Resuelve las carpetas de varias keys con pocas consultas antes de un lote.
+def precargar_carpetas(keys: list):
+    try:
+        parent_folder_id = CancionRepository().get_parent_folder()
+        if parent_folder_id and keys:
+            get_folder_resolver().resolver(keys, parent_folder_id)
+    except Exception as e:
+        msg = _log_print("WARNING",f"No se pudieron precargar las carpetas de Drive: {e}")
+        logger.warning(msg)
+
+@single_flight("abrir_kfn")
 def search_kfn(song_key: str, filename: str = "kara_fun.kfn") -> dict:
     try:
         dest_dir = os.path.join(config.get_path_main(), song_key)
@@ -118,57 +172,80 @@ def search_kfn(song_key: str, filename: str = "kara_fun.kfn") -> dict:
     
 def upload_file(service, local_path, file_id):
     try:
-        media = MediaFileUpload(local_path, resumable=True)
-        service.files().update(fileId=file_id, media_body=media).execute()
-        msg = _log_print("INFO",f"Archivo {os.path.basename(local_path)} actualizado en Google Drive.")
-        logger.info(msg)
+        subir(service, local_path, file_id=file_id)
+        return True
     except Exception as e:
         msg = _log_print("ERROR",f"Error al subir {os.path.basename(local_path)}: {str(e)}")
         logger.error(msg)
+        return False
 
+# Sube el kara_fun.kfn de una key solo si su contenido cambió: el id del archivo
+# en Drive se recuerda entre llamadas y se compara el MD5 local con md5Checksum.
+@single_flight("subir_kfn")
 def upload_kfn(song_key: str) -> dict:
     try:
         service = authenticate_drive()
-        # Paso 1: obtener carpeta padre (kia_songs)
-        parent_folder_id = CancionRepository().get_parent_folder()
-        if not parent_folder_id:
-            return {"success": False, "message": "No se pudo obtener la carpeta principal 'kia_songs'."}
-        # Paso 2: buscar carpeta de la canción
-        query = f"'{parent_folder_id}' in parents and name = '{song_key}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        response = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute() # pylint: disable=no-member
-        folders = response.get('files', [])
-        if not folders:
-            return {"success": False, "message": f"No se encontró la carpeta con key '{song_key}' en Google Drive."}
-        folder_id = folders[0]['id']
-        # Paso 3: ruta local del archivo
+        # Paso 1: ruta local del archivo
         dest_dir = os.path.join(config.get_path_main(), song_key)
         local_path = os.path.join(dest_dir, "kara_fun.kfn")
         if not os.path.exists(local_path):
             return {"success": False, "message": f"No se encontró el archivo local kara_fun.kfn para la key '{song_key}'."}
-        # Paso 4: buscar archivo kara_fun.kfn en Drive
-        query = f"'{folder_id}' in parents and name = 'kara_fun.kfn' and trashed = false"
-        response = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute() # pylint: disable=no-member
-        files = response.get('files', [])
-        if files:
+        # Paso 2: id ya conocido del kara_fun.kfn en Drive
+        remoto = None
+        file_id = get_upload_ids().obtener(song_key)
+        if file_id:
+            try:
+                remoto = service.files().get(fileId=file_id, fields="id, md5Checksum, size, trashed").execute() # pylint: disable=no-member
+            except HttpError as error:
+                if error.resp.status != 404:
+                    raise
+            if not remoto or remoto.get("trashed"):
+                get_upload_ids().invalidar(song_key)
+                file_id, remoto = None, None
+        folder_id = None
+        if not file_id:
+            # Paso 3: carpeta padre (kia_songs) y carpeta de la canción
+            parent_folder_id = CancionRepository().get_parent_folder()
+            if not parent_folder_id:
+                return {"success": False, "message": "No se pudo obtener la carpeta principal 'kia_songs'."}
+            folder_id = get_folder_resolver().resolver_uno(song_key, parent_folder_id)
+            if not folder_id:
+                return {"success": False, "message": f"No se encontró la carpeta con key '{song_key}' en Google Drive."}
+            # Paso 4: buscar archivo kara_fun.kfn en Drive
+            query = f"'{folder_id}' in parents and name = 'kara_fun.kfn' and trashed = false"
+            files = list(listar(service, query, fields="id, md5Checksum, size"))
+            if files:
+                remoto = files[0]
+                file_id = remoto['id']
+                get_upload_ids().guardar(song_key, file_id)
+        # Paso 5: omitir la subida si el contenido es idéntico
+        if remoto and remoto.get("md5Checksum"):
+            if int(remoto.get("size") or 0) == os.path.getsize(local_path) and get_hash_cache().md5(local_path) == remoto["md5Checksum"]:
+                msg = _log_print("INFO",f"El kara_fun.kfn de {song_key} no cambió; se omite la subida.")
+                logger.info(msg)
+                return {"success": True, "message": f"Archivo kara_fun.kfn sin cambios para la key '{song_key}'.", "omitido": True}
+        if file_id:
             # Ya existe en Drive → actualizar
-            file_id = files[0]['id']
-            upload_file(service, local_path, file_id)
+            subida = subir(service, local_path, file_id=file_id)
         else:
             # No existe → crear nuevo
-            file_metadata = {
-                'name': 'kara_fun.kfn',
-                'parents': [folder_id]
-            }
-            media = MediaFileUpload(local_path, resumable=True)
-            service.files().create(body=file_metadata, media_body=media, fields='id').execute() # pylint: disable=no-member
+            subida = subir(service, local_path, metadata={'name': 'kara_fun.kfn', 'parents': [folder_id]})
+            get_upload_ids().guardar(song_key, subida['id'])
+            get_versiones_carpeta().incrementar(song_key)
             msg = _log_print("INFO",f"Archivo kara_fun.kfn subido a la carpeta {song_key}")
             logger.info(msg)
-        return {"success": True, "message": f"Archivo kara_fun.kfn subido para la key '{song_key}'."}
+        if subida.get('md5Checksum'):
+            get_hash_cache().registrar(local_path, subida['md5Checksum'])
+        return {"success": True, "message": f"Archivo kara_fun.kfn subido para la key '{song_key}'.", "transferencia": subida}
     except HttpError as error:
+        if error.resp.status == 404:
+            get_folder_resolver().invalidar(song_key)
+            get_upload_ids().invalidar(song_key)
         return {"success": False, "message": f"Error de conexión con Google Drive: {error}"}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
+@single_flight("descargar_karaoke")
 def download_k(song_key: str, drive_id:str, tipo:int) -> dict:
     try:
         key_dir = os.path.join(config.get_path_main(), song_key)
@@ -181,20 +258,19 @@ def download_k(song_key: str, drive_id:str, tipo:int) -> dict:
         os.makedirs(dest_dir, exist_ok=True)
         service = authenticate_drive()
         # 1. Obtener nombre del archivo en Drive
-        file_info = service.files().get(fileId=drive_id, fields="name").execute() # pylint: disable=no-member
+        file_info = service.files().get(fileId=drive_id, fields="name, size, md5Checksum, modifiedTime").execute() # pylint: disable=no-member
         original_name = file_info.get("name", "karaoke.mp4")
+        size = int(file_info["size"]) if file_info.get("size") else None
         final_path = os.path.join(dest_dir, original_name)
         if os.path.exists(final_path):
-            abrir_video(final_path)
-            msg = "Abriendo Archivo."
-            return {"success": True, "message": msg}
-        # 2. Descargar el archivo
-        request = service.files().get_media(fileId=drive_id) # pylint: disable=no-member
-        done = False
-        fh = io.FileIO(final_path, 'wb')
-        downloader = MediaIoBaseDownload(fh, request)
-        while not done:
-            done = downloader.next_chunk()
+            if size is None or os.path.getsize(final_path) == size:
+                abrir_video(final_path)
+                msg = "Abriendo Archivo."
+                return {"success": True, "message": msg}
+            msg = _log_print("WARNING",f"El archivo {final_path} está incompleto. Descargando de nuevo...")
+            logger.warning(msg)
+        # 2. Descargar el archivo (se reanuda si quedó un .partial)
+        descargar(drive_id, final_path, size, file_info.get("md5Checksum") or file_info.get("modifiedTime"))
         msg = _log_print("INFO",f"Archivo Descargado en {final_path}")
         logger.info(msg)
         # 3. Abrir el archivo en el reproductor predeterminado
@@ -221,47 +297,88 @@ def abrir_video(final_path):
         msg = _log_print("ERROR",f"No se pudo reproducir el video: {e}")
         logger.error(msg)
 
+@single_flight("verificar_audio")
 def verificar_audio(song_key: str, tipo_proceso:int) -> dict:
+    return verificar_audios([song_key], tipo_proceso)[song_key]
+
+# Verifica los audios de varias keys: las carpetas se resuelven en lote y se
+# listan varias carpetas por consulta. Los resultados obtenidos del listado se
+# guardan por (key, tipo_proceso, versión de la carpeta) durante
+# AUDIO_CACHE_TTL segundos; con usar_cache=False se vuelve a consultar Drive.
+def verificar_audios(song_keys: list, tipo_proceso:int, usar_cache: bool = True) -> dict:
+    cache = get_cache_audios()
+    versiones = get_versiones_carpeta()
+    claves = {k: (k, tipo_proceso, versiones.version(k)) for k in dict.fromkeys(song_keys)}
+    resultados = {}
+    if usar_cache:
+        for song_key, clave in claves.items():
+            resultado = cache.obtener(clave)
+            if resultado is not None:
+                resultados[song_key] = resultado
+    else:
+        cache.omitir()
+    faltantes = [k for k in claves if k not in resultados]
+    if faltantes:
+        consultados, listados = _verificar_audios_drive(faltantes, tipo_proceso)
+        for song_key in listados:
+            cache.guardar(claves[song_key], consultados[song_key])
+        resultados.update(consultados)
+    return resultados
+
+# Devuelve los resultados y las keys cuyos audios se encontraron, las únicas
+# que se guardan en caché: un audio faltante puede estar por subirse.
+def _verificar_audios_drive(song_keys: list, tipo_proceso:int) -> tuple:
     try:
         service = authenticate_drive()
         # Paso 1: obtener carpeta padre (kia_songs)
         parent_folder_id = CancionRepository().get_parent_folder()
         if not parent_folder_id:
-            return {"success": False, "message": "No se pudo obtener la carpeta principal 'kia_songs'."}
-        # Paso 2: buscar carpeta de la canción
-        query = f"'{parent_folder_id}' in parents and name = '{song_key}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        response = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute() # pylint: disable=no-member
-        folders = response.get('files', [])
-        if not folders:
-            return {"success": False, "message": f"No se encontró la carpeta con key '{song_key}' en Google Drive."}
-        folder_id = folders[0]['id']
+            return {k: {"success": False, "message": "No se pudo obtener la carpeta principal 'kia_songs'."} for k in song_keys}, []
+        # Paso 2: buscar carpetas de las canciones
+        carpetas = get_folder_resolver().resolver(song_keys, parent_folder_id)
+        resultados = {}
+        for song_key in song_keys:
+            if not carpetas.get(song_key):
+                resultados[song_key] = {"success": False, "message": f"No se encontró la carpeta con key '{song_key}' en Google Drive."}
         # Paso 3: definir archivos esperados.
         expected_files = []
         if tipo_proceso == 6:
             expected_files = ["sin_voz.mp3", "no_vocals.mp3"]
         elif tipo_proceso == 8:
             expected_files = ["con_voz.mp3", "main.mp3"]
-        # Paso 4: listar archivos dentro de la carpeta
-        query_files = f"'{folder_id}' in parents and mimeType != 'application/vnd.google-apps.folder' and trashed = false"
-        files_response = service.files().list(q=query_files, spaces='drive', fields='files(id, name)').execute() # pylint: disable=no-member
-        files = files_response.get("files", [])
-        found_files = [f["name"] for f in files]
-        # Paso 5: verificar si alguno de los archivos existe.
-        matched_files = [f for f in expected_files if f in found_files]
-        if matched_files:
-            return {"success": True, "message": f"Se encontraron los archivos requeridos en: {song_key}",
-            }
-        else:
-            return {
-                "success": False,
-                "message": f"No se encontraron archivos clave en: {song_key}",
-                "expected": expected_files
-            }
+        # Paso 4: listar archivos de todas las carpetas con consultas agrupadas
+        pendientes = [k for k in dict.fromkeys(song_keys) if k not in resultados]
+        por_carpeta = {carpetas[k]: [] for k in pendientes}
+        filtro = "mimeType != 'application/vnd.google-apps.folder' and trashed = false"
+        for f in listar_en_carpetas(service, list(por_carpeta), filtro):
+            for parent in f.get("parents", []):
+                if parent in por_carpeta:
+                    por_carpeta[parent].append(f["name"])
+        listados = []
+        for song_key in pendientes:
+            found_files = por_carpeta[carpetas[song_key]]
+            # Paso 5: verificar si alguno de los archivos existe.
+            matched_files = [f for f in expected_files if f in found_files]
+            if matched_files:
+                resultados[song_key] = {"success": True, "message": f"Se encontraron los archivos requeridos en: {song_key}"}
+                listados.append(song_key)
+            else:
+                if not found_files:
+                    # Carpeta vacía: puede ser un id de carpeta obsoleto (eliminada
+                    # en Drive). Un audio que aún no se subió no invalida el id.
+                    get_folder_resolver().invalidar(song_key)
+                resultados[song_key] = {
+                    "success": False,
+                    "message": f"No se encontraron archivos clave en: {song_key}",
+                    "expected": expected_files
+                }
+        return resultados, listados
     except HttpError as error:
-        return {"success": False, "message": f"Error de conexión con Google Drive: {error}"}
+        return {k: {"success": False, "message": f"Error de conexión con Google Drive: {error}"} for k in song_keys}, []
     except Exception as e:
-        return {"success": False, "message": str(e)}
+        return {k: {"success": False, "message": str(e)} for k in song_keys}, []
 
+@single_flight("limpiar_drive")
 def clean_drive(song_key: str, modo: int) -> bool:
     try:
         service = authenticate_drive()
@@ -272,18 +389,18 @@ def clean_drive(song_key: str, modo: int) -> bool:
             logger.error(msg)
             return False
         # Paso 2: buscar carpeta de la canción
-        query = f"'{parent_folder_id}' in parents and name = '{song_key}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-        response = service.files().list(q=query, spaces="drive", fields="files(id, name)").execute()  # pylint: disable=no-member
-        folders = response.get("files", [])
-        if not folders:
+        folder_id = get_folder_resolver().resolver_uno(song_key, parent_folder_id)
+        if not folder_id:
             msg = _log_print("ERROR",f"No se encontró la carpeta en Drive: {song_key}")
             logger.error(msg)
             return False
-        folder_id = folders[0]["id"]
         # Si modo = 2 Eliminar toda la carpeta en Drive.
         if modo == 2:
             try:
                 service.files().delete(fileId=folder_id).execute()  # pylint: disable=no-member
+                get_folder_resolver().invalidar(song_key)
+                get_upload_ids().invalidar(song_key)
+                get_versiones_carpeta().incrementar(song_key)
                 msg = _log_print("INFO",f"Carpeta '{song_key}' eliminada de Google Drive.")
                 logger.info(msg)
                 return True
@@ -293,24 +410,22 @@ def clean_drive(song_key: str, modo: int) -> bool:
                 return False
         # Si modo = 1 → Eliminar archivos excepto kara_fun.kfn
         query_files = (f"'{folder_id}' in parents and mimeType != 'application/vnd.google-apps.folder' and trashed = false")
-        files_response = service.files().list(q=query_files, spaces="drive", fields="files(id, name)").execute()  # pylint: disable=no-member
-        files = files_response.get("files", [])
+        files = list(listar(service, query_files))
         if not files:
             msg = _log_print("WARNING",f"No se encontraron archivos en la carpeta {song_key}")
             logger.warning(msg)
             return True
-        deleted, skipped = [], []
-        for f in files:
-            if f["name"] == "kara_fun.kfn":
-                skipped.append(f["name"])
-                continue
-            try:
-                service.files().delete(fileId=f["id"]).execute()  # pylint: disable=no-member
-                deleted.append(f["name"])
+        # Todas las eliminaciones viajan en una sola petición batch.
+        a_eliminar = [f for f in files if f["name"] != "kara_fun.kfn"]
+        peticiones = [service.files().delete(fileId=f["id"]) for f in a_eliminar]  # pylint: disable=no-member
+        respuestas = ejecutar_lote(service, peticiones)
+        get_versiones_carpeta().incrementar(song_key)
+        for f, r in zip(a_eliminar, respuestas):
+            if r["success"]:
                 msg = _log_print("INFO",f"Archivo {f['name']} eliminado de la carpeta {song_key}")
                 logger.info(msg)
-            except Exception as e:
-                msg = _log_print("ERROR",f"No se pudo eliminar {f['name']}: {e}")
+            else:
+                msg = _log_print("ERROR",f"No se pudo eliminar {f['name']}: {r['error']}")
                 logger.error(msg)
         return True
     except Exception as e:
@@ -323,12 +438,7 @@ def upload_file_to_folder(file_path: str, folder_id: str, filename: str = None)
     try:
         service = authenticate_drive()
         file_metadata = {"name": filename or os.path.basename(file_path),"parents": [folder_id]}
-        media = MediaFileUpload(file_path, resumable=True)
-        file = service.files().create( # pylint: disable=no-member
-            body=file_metadata,
-            media_body=media,
-            fields="id"
-        ).execute()
+        file = subir(service, file_path, metadata=file_metadata)
         msg = _log_print("INFO",f"Archivo subido a Google Drive: {file['id']}")
         logger.info(msg)
         return file["id"]
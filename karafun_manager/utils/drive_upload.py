@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
+from karafun_manager.utils.prioridad import get_limite_lote
+from karafun_manager.utils.print import _log_print
+from ms_karafun import config
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+# Veces que una sesión reanudable se retoma tras un fallo (además de los
+# reintentos que ya hace el transporte) antes de abandonar la subida.
+REANUDACIONES = 3
+ESTADOS_REANUDABLES = {408, 500, 502, 503, 504}
+UPLOAD_FIELDS = "id, md5Checksum, size"
+
+# Sube `local_path` en una sesión reanudable por bloques de UPLOAD_CHUNK_MB: si
+# un bloque falla se consulta a Drive cuánto recibió y se continúa desde ahí.
+# Con `file_id` actualiza el contenido; si no, crea el archivo con `metadata`.
+def subir(service, local_path: str, file_id: str = None, metadata: dict = None) -> dict:
+    media = MediaFileUpload(local_path, chunksize=config.get_upload_chunk_size(), resumable=True)
+    if file_id:
+        request = service.files().update(fileId=file_id, media_body=media, fields=UPLOAD_FIELDS) # pylint: disable=no-member
+    else:
+        request = service.files().create(body=metadata, media_body=media, fields=UPLOAD_FIELDS) # pylint: disable=no-member
+    size = os.path.getsize(local_path)
+    inicio = time.monotonic()
+    try:
+        respuesta = None
+        fallos = 0
+        enviados = 0
+        while respuesta is None:
+            try:
+                _, respuesta = request.next_chunk()
+                fallos = 0
+                avance = size if respuesta is not None else request.resumable_progress
+                get_limite_lote().consumir(avance - enviados)
+                enviados = max(enviados, avance)
+            except (HttpError, OSError, httplib2.HttpLib2Error) as e:
+                reanudable = not isinstance(e, HttpError) or e.resp.status in ESTADOS_REANUDABLES
+                if not reanudable or fallos >= REANUDACIONES:
+                    raise
+                fallos += 1
+                msg = _log_print("WARNING",f"Subida de {os.path.basename(local_path)} interrumpida en el byte {request.resumable_progress}; reanudando: {e}")
+                logger.warning(msg)
+    finally:
+        # En Windows el archivo queda bloqueado mientras siga abierto.
+        media.stream().close()
+    segundos = max(time.monotonic() - inicio, 1e-6)
+    mb_s = size / segundos / (1024 * 1024)
+    msg = _log_print("INFO",f"Archivo {os.path.basename(local_path)} subido a Google Drive ({size / (1024 * 1024):.1f} MB a {mb_s:.2f} MB/s).")
+    logger.info(msg)
+    return {
+        'id': respuesta.get('id'),
+        'md5Checksum': respuesta.get('md5Checksum'),
+        'bytes': size,
+        'segundos': round(segundos, 3),
+        'mb_s': round(mb_s, 2),
+    }
+
+# Ids de Drive de los archivos de destino ya conocidos (p. ej. el kara_fun.kfn
+# de cada key), para no volver a buscarlos en cada subida.
+class IdCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+
+    def obtener(self, clave):
+        with self._lock:
+            return self._ids.get(clave)
+
+    def guardar(self, clave, file_id: str):
+        with self._lock:
+            self._ids[clave] = file_id
+
+    def invalidar(self, clave=None):
+        with self._lock:
+            if clave is None:
+                self._ids.clear()
+            else:
+                self._ids.pop(clave, None)
+
+_ids_subida = IdCache()
+
+def get_upload_ids() -> IdCache:
+    return _ids_subida
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from ms_karafun import config
+from karafun_manager.utils.kfn_io import CHUNK_SIZE
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+create table if not exists hash_cache (
+    path text primary key,
+    size integer not null,
+    mtime_ns integer not null,
+    md5 text not null
+)
+"""
+
+# Caché de MD5 de archivos locales. Un registro es válido mientras el archivo
+# conserve el mismo tamaño y mtime; si cambian, el hash se recalcula.
+class HashCache:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(_SCHEMA)
+
+    # sqlite3 no permite compartir conexiones entre hilos: una por hilo.
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+        return conn
+
+    def md5(self, path: str) -> str:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        try:
+            row = self._conn().execute(
+                "select md5 from hash_cache where path = ? and size = ? and mtime_ns = ?",
+                (path, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+        except sqlite3.Error as e:
+            msg = _log_print("WARNING",f"No se pudo consultar la caché de hashes: {e}")
+            logger.warning(msg)
+            row = None
+        if row:
+            return row[0]
+        digest = calcular_md5(path)
+        self.registrar(path, digest, st)
+        return digest
+
+    # Registra un hash ya conocido (por ejemplo, el md5Checksum de Drive tras una descarga).
+    def registrar(self, path: str, md5: str, st: os.stat_result = None):
+        path = os.path.abspath(path)
+        st = st or os.stat(path)
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "insert or replace into hash_cache (path, size, mtime_ns, md5) values (?, ?, ?, ?)",
+                    (path, st.st_size, st.st_mtime_ns, md5)
+                )
+        except sqlite3.Error as e:
+            msg = _log_print("WARNING",f"No se pudo actualizar la caché de hashes: {e}")
+            logger.warning(msg)
+
+def calcular_md5(path: str) -> str:
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(CHUNK_SIZE)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_hash_cache() -> HashCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = HashCache(config.get_path_hash_cache())
+    return _cache
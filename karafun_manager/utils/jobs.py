@@ -0,0 +1,248 @@
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from ms_karafun import config
+from karafun_manager.utils.scheduler import get_scheduler
+from karafun_manager.utils.prioridad import LOTE, con_prioridad
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+PENDIENTE = "pendiente"
+EJECUTANDO = "ejecutando"
+COMPLETADO = "completado"
+ERROR = "error"
+CANCELADO = "cancelado"
+
+# Cantidad de jobs terminados que se conservan en memoria.
+MAX_JOBS_TERMINADOS = 200
+
+# Proceso por lotes que corre en segundo plano. Cada elemento (key) se envía
+# al planificador y guarda su estado, tiempos y resultado.
+class Job:
+    def __init__(self, tipo: str, items: list, key_fn=None, finalizar=None):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.estado = PENDIENTE
+        self.creado = time.time()
+        self.iniciado = None
+        self.terminado = None
+        self.cancelado = False
+        self.resultado = None
+        self._finalizar = finalizar
+        self._lock = threading.Lock()
+        self._restantes = len(items)
+        self.items = [
+            {
+                'key': key_fn(item) if key_fn else item,
+                'estado': PENDIENTE,
+                'inicio': None,
+                'fin': None,
+                'duracion_ms': None,
+                'resultado': None,
+            }
+            for item in items
+        ]
+
+    def _ejecutar(self, indice: int, fn, item):
+        registro = self.items[indice]
+        with self._lock:
+            if self.cancelado:
+                registro['estado'] = CANCELADO
+                self._marcar_fin_item()
+                return
+            registro['estado'] = EJECUTANDO
+            registro['inicio'] = time.time()
+            if self.estado == PENDIENTE:
+                self.estado = EJECUTANDO
+                self.iniciado = registro['inicio']
+        try:
+            resultado = fn(item)
+            estado = COMPLETADO
+        except Exception as e:
+            msg = _log_print("ERROR",f"Job {self.id} key {registro['key']}: {e}")
+            logger.error(msg)
+            resultado = {'success': False, 'message': str(e)}
+            estado = ERROR
+        with self._lock:
+            registro['fin'] = time.time()
+            registro['duracion_ms'] = round((registro['fin'] - registro['inicio']) * 1000, 2)
+            registro['resultado'] = resultado
+            registro['estado'] = estado
+            self._marcar_fin_item()
+
+    # Debe llamarse con el lock tomado.
+    def _marcar_fin_item(self):
+        self._restantes -= 1
+        if self._restantes <= 0:
+            self._cerrar()
+
+    def _cerrar(self):
+        self.terminado = time.time()
+        self.estado = CANCELADO if self.cancelado else COMPLETADO
+        if self._finalizar:
+            try:
+                self.resultado = self._finalizar([i['resultado'] for i in self.items])
+            except Exception as e:
+                msg = _log_print("ERROR",f"Job {self.id}: no se pudo generar el resultado final: {e}")
+                logger.error(msg)
+                self.estado = ERROR
+        get_job_manager()._job_terminado(self)
+
+    def cancelar(self) -> bool:
+        with self._lock:
+            if self.estado in (COMPLETADO, ERROR, CANCELADO):
+                return False
+            self.cancelado = True
+            return True
+
+    def progreso(self) -> dict:
+        conteo = {PENDIENTE: 0, EJECUTANDO: 0, COMPLETADO: 0, ERROR: 0, CANCELADO: 0}
+        for item in self.items:
+            conteo[item['estado']] += 1
+        conteo['total'] = len(self.items)
+        return conteo
+
+    def to_dict(self, detalle: bool = True) -> dict:
+        with self._lock:
+            fin = self.terminado or time.time()
+            data = {
+                'job_id': self.id,
+                'tipo': self.tipo,
+                'estado': self.estado,
+                'creado': self.creado,
+                'iniciado': self.iniciado,
+                'terminado': self.terminado,
+                'duracion_ms': round((fin - self.iniciado) * 1000, 2) if self.iniciado else None,
+                'progreso': self.progreso(),
+            }
+            if detalle:
+                data['items'] = [dict(i) for i in self.items]
+                data['resultado'] = self.resultado
+            return data
+
+# Jobs terminados que se cargaron desde disco: solo lectura.
+class _JobPersistido:
+    def __init__(self, data: dict):
+        self.id = data['job_id']
+        self.estado = data['estado']
+        self._data = data
+
+    def cancelar(self) -> bool:
+        return False
+
+    def to_dict(self, detalle: bool = True) -> dict:
+        if detalle:
+            return dict(self._data)
+        return {k: v for k, v in self._data.items() if k not in ('items', 'resultado')}
+
+class JobManager:
+    def __init__(self, path_jobs: str = ""):
+        self.path_jobs = path_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path_jobs:
+            os.makedirs(self.path_jobs, exist_ok=True)
+            self._cargar()
+
+    def crear(self, tipo: str, items: list, fn, lane: str, key_fn=None, finalizar=None) -> Job:
+        job = Job(tipo, items, key_fn, finalizar)
+        with self._lock:
+            self._jobs[job.id] = job
+        if not items:
+            with job._lock:
+                job._cerrar()
+            return job
+        scheduler = get_scheduler()
+        # Los jobs son trabajo por lotes: ceden el paso a las peticiones interactivas.
+        with con_prioridad(LOTE):
+            for indice, item in enumerate(items):
+                scheduler.submit(lane, job._ejecutar, indice, fn, item)
+        msg = _log_print("INFO",f"Job {job.id} ({tipo}) iniciado con {len(items)} elemento(s).")
+        logger.info(msg)
+        return job
+
+    def obtener(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def listar(self) -> list:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j.to_dict(detalle=False) for j in jobs]
+
+    # Cantidad de jobs en memoria por estado (incluye los cargados de disco).
+    def conteo(self) -> dict:
+        with self._lock:
+            estados = [j.estado for j in self._jobs.values()]
+        conteo = {PENDIENTE: 0, EJECUTANDO: 0, COMPLETADO: 0, ERROR: 0, CANCELADO: 0}
+        for estado in estados:
+            conteo[estado] = conteo.get(estado, 0) + 1
+        return conteo
+
+    def _job_terminado(self, job: Job):
+        msg = _log_print("INFO",f"Job {job.id} ({job.tipo}) terminado: {job.estado}.")
+        logger.info(msg)
+        if self.path_jobs:
+            threading.Thread(target=self._guardar, args=(job,), daemon=True).start()
+        with self._lock:
+            terminados = [j for j in self._jobs.values() if j.estado in (COMPLETADO, ERROR, CANCELADO)]
+            for viejo in terminados[:max(0, len(terminados) - MAX_JOBS_TERMINADOS)]:
+                self._jobs.pop(viejo.id, None)
+
+    def _guardar(self, job: Job):
+        try:
+            destino = os.path.join(self.path_jobs, f"{job.id}.json")
+            tmp = f"{destino}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, destino)
+        except Exception as e:
+            msg = _log_print("WARNING",f"No se pudo guardar el job {job.id}: {e}")
+            logger.warning(msg)
+        self._podar()
+
+    # Elimina del disco los registros más viejos por encima del límite y
+    # devuelve los que se conservan, del más viejo al más nuevo.
+    def _podar(self) -> list:
+        archivos = []
+        for path in glob.glob(os.path.join(self.path_jobs, "*.json")):
+            try:
+                archivos.append((os.path.getmtime(path), path))
+            except OSError:
+                # Otro hilo lo eliminó mientras tanto.
+                pass
+        archivos = [path for _, path in sorted(archivos)]
+        sobrantes = max(0, len(archivos) - MAX_JOBS_TERMINADOS)
+        for path in archivos[:sobrantes]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return archivos[sobrantes:]
+
+    def _cargar(self):
+        for path in self._podar():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = _JobPersistido(json.load(f))
+                self._jobs[job.id] = job
+            except Exception as e:
+                msg = _log_print("WARNING",f"No se pudo cargar el job {path}: {e}")
+                logger.warning(msg)
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager(config.get_path_jobs())
+    return _manager
@@ -1,15 +1,24 @@
 import os
 import shutil
 import subprocess
-import struct
+import threading
 from karafun_manager.repositories.cancion_repository import CancionRepository
-from karafun_manager.services.KaraokeFUNForm2 import KaraokeFunForm2
+from karafun_manager.services.KaraokeFUNDelta import KaraokeFunDelta
+from karafun_manager.models.OperacionKFN import OperacionKFN, REEMPLAZAR, AGREGAR, ELIMINAR
+from karafun_manager.utils.kfn_archive import KfnArchive, KfnFirmaError
+from karafun_manager.utils.kfn_index import get_kfn_index, contar_digitacion
+from karafun_manager.utils.result_cache import get_cache_kfn
+from karafun_manager.utils.single_flight import single_flight
+from karafun_manager.utils.scheduler import get_scheduler, DRIVE
 from ms_karafun import config
 from karafun_manager.utils.print import _log_print
 import logging
 from karafun_manager.utils import logs
 logger = logging.getLogger(__name__)
 
+# Pistas que indican que el KFN ya tiene el audio renderizado.
+EXPECTED_FILES = ["sin_voz.mp3", "con_voz.mp3"]
+
 def open_karafun(file_path: str) -> dict:
     karafun_exe = config.get_path_karafun()
     if not os.path.exists(karafun_exe):
@@ -26,6 +35,7 @@ def open_karafun(file_path: str) -> dict:
         logger.error(msg)
         return {"success": False, "message": msg}
 
+@single_flight("manipular_kfn")
 def manipular_kfn(key: str) -> dict:
     try:
         song_dir = os.path.join(config.get_path_main(), key)
@@ -34,21 +44,16 @@ def manipular_kfn(key: str) -> dict:
             msg = _log_print("ERROR","No se encontro el archivo KFN")
             logger.error(msg)
             return {'success': False, 'message': msg}
-        extract_dir = os.path.join(song_dir, 'kfn_temp')
-        with open(kfn_path, 'rb') as f:
-            # 1) Firma
-            if _read_exact(f, 4) != b'KFNB':
-                msg = _log_print("ERROR","Archivo inválido: firma KFNB no encontrada.")
-                logger.error(msg)
-                return {'success': False, 'message': msg}
-            # 2) Tags - ENDH
-            _read_tag_block(f)
-            # 3) Tabla de archivos
-            entries, data_base = _read_files_table(f)
-            # 4) Extraer archivos
-            archivos_extraidos = _extract_files(f, entries, data_base, extract_dir)
-        # ---- 1.- Lista de archivos del KFN.
-        archivos_kfn = [os.path.basename(p) for p in archivos_extraidos]
+        try:
+            kfn = KfnArchive(kfn_path)
+        except KfnFirmaError as e:
+            msg = _log_print("ERROR",str(e))
+            logger.error(msg)
+            return {'success': False, 'message': msg}
+        with kfn:
+            # ---- 1.- Lista de archivos del KFN.
+            archivos_kfn = [os.path.basename(n) for n in kfn.names()]
+            song_ini_content = kfn.read_text("Song.ini") if "Song.ini" in kfn else None
         # ---- 2.- Lista de archivos del proyecto.
         exts_validas = {'.mp3', '.jpg', '.png'}
         archivos_dir = [
@@ -60,19 +65,17 @@ def manipular_kfn(key: str) -> dict:
         # Identificar archivo de audio y fondo desde Song.ini
         selected_audio = None
         selected_background = None
-        song_ini = os.path.join(extract_dir, "Song.ini")
-        if os.path.isfile(song_ini):
-            with open(song_ini, "r", encoding="utf-8", errors="ignore") as ini:
-                for line in ini:
-                    line = line.strip()
-                    # Audio actual (Source=..., archivo)
-                    if line.startswith("Source="):
-                        parts = line.split(",")
-                        if len(parts) >= 3:
-                            selected_audio = parts[2].strip()
-                    # Fondo actual (LibImage=archivo)
-                    elif line.startswith("LibImage="):
-                        selected_background = line.split("=", 1)[1].strip()
+        if song_ini_content is not None:
+            for line in song_ini_content.splitlines():
+                line = line.strip()
+                # Audio actual (Source=..., archivo)
+                if line.startswith("Source="):
+                    parts = line.split(",")
+                    if len(parts) >= 3:
+                        selected_audio = parts[2].strip()
+                # Fondo actual (LibImage=archivo)
+                elif line.startswith("LibImage="):
+                    selected_background = line.split("=", 1)[1].strip()
         msg = _log_print("INFO","KFN leído correctamente.")
         logger.error(msg)
         return {
@@ -94,114 +97,67 @@ def manipular_kfn(key: str) -> dict:
         logger.error(msg)
         return {'success': False, 'message': msg}
 
-def _read_exact(f, n: int) -> bytes:
-    b = f.read(n)
-    if b is None or len(b) != n:
-        raise IOError(f"EOF al leer {n} bytes")
-    return b
+# Un lock por key: dos ediciones distintas de la misma canción leen y
+# reescriben el mismo KFN, así que se aplican una después de la otra.
+_locks_kfn = {}
+_locks_kfn_lock = threading.Lock()
 
-def _read_u32(f) -> int:
-    return struct.unpack('<I', _read_exact(f, 4))[0]
-
-def _read_tag_block(f):
-    tags = []
-    while True:
-        name = _read_exact(f, 4).decode('ascii')
-        typ = _read_exact(f, 1)[0]
-        if typ == 2:
-            length = _read_u32(f)
-            value_bytes = _read_exact(f, length)
-            try:
-                value = value_bytes.decode('utf-8')
-            except UnicodeDecodeError:
-                value = value_bytes
-        else:
-            uval = _read_u32(f)
-            value = uval - (1 << 32) if (uval & 0x80000000) else uval
-        tags.append({'name': name, 'type': typ, 'value': value})
-        if name == 'ENDH':
-            break
-    return tags
-
-def _read_files_table(f):
-    num_files = _read_u32(f)
-    entries = []
-    for _ in range(num_files):
-        name_len = _read_u32(f)
-        name_bytes = _read_exact(f, name_len)
-        name = name_bytes.decode('utf-8', errors='strict')
-        ftype = _read_u32(f)
-        length_out = _read_u32(f)
-        offset = _read_u32(f)
-        length_in = _read_u32(f)
-        flags = _read_u32(f)
-        entries.append({
-            'filename': name,
-            'type': ftype,
-            'length_out': length_out,
-            'offset': offset,
-            'length_in': length_in,
-            'flags': flags,
-        })
-    data_base = f.tell()
-    return entries, data_base
-
-def _extract_files(f, entries, data_base, out_dir):
-    os.makedirs(out_dir, exist_ok=True)
-    extracted = []
-    for e in entries:
-        f.seek(data_base + e['offset'])
-        data = _read_exact(f, e['length_in'])
-        out_path = os.path.join(out_dir, e['filename'])
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        with open(out_path, 'wb') as w:
-            w.write(data)
-        extracted.append(out_path)
-    return extracted
+def _lock_kfn(key: str) -> threading.Lock:
+    with _locks_kfn_lock:
+        lock = _locks_kfn.get(key)
+        if lock is None:
+            lock = _locks_kfn[key] = threading.Lock()
+        return lock
 
+@single_flight("recrear_kfn", clave=lambda key, archivos, audio, fondo, opc: (key, tuple(archivos), audio, fondo, opc))
 def recrear_kfn(key:str, archivos: list[str], audio:str, fondo: str, opc: int) -> dict:
+    with _lock_kfn(key):
+        return _recrear_kfn(key, archivos, audio, fondo, opc)
+
+def _recrear_kfn(key:str, archivos: list[str], audio:str, fondo: str, opc: int) -> dict:
     try:
         song_dir = os.path.join(config.get_path_main(), key)
-        extract_dir = os.path.join(song_dir, 'kfn_temp')
+        kfn_path = os.path.join(song_dir, 'kara_fun.kfn')
         fondos_path = config.get_path_img_fondo()
-        # Obtener archivos actuales en extract_dir
-        archivos_actuales = os.listdir(extract_dir)
-        # Archivos eliminados.
-        to_delete = [f for f in archivos_actuales if f not in archivos]
-        # Archivos agregados.
-        to_copy = [f for f in archivos if f not in archivos_actuales]
+        if not os.path.isfile(kfn_path):
+            msg = _log_print("ERROR","No se encontro el archivo KFN")
+            logger.error(msg)
+            return {'success': False, 'message': msg}
+        # Obtener archivos actuales y Song.ini directamente del KFN
+        with KfnArchive(kfn_path) as kfn:
+            archivos_actuales = kfn.names()
+            song_ini_content = kfn.read_text("Song.ini") if "Song.ini" in kfn else None
+        operaciones = []
         # 1. Eliminar archivos.
-        for f in to_delete:
-            ruta = os.path.join(extract_dir, f)
-            if os.path.isfile(ruta):
-                os.remove(ruta)
-        # 2. Copiar nuevos archivos
-        for f in to_copy:
+        for f in archivos_actuales:
+            if f not in archivos and f != "Song.ini":
+                operaciones.append(OperacionKFN(ELIMINAR, f))
+        # 2. Agregar nuevos archivos
+        for f in archivos:
+            if f in archivos_actuales:
+                continue
             src = os.path.join(song_dir, f)
-            dst = os.path.join(extract_dir, f)
             if os.path.exists(src):
-                shutil.copy2(src, dst)
-            else:
-                ext = os.path.splitext(f)[1].lower()
-                if ext in [".jpg", ".png"]:
-                    fondo_src = os.path.join(fondos_path, f)
-                    if os.path.exists(fondo_src):
-                        shutil.copy2(fondo_src, dst)
-                        continue
-                msg = _log_print("WARNING",f"No se encontró el archivo {f}.")
-                logger.warning(msg)
+                operaciones.append(OperacionKFN(AGREGAR, f, path=src))
+                continue
+            ext = os.path.splitext(f)[1].lower()
+            if ext in [".jpg", ".png"]:
+                fondo_src = os.path.join(fondos_path, f)
+                if os.path.exists(fondo_src):
+                    operaciones.append(OperacionKFN(AGREGAR, f, path=fondo_src))
+                    continue
+            msg = _log_print("WARNING",f"No se encontró el archivo {f}.")
+            logger.warning(msg)
         # 3. Actualizar Song.ini
-        actualizar_song_ini(extract_dir, audio, fondo)
-        # 4.Recrear Karafun
-        kfun = KaraokeFunForm2(song_dir, extract_dir, audio)
+        if song_ini_content is not None:
+            song_ini_content = actualizar_song_ini(song_ini_content, audio, fondo)
+            operaciones.append(OperacionKFN(REEMPLAZAR, "Song.ini", contenido=song_ini_content.encode("utf-8")))
+        # 4. Recrear Karafun copiando sin cambios lo que no se modificó
+        kfun = KaraokeFunDelta(kfn_path, operaciones, audio)
         result = kfun.genera_archivo_kfun()
         if result[0] == "0":
-            # Eliminar carpeta temporal.
             if opc == 1:
-                kfn_path = os.path.join(song_dir, 'kara_fun.kfn')
                 open_karafun(kfn_path)
-                return {"success":True, "message":result[1]}
-            shutil.rmtree(extract_dir)
             return {"success":True, "message":result[1]}
         else:
             return {"success":False, "message":result[1]}
@@ -214,34 +170,26 @@ def recrear_kfn(key:str, archivos: list[str], audio:str, fondo: str, opc: int) -
         logger.error(msg)
         return {'success': False, 'message': msg}
     
-def actualizar_song_ini(extract_dir: str, audio: str, fondo: str):
-    try:
-        ini_path = os.path.join(extract_dir, "Song.ini")
-        if not os.path.exists(ini_path):
-            return {"success": False, "message": "Song.ini no encontrado en extract_dir"}
-        with open(ini_path, "r", encoding="utf-8", errors="ignore") as f:
-            lines = f.readlines()
-        nuevas_lineas = []
-        for line in lines:
-            if line.startswith("Source="):
-                # Sobrescribir con el nuevo audio
-                nuevas_lineas.append(f"Source=1,I,{audio}\n")
-            elif line.startswith("LibImage="):
-                # Sobrescribir con el nuevo fondo
-                nuevas_lineas.append(f"LibImage={fondo}\n")
-            else:
-                nuevas_lineas.append(line)
-        # Guardar el archivo actualizado
-        with open(ini_path, "w", encoding="utf-8") as f:
-            f.writelines(nuevas_lineas)
-        msg = _log_print("INFO","Song.ini Actualizado.")
-        logger.info(msg)
-    except Exception as e:
-        msg = _log_print("ERROR",f"Error al actualizar Song.ini: {str(e)}")
-        logger.error(msg)
+def actualizar_song_ini(song_ini: str, audio: str, fondo: str) -> str:
+    nuevas_lineas = []
+    for line in song_ini.splitlines(keepends=True):
+        if line.startswith("Source="):
+            # Sobrescribir con el nuevo audio
+            nuevas_lineas.append(f"Source=1,I,{audio}\n")
+        elif line.startswith("LibImage="):
+            # Sobrescribir con el nuevo fondo
+            nuevas_lineas.append(f"LibImage={fondo}\n")
+        else:
+            nuevas_lineas.append(line)
+    msg = _log_print("INFO","Song.ini Actualizado.")
+    logger.info(msg)
+    return "".join(nuevas_lineas)
 
-def verificar_kfn(key: str, tipo_proceso:int) -> dict:
-    extract_dir = None
+# El resultado se guarda por (key, tamaño y mtime del KFN, tipo_proceso,
+# porcentaje mínimo): mientras nada de eso cambie no se vuelve a validar.
+# Con usar_cache=False se valida de nuevo y se reemplaza lo guardado.
+@single_flight("verificar_kfn")
+def verificar_kfn(key: str, tipo_proceso:int, usar_cache: bool = True) -> dict:
     try:
         song_dir = os.path.join(config.get_path_main(), key)
         kfn_path = os.path.join(song_dir, 'kara_fun.kfn')
@@ -249,39 +197,18 @@ def verificar_kfn(key: str, tipo_proceso:int) -> dict:
             return {"success": False, "message": f"No se encontró la carpeta local para la key: {key}"}
         if not os.path.isfile(kfn_path):
             return {"success": False, "message": f"No se encontró el archivo local kara_fun.kfn para la key: {key}"}
-        extract_dir = os.path.join(song_dir, 'kfn_temp_2')
-        with open(kfn_path, 'rb') as f:
-            # 1) Firma.
-            if _read_exact(f, 4) != b'KFNB':
-                msg = 'Archivo inválido: firma KFNB no encontrada.'
-                print(msg)
-                logger.error(msg)
-                return {'success': False, 'message': msg}
-            # 2) Tags - ENDH.
-            _read_tag_block(f)
-            # 3) Tabla de archivos.
-            entries, data_base = _read_files_table(f)
-            # 4) Extraer archivos.
-            archivos_extraidos = _extract_files(f, entries, data_base, extract_dir)
-            # 5) Lista de archivos del KFN.
-            archivos_kfn = [os.path.basename(p) for p in archivos_extraidos]
-            # 6) Validar Digitación.
-            song_ini = os.path.join(extract_dir, "Song.ini")
-            if not os.path.isfile(song_ini):
-                return {"success": False, "message": "No se encontró Song.ini en el KFN extraído."}
-            with open(song_ini, "r", encoding="utf-8", errors="ignore") as song_ini_file:
-                song_ini_content = song_ini_file.read()
-            if not validar_digitacion(song_ini_content, key):
-                return {"success": False, "message": "La digitación no cumple con el mínimo requerido."}
-            # 7) Validar audios.
-            if "main.mp3" not in archivos_kfn:
-                return {"success": False, "message": "No se encontro el archivo main.mp3 en el KFN."}
-            if tipo_proceso == 6:
-                expected_files = ["sin_voz.mp3", "no_vocals.mp3"]
-                # Debe existir al menos uno de los audios
-                if not any(archivo in archivos_kfn for archivo in expected_files):
-                    return {"success": False, "message": f"No se encontraron los audios requeridos ({expected_files}) en el KFN."}
-        return {"success": True, "message": key}
+        st = os.stat(kfn_path)
+        clave = (key, st.st_size, st.st_mtime_ns, tipo_proceso, CancionRepository().get_porcentaje_kfn())
+        cache = get_cache_kfn()
+        if usar_cache:
+            resultado = cache.obtener(clave)
+            if resultado is not None:
+                return dict(resultado)
+        else:
+            cache.omitir()
+        resultado = _validar_kfn(key, kfn_path, tipo_proceso)
+        cache.guardar(clave, resultado)
+        return dict(resultado)
     except UnicodeDecodeError as e:
         msg = _log_print("ERROR",f"Error de decodificación: {str(e)}")
         logger.error(msg)
@@ -290,34 +217,48 @@ def verificar_kfn(key: str, tipo_proceso:int) -> dict:
         msg = _log_print("ERROR",f"{str(e)}")
         logger.error(msg)
         return {'success': False, 'message': msg}
-    finally:
-        if extract_dir and os.path.exists(extract_dir):
-            try:
-                shutil.rmtree(extract_dir)
-            except Exception as e:
-                msg = _log_print("ERROR",f"No se pudo eliminar el directorio temporal {extract_dir}: {str(e)}")
-                logger.error(msg)
+
+def _validar_kfn(key: str, kfn_path: str, tipo_proceso:int) -> dict:
+    # 1) Metadatos del índice local (solo se relee el KFN si cambió).
+    try:
+        meta = get_kfn_index().obtener(key, kfn_path)
+    except KfnFirmaError as e:
+        msg = str(e)
+        print(msg)
+        logger.error(msg)
+        return {'success': False, 'message': msg}
+    # 2) Lista de archivos del KFN.
+    archivos_kfn = [os.path.basename(e['filename']) for e in meta['entries']]
+    # 3) Validar Digitación.
+    if meta['song_ini_hash'] is None:
+        return {"success": False, "message": "No se encontró Song.ini en el KFN."}
+    if not validar_porcentaje(meta['total_palabras'], meta['total_sync'], key):
+        return {"success": False, "message": "La digitación no cumple con el mínimo requerido."}
+    # 4) Validar audios.
+    if "main.mp3" not in archivos_kfn:
+        return {"success": False, "message": "No se encontro el archivo main.mp3 en el KFN."}
+    if tipo_proceso == 6:
+        expected_files = ["sin_voz.mp3", "no_vocals.mp3"]
+        # Debe existir al menos uno de los audios
+        if not any(archivo in archivos_kfn for archivo in expected_files):
+            return {"success": False, "message": f"No se encontraron los audios requeridos ({expected_files}) en el KFN."}
+    return {"success": True, "message": key}
 
 def validar_digitacion(song_ini, key):
+    try:
+        # 1. Contar palabras en los Text y digitaciones en los Sync
+        total_palabras, total_sync = contar_digitacion(song_ini)
+    except Exception as e:
+        msg = _log_print("ERROR",f"No se pudo validar el porcentaje de la digitación - {key} : {str(e)}")
+        logger.error(msg)
+        return False
+    return validar_porcentaje(total_palabras, total_sync, key)
+
+def validar_porcentaje(total_palabras: int, total_sync: int, key: str) -> bool:
     try:
         repo = CancionRepository()
         porcentaje_minimo = repo.get_porcentaje_kfn()
-        # 1. Contar palabras en los Text
-        total_palabras = 0
-        for linea in song_ini.splitlines():
-            if linea.startswith("Text"):
-                _, texto = linea.split("=", 1)
-                palabras = [p for p in texto.strip().split() if p]
-                total_palabras += len(palabras)
-        # 2. Contar digitaciones en los Sync
-        total_sync = 0
-        for linea in song_ini.splitlines():
-            if linea.startswith("Sync"):
-                _, valores = linea.split("=", 1)
-                # Contar los números separados por coma
-                syncs = [s for s in valores.strip().split(",") if s]
-                total_sync += len(syncs)
-        # 3. Calcular el porcentaje
+        # 2. Calcular el porcentaje
         if total_palabras == 0:
             msg = _log_print("WARNING",f"No se encontro la letra de la canción - {key}")
             logger.warning(msg)
@@ -327,7 +268,7 @@ def validar_digitacion(song_ini, key):
             logger.warning(msg)
             return False
         porcentaje_real = (total_sync / total_palabras) * 100
-        # 4. Validar porcentaje mínimo requerido
+        # 3. Validar porcentaje mínimo requerido
         if porcentaje_real >= porcentaje_minimo:
             msg = _log_print("INFO",f"La digitación cumple con el mínimo requerido - {key}")
             logger.info(msg)
@@ -341,55 +282,102 @@ def validar_digitacion(song_ini, key):
         logger.error(msg)
         return False
 
+@single_flight("finalizar_karaoke")
 def finalizar_karaoke(key: str) -> dict:
-    extract_dir = None
+    preparado = _preparar_finalizacion(key)
+    if not preparado["success"]:
+        return preparado
     try:
-        repo = CancionRepository()
-        song_dir = os.path.join(config.get_path_main(), key)
-        kfn_path = os.path.join(song_dir, 'kara_fun.kfn')
-        if not os.path.isdir(song_dir):
-            return {"success": False, "message": f"No se encontró la carpeta local para la key: {key}"}
-        if not os.path.isfile(kfn_path):
-            return {"success": False, "message": f"No se encontró el archivo local kara_fun.kfn para la key: {key}"}
-        extract_dir = os.path.join(song_dir, 'kfn_temp_3')
-        with open(kfn_path, 'rb') as f:
-            # 1) Firma.
-            if _read_exact(f, 4) != b'KFNB':
-                msg = 'Archivo inválido: firma KFNB no encontrada.'
-                print(msg)
-                logger.error(msg)
-                return {'success': False, 'message': msg}
-            # 2) Tags - ENDH.
-            _read_tag_block(f)
-            # 3) Tabla de archivos.
-            entries, data_base = _read_files_table(f)
-            # 4) Extraer archivos.
-            archivos_extraidos = _extract_files(f, entries, data_base, extract_dir)
-            # 5) Obtener Lista de archivos del KFN.
-            archivos_kfn = [os.path.basename(p) for p in archivos_extraidos]
-            expected_files = ["sin_voz.mp3", "con_voz.mp3"]
-            # 6) Obtener Song.ini.
-            song_ini = os.path.join(extract_dir, "Song.ini")
-            if not os.path.isfile(song_ini):
-                return {"success": False, "message": "No se encontró Song.ini en el KFN extraído."}
-            with open(song_ini, "r", encoding="utf-8", errors="ignore") as song_ini_file:
-                song_ini_content = song_ini_file.read()
-        # 7) Actualizar Song.ini en la Base de Datos.
+        r = CancionRepository().update_song_ini(key, preparado["song_ini"], preparado["render_ini"])
+    except Exception as e:
+        msg = _log_print("ERROR",f"{str(e)}")
+        logger.error(msg)
+        return {'success': False, 'message': msg}
+    return _cerrar_finalizacion(key, r)
+
+# Finaliza varias canciones: la lectura de los KFN y el trabajo en Drive se
+# reparten en el planificador y el Song.ini de todas se actualiza en una sola
+# transacción. Devuelve [{'key', 'resultado'}] en el orden de `keys`.
+def finalizar_karaokes(keys: list, prioridad: str = None) -> list:
+    return _en_lote(keys, _preparar_finalizacion, _cerrar_finalizacion, prioridad)
+
+@single_flight("render_song_ini")
+def render_song_ini(key: str) -> dict:
+    preparado = _preparar_render(key)
+    if not preparado["success"]:
+        return preparado
+    try:
+        r = CancionRepository().update_song_ini(key, preparado["song_ini"], preparado["render_ini"])
+    except Exception as e:
+        msg = _log_print("ERROR",f"{str(e)}")
+        logger.error(msg)
+        return {'success': False, 'message': msg}
+    return _cerrar_render(key, r)
+
+# Equivalente por lotes de render_song_ini (ver finalizar_karaokes).
+def render_song_inis(keys: list, prioridad: str = None) -> list:
+    return _en_lote(keys, _preparar_render, _cerrar_render, prioridad)
+
+def _en_lote(keys: list, preparar, cerrar, prioridad: str = None) -> list:
+    unicas = list(dict.fromkeys(keys))
+    preparados = dict(zip(unicas, get_scheduler().map(DRIVE, preparar, unicas, prioridad=prioridad)))
+    cambios = [(key, p["song_ini"], p["render_ini"]) for key, p in preparados.items() if p["success"]]
+    actualizados = CancionRepository().update_song_inis(cambios)
+    resultados = {}
+    for key, preparado in preparados.items():
+        if not preparado["success"]:
+            resultados[key] = preparado
+            continue
+        try:
+            resultados[key] = cerrar(key, actualizados.get(key, False))
+        except Exception as e:
+            msg = _log_print("ERROR",f"{str(e)}")
+            logger.error(msg)
+            resultados[key] = {'success': False, 'message': msg}
+    return [{'key': key, 'resultado': resultados[key]} for key in keys]
+
+# Lee el KFN local y devuelve los nombres de sus archivos y el Song.ini.
+def _leer_song_ini(key: str) -> dict:
+    song_dir = os.path.join(config.get_path_main(), key)
+    kfn_path = os.path.join(song_dir, 'kara_fun.kfn')
+    if not os.path.isdir(song_dir):
+        return {"success": False, "message": f"No se encontró la carpeta local para la key: {key}"}
+    if not os.path.isfile(kfn_path):
+        return {"success": False, "message": f"No se encontró el archivo local kara_fun.kfn para la key: {key}"}
+    # 1) Firma, tags y tabla de archivos (sin extraer a disco).
+    try:
+        kfn = KfnArchive(kfn_path)
+    except KfnFirmaError as e:
+        msg = str(e)
+        print(msg)
+        logger.error(msg)
+        return {'success': False, 'message': msg}
+    with kfn:
+        # 2) Obtener Lista de archivos del KFN.
+        archivos_kfn = [os.path.basename(n) for n in kfn.names()]
+        # 3) Obtener Song.ini.
+        if "Song.ini" not in kfn:
+            return {"success": False, "message": "No se encontró Song.ini en el KFN."}
+        song_ini_content = kfn.read_text("Song.ini")
+    return {"success": True, "archivos": archivos_kfn, "song_ini": song_ini_content}
+
+# Sube o limpia Drive y deja listo el Song.ini que se guardará en la base de datos.
+def _preparar_finalizacion(key: str) -> dict:
+    try:
+        leido = _leer_song_ini(key)
+        if not leido["success"]:
+            return leido
+        # 4) Drive según el audio del KFN; el Song.ini se guarda después.
         render_ini = None
         from karafun_manager.utils.drive_manager import upload_kfn, clean_drive
-        if any(archivo in archivos_kfn for archivo in expected_files):
+        if any(archivo in leido["archivos"] for archivo in EXPECTED_FILES):
             upload_kfn(key)
             clean_drive(key,1)
             render_ini = False
         else:
             clean_drive(key,2)
             render_ini = True
-        r = repo.update_song_ini(key, song_ini_content, render_ini)
-        if r:
-            if song_dir and os.path.exists(song_dir):
-                shutil.rmtree(song_dir)
-            return {"success": True, "message": "Song.ini Actualizado"}
-        return {"success": False, "message": 'No se pudo Actualizar Song.ini'}
+        return {"success": True, "song_ini": leido["song_ini"], "render_ini": render_ini}
     except UnicodeDecodeError as e:
         msg = _log_print("ERROR",f"Error de decodificación: {str(e)}")
         logger.error(msg)
@@ -398,57 +386,28 @@ def finalizar_karaoke(key: str) -> dict:
         msg = _log_print("ERROR",f"{str(e)}")
         logger.error(msg)
         return {'success': False, 'message': msg}
-    finally:
-        if extract_dir and os.path.exists(extract_dir):
-            try:
-                shutil.rmtree(extract_dir)
-            except Exception as e:
-                msg = _log_print("ERROR",f"No se pudo eliminar el directorio temporal {extract_dir}: {str(e)}")
-                logger.error(msg)
 
-def render_song_ini(key: str) -> dict:
-    extract_dir = None
-    try:
-        repo = CancionRepository()
+def _cerrar_finalizacion(key: str, actualizado: bool) -> dict:
+    if actualizado:
         song_dir = os.path.join(config.get_path_main(), key)
-        kfn_path = os.path.join(song_dir, 'kara_fun.kfn')
-        if not os.path.isdir(song_dir):
-            return {"success": False, "message": f"No se encontró la carpeta local para la key: {key}"}
-        if not os.path.isfile(kfn_path):
-            return {"success": False, "message": f"No se encontró el archivo local kara_fun.kfn para la key: {key}"}
-        extract_dir = os.path.join(song_dir, 'kfn_temp_4')
-        with open(kfn_path, 'rb') as f:
-            # 1) Firma.
-            if _read_exact(f, 4) != b'KFNB':
-                msg = 'Archivo inválido: firma KFNB no encontrada.'
-                print(msg)
-                logger.error(msg)
-                return {'success': False, 'message': msg}
-            # 2) Tags - ENDH.
-            _read_tag_block(f)
-            # 3) Tabla de archivos.
-            entries, data_base = _read_files_table(f)
-            # 4) Extraer archivos.
-            archivos_extraidos = _extract_files(f, entries, data_base, extract_dir)
-            # 5) Obtener Lista de archivos del KFN.
-            archivos_kfn = [os.path.basename(p) for p in archivos_extraidos]
-            expected_files = ["sin_voz.mp3", "con_voz.mp3"]
-            # 6) Obtener Song.ini.
-            song_ini = os.path.join(extract_dir, "Song.ini")
-            if not os.path.isfile(song_ini):
-                return {"success": False, "message": "No se encontró Song.ini en el KFN extraído."}
-            with open(song_ini, "r", encoding="utf-8", errors="ignore") as song_ini_file:
-                song_ini_content = song_ini_file.read()
-        # 7) Actualizar Song.ini en la Base de Datos.
+        if song_dir and os.path.exists(song_dir):
+            shutil.rmtree(song_dir)
+        get_kfn_index().eliminar(key)
+        return {"success": True, "message": "Song.ini Actualizado"}
+    return {"success": False, "message": 'No se pudo Actualizar Song.ini'}
+
+def _preparar_render(key: str) -> dict:
+    try:
+        leido = _leer_song_ini(key)
+        if not leido["success"]:
+            return leido
+        # 4) Drive según el audio del KFN; el Song.ini se guarda después.
         render_ini = True
         from karafun_manager.utils.drive_manager import upload_kfn
-        if any(archivo in archivos_kfn for archivo in expected_files):
+        if any(archivo in leido["archivos"] for archivo in EXPECTED_FILES):
             render_ini = False
             upload_kfn(key)
-        r = repo.update_song_ini(key, song_ini_content, render_ini)
-        if r:
-            return {"success": True, "message": "Song.ini Actualizado"}
-        return {"success": False, "message": 'No se pudo Actualizar Song.ini'}
+        return {"success": True, "song_ini": leido["song_ini"], "render_ini": render_ini}
     except UnicodeDecodeError as e:
         msg = _log_print("ERROR",f"Error de decodificación: {str(e)}")
         logger.error(msg)
@@ -457,10 +416,8 @@ def render_song_ini(key: str) -> dict:
         msg = _log_print("ERROR",f"{str(e)}")
         logger.error(msg)
         return {'success': False, 'message': msg}
-    finally:
-        if extract_dir and os.path.exists(extract_dir):
-            try:
-                shutil.rmtree(extract_dir)
-            except Exception as e:
-                msg = _log_print("ERROR",f"No se pudo eliminar el directorio temporal {extract_dir}: {str(e)}")
-                logger.error(msg)
\ No newline at end of file
+
+def _cerrar_render(key: str, actualizado: bool) -> dict:
+    if actualizado:
+        return {"success": True, "message": "Song.ini Actualizado"}
+    return {"success": False, "message": 'No se pudo Actualizar Song.ini'}
@@ -0,0 +1,197 @@
+import io
+import mmap
+import os
+import struct
+from karafun_manager.utils import metrics
+from karafun_manager.utils.kfn_io import copiar_rango
+
+FIRMA_KFN = b'KFNB'
+
+class KfnFirmaError(IOError):
+    pass
+
+# Lector de KFN sobre un mmap: el encabezado y la tabla de archivos se leen una
+# sola vez y el contenido de cada miembro se expone como un memoryview, sin
+# copiarlo ni extraerlo a disco.
+class KfnArchive:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            if os.fstat(self._file.fileno()).st_size == 0:
+                raise KfnFirmaError('Archivo inválido: firma KFNB no encontrada.')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            # 1) Firma
+            if _read_exact(self._mm, 4) != FIRMA_KFN:
+                raise KfnFirmaError('Archivo inválido: firma KFNB no encontrada.')
+            # 2) Tags - ENDH
+            self.tags = _read_tag_block(self._mm)
+            # 3) Tabla de archivos
+            self.entries, self.data_base = _read_files_table(self._mm)
+            # 4) Todo el contenido debe estar en el archivo (KFN truncado).
+            for e in self.entries:
+                if self.data_base + e['offset'] + e['length_in'] > len(self._mm):
+                    raise KfnFirmaError(f"Archivo inválido: EOF al leer {e['length_in']} bytes de {e['filename']}.")
+        except Exception:
+            self.close()
+            raise
+        self._view = memoryview(self._mm)
+        self._index = {e['filename']: e for e in self.entries}
+        # KaraFun corre en Windows: los nombres no distinguen mayúsculas.
+        self._index_ci = {e['filename'].lower(): e for e in self.entries}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        view = getattr(self, '_view', None)
+        if view is not None:
+            view.release()
+            self._view = None
+        mm = getattr(self, '_mm', None)
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                # Aún hay slices vivos; el mmap se libera cuando se recolecten.
+                pass
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def names(self) -> list:
+        return [e['filename'] for e in self.entries]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index or name.lower() in self._index_ci
+
+    def entry(self, name: str) -> dict:
+        e = self._index.get(name) or self._index_ci.get(name.lower())
+        if e is None:
+            raise KeyError(f"El KFN no contiene el archivo {name}")
+        return e
+
+    # Slice sin copia del contenido del miembro. Liberarlo (release) antes de cerrar.
+    def member(self, name: str) -> memoryview:
+        e = self.entry(name)
+        inicio = self.data_base + e['offset']
+        fin = inicio + e['length_in']
+        if fin > len(self._view):
+            raise IOError(f"EOF al leer {e['length_in']} bytes de {name}")
+        metrics.contar_kfn_leido(e['length_in'])
+        return self._view[inicio:fin]
+
+    def open_member(self, name: str) -> io.BufferedReader:
+        return io.BufferedReader(_MemberReader(self.member(name)))
+
+    def read_bytes(self, name: str) -> bytes:
+        with self.member(name) as mv:
+            return mv.tobytes()
+
+    def read_text(self, name: str, encoding: str = 'utf-8', errors: str = 'ignore') -> str:
+        with self.member(name) as mv:
+            return str(mv, encoding, errors)
+
+    # Escribe un miembro en disco copiando directamente desde el KFN.
+    def extract(self, name: str, out_path: str) -> str:
+        e = self.entry(name)
+        os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+        with open(out_path, 'wb') as w:
+            copiar_rango(self._file.fileno(), w.fileno(), self.data_base + e['offset'], e['length_in'])
+        metrics.contar_kfn_leido(e['length_in'])
+        return out_path
+
+    def extract_all(self, out_dir: str) -> list:
+        os.makedirs(out_dir, exist_ok=True)
+        return [self.extract(name, os.path.join(out_dir, name)) for name in self.names()]
+
+class _MemberReader(io.RawIOBase):
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = min(len(b), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+def _read_exact(f, n: int) -> bytes:
+    b = f.read(n)
+    if b is None or len(b) != n:
+        raise IOError(f"EOF al leer {n} bytes")
+    return b
+
+def _read_u32(f) -> int:
+    return struct.unpack('<I', _read_exact(f, 4))[0]
+
+def _read_tag_block(f):
+    tags = []
+    while True:
+        name = _read_exact(f, 4).decode('ascii')
+        typ = _read_exact(f, 1)[0]
+        if typ == 2:
+            length = _read_u32(f)
+            value_bytes = _read_exact(f, length)
+            try:
+                value = value_bytes.decode('utf-8')
+            except UnicodeDecodeError:
+                value = value_bytes
+        else:
+            uval = _read_u32(f)
+            value = uval - (1 << 32) if (uval & 0x80000000) else uval
+        tags.append({'name': name, 'type': typ, 'value': value})
+        if name == 'ENDH':
+            break
+    return tags
+
+def _read_files_table(f):
+    num_files = _read_u32(f)
+    entries = []
+    for _ in range(num_files):
+        name_len = _read_u32(f)
+        name_bytes = _read_exact(f, name_len)
+        name = name_bytes.decode('utf-8', errors='strict')
+        ftype = _read_u32(f)
+        length_out = _read_u32(f)
+        offset = _read_u32(f)
+        length_in = _read_u32(f)
+        flags = _read_u32(f)
+        entries.append({
+            'filename': name,
+            'type': ftype,
+            'length_out': length_out,
+            'offset': offset,
+            'length_in': length_in,
+            'flags': flags,
+        })
+    data_base = f.tell()
+    return entries, data_base
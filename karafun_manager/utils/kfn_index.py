@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from ms_karafun import config
+from karafun_manager.utils.kfn_archive import KfnArchive
+from karafun_manager.utils.print import _log_print
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+create table if not exists kfn_index (
+    key text not null,
+    path text not null,
+    size integer not null,
+    mtime_ns integer not null,
+    tags text not null,
+    entries text not null,
+    song_ini_hash text,
+    total_palabras integer not null,
+    total_sync integer not null,
+    primary key (key, path)
+)
+"""
+
+# Índice local de metadatos de los KFN de PATH_MAIN. Cada registro se identifica
+# por (key, path) y solo se vuelve a leer el KFN cuando cambian su tamaño o mtime.
+class KfnIndex:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(_SCHEMA)
+
+    # sqlite3 no permite compartir conexiones entre hilos: una por hilo.
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+        return conn
+
+    def obtener(self, key: str, kfn_path: str) -> dict:
+        st = os.stat(kfn_path)
+        try:
+            row = self._conn().execute(
+                "select size, mtime_ns, tags, entries, song_ini_hash, total_palabras, total_sync "
+                "from kfn_index where key = ? and path = ?",
+                (key, kfn_path)
+            ).fetchone()
+        except sqlite3.Error as e:
+            msg = _log_print("WARNING",f"No se pudo consultar el índice de KFN: {e}")
+            logger.warning(msg)
+            row = None
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return {
+                'key': key,
+                'path': kfn_path,
+                'size': row[0],
+                'mtime_ns': row[1],
+                'tags': json.loads(row[2]),
+                'entries': json.loads(row[3]),
+                'song_ini_hash': row[4],
+                'total_palabras': row[5],
+                'total_sync': row[6],
+            }
+        meta = _leer_metadatos(key, kfn_path, st)
+        self._guardar(meta)
+        return meta
+
+    def _guardar(self, meta: dict):
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    "insert or replace into kfn_index "
+                    "(key, path, size, mtime_ns, tags, entries, song_ini_hash, total_palabras, total_sync) "
+                    "values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        meta['key'], meta['path'], meta['size'], meta['mtime_ns'],
+                        json.dumps(meta['tags'], default=_bytes_hex),
+                        json.dumps(meta['entries']),
+                        meta['song_ini_hash'], meta['total_palabras'], meta['total_sync'],
+                    )
+                )
+        except sqlite3.Error as e:
+            msg = _log_print("WARNING",f"No se pudo actualizar el índice de KFN: {e}")
+            logger.warning(msg)
+
+    def eliminar(self, key: str):
+        try:
+            with self._conn() as conn:
+                conn.execute("delete from kfn_index where key = ?", (key,))
+        except sqlite3.Error as e:
+            msg = _log_print("WARNING",f"No se pudo eliminar {key} del índice de KFN: {e}")
+            logger.warning(msg)
+
+def _leer_metadatos(key: str, kfn_path: str, st: os.stat_result) -> dict:
+    with KfnArchive(kfn_path) as kfn:
+        tags = kfn.tags
+        entries = kfn.entries
+        song_ini_hash = None
+        total_palabras, total_sync = 0, 0
+        if "Song.ini" in kfn:
+            with kfn.member("Song.ini") as mv:
+                song_ini_hash = hashlib.sha1(mv).hexdigest()
+            total_palabras, total_sync = contar_digitacion(kfn.read_text("Song.ini"))
+    return {
+        'key': key,
+        'path': kfn_path,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'tags': tags,
+        'entries': entries,
+        'song_ini_hash': song_ini_hash,
+        'total_palabras': total_palabras,
+        'total_sync': total_sync,
+    }
+
+# Cuenta las palabras de las líneas Text y las digitaciones de las líneas Sync.
+def contar_digitacion(song_ini: str) -> tuple:
+    total_palabras = 0
+    total_sync = 0
+    for linea in song_ini.splitlines():
+        if linea.startswith("Text"):
+            _, texto = linea.split("=", 1)
+            total_palabras += len([p for p in texto.strip().split() if p])
+        elif linea.startswith("Sync"):
+            _, valores = linea.split("=", 1)
+            # Contar los números separados por coma
+            total_sync += len([s for s in valores.strip().split(",") if s])
+    return total_palabras, total_sync
+
+def _bytes_hex(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_kfn_index() -> KfnIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = KfnIndex(config.get_path_kfn_index())
+    return _index
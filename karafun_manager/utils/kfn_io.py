@@ -0,0 +1,64 @@
+import os
+import sys
+
+# Tamaño máximo del bloque que se copia por iteración (1 MB).
+CHUNK_SIZE = 1024 * 1024
+
+# Copia `length` bytes de `src_path` (desde `offset`) al final de `dst` (archivo
+# abierto en 'wb'). Usa copias del kernel (copy_file_range / sendfile) cuando el
+# sistema las soporta y, si no, un búfer fijo, por lo que la memoria no depende
+# del tamaño del archivo.
+def copiar_archivo(dst, src_path: str, length: int, offset: int = 0, chunk_size: int = CHUNK_SIZE) -> int:
+    if length <= 0:
+        return 0
+    dst.flush()
+    with open(src_path, 'rb') as src:
+        copiados = copiar_rango(src.fileno(), dst.fileno(), offset, length, chunk_size)
+    # Sincronizar la posición del objeto de Python con la del descriptor.
+    dst.seek(0, os.SEEK_END)
+    return copiados
+
+# Copia `length` bytes desde `offset` de `src_fd` a la posición actual de `dst_fd`.
+def copiar_rango(src_fd: int, dst_fd: int, offset: int, length: int, chunk_size: int = CHUNK_SIZE) -> int:
+    restante = length
+    pos = offset
+    # 1) copy_file_range (Linux): la copia nunca sale del kernel.
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while restante > 0:
+                n = os.copy_file_range(src_fd, dst_fd, min(restante, chunk_size), pos)
+                if n == 0:
+                    break
+                pos += n
+                restante -= n
+        except OSError:
+            pass
+    # 2) sendfile: en Linux admite archivo -> archivo (en macOS solo sockets).
+    if restante > 0 and hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        try:
+            while restante > 0:
+                n = os.sendfile(dst_fd, src_fd, pos, min(restante, chunk_size))
+                if n == 0:
+                    break
+                pos += n
+                restante -= n
+        except OSError:
+            pass
+    # 3) Copia con búfer fijo (Windows y cualquier otro caso).
+    if restante > 0:
+        os.lseek(src_fd, pos, os.SEEK_SET)
+        while restante > 0:
+            data = os.read(src_fd, min(restante, chunk_size))
+            if not data:
+                break
+            _write_all(dst_fd, memoryview(data))
+            pos += len(data)
+            restante -= len(data)
+    if restante > 0:
+        raise IOError(f"EOF al copiar: faltaron {restante} de {length} bytes")
+    return length
+
+def _write_all(fd: int, view: memoryview):
+    while len(view) > 0:
+        n = os.write(fd, view)
+        view = view[n:]
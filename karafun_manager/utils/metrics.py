@@ -0,0 +1,269 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Métricas del proceso en formato de texto de Prometheus (0.0.4), servidas por
+# la vista /metrics. Los contadores e histogramas se actualizan en memoria con
+# un lock por métrica (una suma y una búsqueda binaria por observación); el
+# estado del planificador y de los jobs se lee recién al exportar.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Límites (segundos) de los histogramas de latencia.
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BUCKETS_DRIVE = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BUCKETS_DB = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Counter:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores, cantidad: float = 1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def exponer(self) -> list:
+        with self._lock:
+            valores = sorted(self._valores.items())
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        for etiquetas, valor in valores:
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}")
+        return lineas
+
+class Histogram:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), buckets: tuple = BUCKETS_HTTP):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = tuple(sorted(buckets))
+        # Por cada combinación de etiquetas: [conteo por bucket (+Inf al final), suma].
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores):
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    def exponer(self) -> list:
+        with self._lock:
+            series = sorted((k, list(v[0]), v[1]) for k, v in self._series.items())
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        nombres = self.etiquetas + ("le",)
+        for etiquetas, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else _numero(limite)
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres, etiquetas + (le,))} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, etiquetas)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, etiquetas)} {acumulado}")
+        return lineas
+
+# Métrica calculada al exportar: `leer` devuelve [(valores_etiquetas, valor)].
+class Gauge:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple, leer, tipo: str = "gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.leer = leer
+        self.tipo = tipo
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for etiquetas, valor in self.leer():
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}")
+        return lineas
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _etiquetas(nombres: tuple, valores: tuple) -> str:
+    if not nombres:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)) + "}"
+
+def _numero(valor) -> str:
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+# ---- Peticiones HTTP ----
+
+HTTP_PETICIONES = Counter("karafun_http_requests_total", "Peticiones atendidas por URL y código de estado.", ("url", "estado"))
+HTTP_DURACION = Histogram("karafun_http_request_duration_seconds", "Latencia de las vistas por URL (en stream: hasta devolver la respuesta).", ("url",), BUCKETS_HTTP)
+
+def _registrar_vista(url: str, inicio: float, estado):
+    HTTP_DURACION.observar(time.perf_counter() - inicio, url)
+    HTTP_PETICIONES.inc(url, estado)
+
+# Envuelve la vista de un patrón de URL para medir su latencia. Conserva los
+# atributos de la vista (csrf_exempt) y su naturaleza síncrona o async.
+def medir_vista(url: str, vista):
+    if inspect.iscoroutinefunction(vista):
+        @functools.wraps(vista)
+        async def vista_medida(request, *args, **kwargs):
+            inicio = time.perf_counter()
+            estado = "error"
+            try:
+                respuesta = await vista(request, *args, **kwargs)
+                estado = str(respuesta.status_code)
+                return respuesta
+            finally:
+                _registrar_vista(url, inicio, estado)
+        return vista_medida
+
+    @functools.wraps(vista)
+    def vista_medida(request, *args, **kwargs):
+        inicio = time.perf_counter()
+        estado = "error"
+        try:
+            respuesta = vista(request, *args, **kwargs)
+            estado = str(respuesta.status_code)
+            return respuesta
+        finally:
+            _registrar_vista(url, inicio, estado)
+    return vista_medida
+
+# Instrumenta todos los patrones de urls.py; la etiqueta es la ruta declarada.
+def medir_urls(urlpatterns: list) -> list:
+    for patron in urlpatterns:
+        patron.callback = medir_vista(str(patron.pattern), patron.callback)
+    return urlpatterns
+
+# ---- Drive ----
+
+DRIVE_LLAMADAS = Counter("karafun_drive_requests_total", "Llamadas HTTP a Drive (cada reintento cuenta) por operación y estado.", ("operacion", "estado"))
+DRIVE_BYTES = Counter("karafun_drive_bytes_total", "Bytes enviados y recibidos de Drive por operación.", ("operacion", "direccion"))
+DRIVE_DURACION = Histogram("karafun_drive_request_duration_seconds", "Latencia de cada llamada HTTP a Drive por operación.", ("operacion",), BUCKETS_DRIVE)
+
+# Nombre corto de la operación de Drive a partir del método y la URI.
+def operacion_drive(method: str, uri: str) -> str:
+    partes = urlsplit(uri)
+    path = partes.path
+    if path.startswith("/batch"):
+        return "batch"
+    if path.startswith("/upload"):
+        return "upload"
+    if "/changes" in path:
+        return "changes"
+    if path.endswith("/files"):
+        return "files.list" if method == "GET" else "files.create"
+    if "/files/" in path:
+        if method == "GET":
+            return "media" if "alt=media" in partes.query else "files.get"
+        if method == "DELETE":
+            return "files.delete"
+        return "files.update"
+    return "otra"
+
+def registrar_drive(operacion: str, estado, segundos: float, enviados: int, recibidos: int):
+    DRIVE_DURACION.observar(segundos, operacion)
+    DRIVE_LLAMADAS.inc(operacion, estado)
+    if enviados:
+        DRIVE_BYTES.inc(operacion, "enviado", cantidad=enviados)
+    if recibidos:
+        DRIVE_BYTES.inc(operacion, "recibido", cantidad=recibidos)
+
+# ---- Base de datos ----
+
+DB_DURACION = Histogram("karafun_db_call_duration_seconds", "Latencia de cada procedimiento almacenado (sin la espera del pool).", ("procedimiento", "modo"), BUCKETS_DB)
+DB_ERRORES = Counter("karafun_db_errors_total", "Llamadas a procedimientos almacenados que fallaron.", ("procedimiento", "modo"))
+
+class _MedicionDb:
+    __slots__ = ("procedimiento", "modo", "inicio")
+
+    def __init__(self, procedimiento: str, modo: str):
+        self.procedimiento = procedimiento
+        self.modo = modo
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        DB_DURACION.observar(time.perf_counter() - self.inicio, self.procedimiento, self.modo)
+        if exc_type is not None:
+            DB_ERRORES.inc(self.procedimiento, self.modo)
+        return False
+
+# Context manager: `with medir_db("sps_song_ini", "uno"):` alrededor del
+# execute y la lectura de resultados. Sirve también dentro de funciones async.
+def medir_db(procedimiento: str, modo: str) -> _MedicionDb:
+    return _MedicionDb(procedimiento, modo)
+
+# ---- KFN ----
+
+KFN_BYTES = Counter("karafun_kfn_bytes_total", "Bytes de archivos KFN leídos (miembros) y escritos (archivos generados).", ("direccion",))
+
+def contar_kfn_leido(n: int):
+    KFN_BYTES.inc("leido", cantidad=n)
+
+def contar_kfn_escrito(n: int):
+    KFN_BYTES.inc("escrito", cantidad=n)
+
+# ---- Planificador, jobs e hilos async (se leen al exportar) ----
+
+def _lanes() -> dict:
+    from karafun_manager.utils.scheduler import get_scheduler
+    return get_scheduler().metricas()
+
+def _leer_lanes(campo: str):
+    return lambda: [((nombre,), datos[campo]) for nombre, datos in _lanes().items()]
+
+def _leer_tareas():
+    series = []
+    for nombre, datos in _lanes().items():
+        series.append(((nombre, "completada"), datos["completados"]))
+        series.append(((nombre, "fallida"), datos["fallidos"]))
+    return series
+
+def _leer_jobs():
+    from karafun_manager.utils.jobs import get_job_manager
+    return [((estado,), n) for estado, n in sorted(get_job_manager().conteo().items())]
+
+def _leer_hilos_async():
+    from karafun_manager.utils.async_io import metricas_si_existen
+    datos = metricas_si_existen()
+    if datos is None:
+        return []
+    return [((campo,), datos[campo]) for campo in ("ocupados", "esperando")]
+
+def _leer_single_flight():
+    from karafun_manager.utils.single_flight import get_single_flight
+    return [((), get_single_flight().metricas()["en_vuelo"])]
+
+_registro = [
+    HTTP_PETICIONES,
+    HTTP_DURACION,
+    DRIVE_LLAMADAS,
+    DRIVE_BYTES,
+    DRIVE_DURACION,
+    DB_DURACION,
+    DB_ERRORES,
+    KFN_BYTES,
+    Gauge("karafun_scheduler_queue_depth", "Tareas en cola por carril del planificador.", ("lane",), _leer_lanes("en_cola")),
+    Gauge("karafun_scheduler_active", "Tareas en ejecución por carril del planificador.", ("lane",), _leer_lanes("activos")),
+    Gauge("karafun_scheduler_workers", "Hilos de cada carril del planificador.", ("lane",), _leer_lanes("max_workers")),
+    Gauge("karafun_scheduler_tasks_total", "Tareas terminadas por carril y resultado.", ("lane", "resultado"), _leer_tareas, "counter"),
+    Gauge("karafun_jobs", "Jobs en memoria por estado.", ("estado",), _leer_jobs),
+    Gauge("karafun_async_threads", "Hilos de las vistas async ocupados y peticiones esperando uno.", ("estado",), _leer_hilos_async),
+    Gauge("karafun_single_flight_in_flight", "Operaciones deduplicadas en curso.", (), _leer_single_flight),
+]
+
+def exponer() -> str:
+    lineas = []
+    for metrica in _registro:
+        lineas.extend(metrica.exponer())
+    return "\n".join(lineas) + "\n"
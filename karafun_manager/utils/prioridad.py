@@ -0,0 +1,84 @@
+import threading
+import time
+from contextlib import contextmanager
+from ms_karafun import config
+
+# Clases de prioridad del planificador. Las operaciones de un solo key que el
+# usuario espera en pantalla (abrir KFN, descargar karaoke) son interactivas;
+# los endpoints por lotes y los jobs corren como lote.
+INTERACTIVO = "interactivo"
+LOTE = "lote"
+CLASES = (INTERACTIVO, LOTE)
+ORDEN = {INTERACTIVO: 0, LOTE: 1}
+
+_local = threading.local()
+
+def prioridad_actual() -> str:
+    return getattr(_local, 'clase', INTERACTIVO)
+
+# Las tareas enviadas al planificador dentro del bloque heredan la clase, y
+# también las que esas tareas envíen a su vez.
+@contextmanager
+def con_prioridad(clase: str):
+    anterior = getattr(_local, 'clase', None)
+    _local.clase = clase
+    try:
+        yield
+    finally:
+        if anterior is None:
+            del _local.clase
+        else:
+            _local.clase = anterior
+
+# Token bucket en bytes/s compartido por todas las transferencias de clase lote.
+# Las interactivas nunca esperan. Con 0 MB/s no se limita.
+class LimiteAnchoBanda:
+    def __init__(self, mb_s: float):
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._ultimo = time.monotonic()
+        self.bytes_limitados = 0
+        self.espera_total = 0.0
+        self.ajustar(mb_s)
+
+    def ajustar(self, mb_s: float):
+        with self._lock:
+            self.mb_s = max(0.0, float(mb_s or 0))
+            self._rate = self.mb_s * 1024 * 1024
+            self._tokens = min(self._tokens, self._rate)
+
+    def consumir(self, n: int):
+        if n <= 0 or prioridad_actual() != LOTE:
+            return
+        with self._lock:
+            if self._rate <= 0:
+                return
+            ahora = time.monotonic()
+            self._tokens = min(self._rate, self._tokens + (ahora - self._ultimo) * self._rate)
+            self._ultimo = ahora
+            # Se admite deuda: un bloque mayor que la capacidad espera lo que le toca.
+            self._tokens -= n
+            espera = -self._tokens / self._rate if self._tokens < 0 else 0.0
+            self.bytes_limitados += n
+            self.espera_total += espera
+        if espera:
+            time.sleep(espera)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                'mb_s': self.mb_s,
+                'bytes_limitados': self.bytes_limitados,
+                'espera_total_s': round(self.espera_total, 3),
+            }
+
+_limite_lote = None
+_limite_lock = threading.Lock()
+
+def get_limite_lote() -> LimiteAnchoBanda:
+    global _limite_lote
+    if _limite_lote is None:
+        with _limite_lock:
+            if _limite_lote is None:
+                _limite_lote = LimiteAnchoBanda(config.get_batch_mb_s())
+    return _limite_lote
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from ms_karafun import config
+
+# Caché LRU en memoria para resultados de validaciones. La clave debe incluir
+# todo lo que determina el resultado (tamaño/mtime del KFN, versión del
+# listado de la carpeta...), así una entrada nunca queda desactualizada: solo
+# deja de pedirse y el LRU la descarta. Con `ttl` las entradas además vencen.
+class ResultCache:
+    def __init__(self, capacidad: int, ttl: float = None):
+        self.capacidad = max(1, capacidad)
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.descartados = 0
+        self.omitidos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            valor, vence = entrada
+            if vence is not None and vence <= time.monotonic():
+                del self._entradas[clave]
+                self.expirados += 1
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        vence = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entradas[clave] = (valor, vence)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.descartados += 1
+
+    # Consulta que se saltó la caché a pedido del cliente.
+    def omitir(self):
+        with self._lock:
+            self.omitidos += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def metricas(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entradas': len(self._entradas),
+                'capacidad': self.capacidad,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirados': self.expirados,
+                'descartados': self.descartados,
+                'omitidos': self.omitidos,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+# Versión del listado de cada carpeta de canción en Drive. Se incrementa cada
+# vez que la aplicación cambia la carpeta (subidas, limpiezas) o el feed de
+# cambios informa algo en ella, e invalida los resultados que la usaban.
+# Cuando no se sabe qué carpeta cambió se incrementan todas a la vez.
+class VersionesCarpeta:
+    def __init__(self):
+        self._versiones = {}
+        self._general = 0
+        self._lock = threading.Lock()
+
+    def version(self, key: str) -> int:
+        with self._lock:
+            return self._general + self._versiones.get(key, 0)
+
+    def incrementar(self, key: str):
+        with self._lock:
+            self._versiones[key] = self._versiones.get(key, 0) + 1
+
+    def incrementar_todas(self):
+        with self._lock:
+            self._general += 1
+
+_cache_kfn = None
+_cache_audios = None
+_versiones = None
+_lock = threading.Lock()
+
+def get_cache_kfn() -> ResultCache:
+    global _cache_kfn
+    if _cache_kfn is None:
+        with _lock:
+            if _cache_kfn is None:
+                _cache_kfn = ResultCache(config.get_result_cache_max())
+    return _cache_kfn
+
+def get_cache_audios() -> ResultCache:
+    global _cache_audios
+    if _cache_audios is None:
+        with _lock:
+            if _cache_audios is None:
+                _cache_audios = ResultCache(config.get_result_cache_max(), config.get_audio_cache_ttl())
+    return _cache_audios
+
+def get_versiones_carpeta() -> VersionesCarpeta:
+    global _versiones
+    if _versiones is None:
+        with _lock:
+            if _versiones is None:
+                _versiones = VersionesCarpeta()
+    return _versiones
+
+def metricas() -> dict:
+    return {
+        'validar_kfn': get_cache_kfn().metricas(),
+        'comprobar_audio': get_cache_audios().metricas(),
+    }
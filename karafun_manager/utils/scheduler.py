@@ -0,0 +1,171 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from django.db import close_old_connections
+from ms_karafun import config
+from karafun_manager.utils.prioridad import CLASES, ORDEN, con_prioridad, prioridad_actual
+
+# Carriles del planificador. Una tarea solo puede esperar tareas de un carril
+# distinto que nunca la espere a ella (p. ej. DRIVE -> TRANSFER), para que un
+# carril lleno no se bloquee a sí mismo.
+DRIVE = "drive"          # Operaciones por key contra Google Drive.
+TRANSFER = "transfer"    # Descarga/subida de archivos individuales.
+RANGE = "range"          # Tramos de una descarga grande (TRANSFER -> RANGE).
+DISK = "disk"            # E/S en disco local.
+DB = "db"                # Llamadas a la base de datos.
+CPU = "cpu"              # Lectura/validación de KFN.
+
+_TAMANOS = {
+    DRIVE: 8,
+    TRANSFER: 10,
+    RANGE: 8,
+    DISK: 4,
+    DB: 4,
+    CPU: os.cpu_count() or 2,
+}
+
+# Carril con cola por prioridad: cada envío agrega una entrada al heap y un
+# turno al pool; cuando un hilo queda libre toma la entrada de mayor prioridad
+# (interactivo antes que lote, y FIFO dentro de cada clase).
+class Lane:
+    def __init__(self, nombre: str, max_workers: int):
+        self.nombre = nombre
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"kfn-{nombre}")
+        self._lock = threading.Lock()
+        self._heap = []
+        self._secuencia = itertools.count()
+        self.en_cola = 0
+        self.activos = 0
+        self.completados = 0
+        self.fallidos = 0
+        self.espera_total = 0.0
+        self._clases = {
+            clase: {'en_cola': 0, 'activos': 0, 'completados': 0, 'fallidos': 0, 'espera_total': 0.0, 'ejecucion_total': 0.0}
+            for clase in CLASES
+        }
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        clase = prioridad_actual()
+        future = Future()
+        with self._lock:
+            heapq.heappush(self._heap, (ORDEN[clase], next(self._secuencia), time.monotonic(), clase, future, fn, args, kwargs))
+            self.en_cola += 1
+            self._clases[clase]['en_cola'] += 1
+        self._executor.submit(self._siguiente)
+        return future
+
+    def _siguiente(self):
+        with self._lock:
+            _, _, encolado, clase, future, fn, args, kwargs = heapq.heappop(self._heap)
+            stats = self._clases[clase]
+            self.en_cola -= 1
+            stats['en_cola'] -= 1
+            if not future.set_running_or_notify_cancel():
+                return
+            espera = time.monotonic() - encolado
+            self.activos += 1
+            self.espera_total += espera
+            stats['activos'] += 1
+            stats['espera_total'] += espera
+        # Los hilos del pool son persistentes: descartar conexiones vencidas.
+        close_old_connections()
+        inicio = time.monotonic()
+        ok = False
+        try:
+            with con_prioridad(clase):
+                resultado = fn(*args, **kwargs)
+            ok = True
+            future.set_result(resultado)
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self.activos -= 1
+                stats['activos'] -= 1
+                stats['ejecucion_total'] += time.monotonic() - inicio
+                if ok:
+                    self.completados += 1
+                    stats['completados'] += 1
+                else:
+                    self.fallidos += 1
+                    stats['fallidos'] += 1
+
+    def metricas(self) -> dict:
+        with self._lock:
+            terminados = self.completados + self.fallidos
+            clases = {}
+            for clase, st in self._clases.items():
+                fin = st['completados'] + st['fallidos']
+                clases[clase] = {
+                    'en_cola': st['en_cola'],
+                    'activos': st['activos'],
+                    'completados': st['completados'],
+                    'fallidos': st['fallidos'],
+                    'espera_promedio_ms': round(st['espera_total'] * 1000 / fin, 2) if fin else 0.0,
+                    'ejecucion_promedio_ms': round(st['ejecucion_total'] * 1000 / fin, 2) if fin else 0.0,
+                }
+            return {
+                'max_workers': self.max_workers,
+                'en_cola': self.en_cola,
+                'activos': self.activos,
+                'uso': round(self.activos / self.max_workers, 4),
+                'completados': self.completados,
+                'fallidos': self.fallidos,
+                'espera_promedio_ms': round(self.espera_total * 1000 / terminados, 2) if terminados else 0.0,
+                'clases': clases,
+            }
+
+# Planificador único del proceso: todos los endpoints por lotes envían aquí su
+# trabajo en lugar de crear un ThreadPoolExecutor por petición.
+class Scheduler:
+    def __init__(self):
+        self.lanes = {
+            nombre: Lane(nombre, max(1, config.get_pool_size(nombre, tamano)))
+            for nombre, tamano in _TAMANOS.items()
+        }
+
+    def submit(self, lane: str, fn, *args, **kwargs) -> Future:
+        return self.lanes[lane].submit(fn, *args, **kwargs)
+
+    # Ejecuta fn sobre cada elemento y devuelve los resultados en el mismo orden.
+    # Sin `prioridad` se usa la clase del hilo que llama.
+    def map(self, lane: str, fn, items, prioridad: str = None) -> list:
+        with con_prioridad(prioridad or prioridad_actual()):
+            futures = [self.submit(lane, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+    # Como map, pero entrega (índice, resultado, segundos de ejecución) a medida
+    # que terminan. Si se deja de iterar, se cancelan las tareas aún en cola.
+    def as_completed(self, lane: str, fn, items, prioridad: str = None):
+        def medido(item):
+            inicio = time.monotonic()
+            resultado = fn(item)
+            return resultado, time.monotonic() - inicio
+        with con_prioridad(prioridad or prioridad_actual()):
+            futures = {self.submit(lane, medido, item): i for i, item in enumerate(items)}
+        try:
+            for future in as_completed(futures):
+                resultado, segundos = future.result()
+                yield futures[future], resultado, segundos
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def metricas(self) -> dict:
+        return {nombre: lane.metricas() for nombre, lane in self.lanes.items()}
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> Scheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler()
+    return _scheduler
@@ -0,0 +1,73 @@
+import functools
+import threading
+from concurrent.futures import Future
+
+# Registro de operaciones en curso por (operación, key). Si una misma operación
+# ya se está ejecutando para una key, el segundo llamador espera y recibe el
+# resultado (o la excepción) de la ejecución en curso en lugar de repetirla.
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}
+        self.lideres = 0
+        self.compartidos = 0
+
+    def ejecutar(self, operacion: str, clave, fn, *args, **kwargs):
+        id_vuelo = (operacion, clave)
+        hilo = threading.get_ident()
+        with self._lock:
+            actual = self._en_vuelo.get(id_vuelo)
+            # Una llamada reentrante desde el mismo hilo se esperaría a sí misma:
+            # se ejecuta directamente sin registrarse.
+            if actual is not None and actual[1] != hilo:
+                self.compartidos += 1
+                seguir = actual[0]
+            else:
+                seguir = None
+                future = Future()
+                lider = actual is None
+                if lider:
+                    self.lideres += 1
+                    self._en_vuelo[id_vuelo] = (future, hilo)
+        if seguir is not None:
+            return seguir.result()
+        try:
+            resultado = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(resultado)
+            return resultado
+        finally:
+            if lider:
+                with self._lock:
+                    self._en_vuelo.pop(id_vuelo, None)
+
+    def en_vuelo(self) -> list:
+        with self._lock:
+            return [f"{operacion}:{clave}" for operacion, clave in self._en_vuelo]
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {
+                'en_vuelo': len(self._en_vuelo),
+                'lideres': self.lideres,
+                'compartidos': self.compartidos,
+            }
+
+_single_flight = SingleFlight()
+
+def get_single_flight() -> SingleFlight:
+    return _single_flight
+
+# Decorador: deduplica las llamadas concurrentes a `fn` con la misma clave. Por
+# defecto la clave son los argumentos; `clave` permite derivarla de ellos.
+def single_flight(operacion: str, clave=None):
+    def decorador(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            c = clave(*args, **kwargs) if clave else (args, tuple(sorted(kwargs.items())))
+            return _single_flight.ejecutar(operacion, c, fn, *args, **kwargs)
+        return wrapper
+    return decorador
@@ -0,0 +1,73 @@
+import threading
+
+OMITIDO = "omitido"
+DESCARGADO = "descargado"
+SUBIDO = "subido"
+FALLIDO = "fallido"
+
+# Contadores de una sincronización: bytes que no se movieron porque el contenido
+# ya coincidía y bytes realmente descargados o subidos. Cada conteo se suma
+# también al acumulado del proceso (`padre`).
+class SyncStats:
+    def __init__(self, padre: 'SyncStats' = None):
+        self._lock = threading.Lock()
+        self._padre = padre
+        self.archivos_omitidos = 0
+        self.bytes_omitidos = 0
+        self.archivos_descargados = 0
+        self.bytes_descargados = 0
+        self.archivos_subidos = 0
+        self.bytes_subidos = 0
+        self.archivos_fallidos = 0
+
+    # `acumular=False` anota solo en esta sincronización, sin sumar al padre
+    # (el resultado ya se contó en el acumulado por otra sincronización).
+    def registrar(self, resultado: str, size: int = 0, acumular: bool = True):
+        with self._lock:
+            if resultado == OMITIDO:
+                self.archivos_omitidos += 1
+                self.bytes_omitidos += size
+            elif resultado == DESCARGADO:
+                self.archivos_descargados += 1
+                self.bytes_descargados += size
+            elif resultado == SUBIDO:
+                self.archivos_subidos += 1
+                self.bytes_subidos += size
+            else:
+                self.archivos_fallidos += 1
+        if acumular and self._padre is not None:
+            self._padre.registrar(resultado, size)
+
+    def omitido(self, size: int):
+        self.registrar(OMITIDO, size)
+
+    def descargado(self, size: int):
+        self.registrar(DESCARGADO, size)
+
+    def subido(self, size: int):
+        self.registrar(SUBIDO, size)
+
+    def fallido(self):
+        self.registrar(FALLIDO)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'archivos_omitidos': self.archivos_omitidos,
+                'bytes_omitidos': self.bytes_omitidos,
+                'archivos_descargados': self.archivos_descargados,
+                'bytes_descargados': self.bytes_descargados,
+                'archivos_subidos': self.archivos_subidos,
+                'bytes_subidos': self.bytes_subidos,
+                'archivos_fallidos': self.archivos_fallidos,
+                'bytes_transferidos': self.bytes_descargados + self.bytes_subidos,
+            }
+
+# Acumulado desde que arrancó el proceso.
+_totales = SyncStats()
+
+def get_sync_totales() -> SyncStats:
+    return _totales
+
+def nueva_sync() -> SyncStats:
+    return SyncStats(_totales)
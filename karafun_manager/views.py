@@ -2,17 +2,28 @@ import os
 import struct
 from pathlib import Path
 import shutil
+import time
 import zipfile
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 from ms_karafun import config
-from concurrent.futures import ThreadPoolExecutor
 from karafun_manager.repositories.cancion_repository import CancionRepository
-from karafun_manager.utils.drive_manager import search_kfn, download_all_files, download_k, verificar_audio
+from karafun_manager.repositories.db_pool import get_db_pool
+from karafun_manager.utils.drive_manager import search_kfn, download_all_files, download_k, verificar_audios, precargar_carpetas
 from karafun_manager.utils.audacity import open_audacity, open_carpeta, view_files
-from karafun_manager.utils.karafun_studio import manipular_kfn, recrear_kfn, verificar_kfn, finalizar_karaoke, render_song_ini
+from karafun_manager.utils.karafun_studio import manipular_kfn, recrear_kfn, verificar_kfn, finalizar_karaoke, render_song_ini, finalizar_karaokes, render_song_inis
 from karafun_manager.utils.print import _log_print
+from karafun_manager.utils.scheduler import get_scheduler, DRIVE, DISK, CPU
+from karafun_manager.utils.jobs import get_job_manager
+from karafun_manager.utils.prioridad import LOTE, con_prioridad, get_limite_lote
+from karafun_manager.utils.single_flight import get_single_flight
+from karafun_manager.utils.result_cache import metricas as metricas_cache_resultados
+from karafun_manager.utils import metrics
+from karafun_manager.utils.drive_client import get_drive_provider
+from karafun_manager.utils.drive_control import get_drive_control
+from karafun_manager.utils.drive_changes import sincronizar_cambios
+from karafun_manager.utils.sync_stats import get_sync_totales
 from karafun_manager.models.Cancion import Cancion
 from karafun_manager.services.KaraokeFUNForm import KaraokeFunForm
 import logging
@@ -30,22 +41,38 @@ def sync_drive(request):
             keys = body.get('keys', [])
             if not isinstance(keys, list):
                 return JsonResponse({'success': False, 'message': 'Formato inválido: se esperaba una lista de keys'})
-            cantidad = len(keys)
-            resultados = []
-            def worker(key):
-                result = download_all_files(key)
-                return {'key': key, 'resultado': result}
-            with ThreadPoolExecutor(max_workers= cantidad) as executor:
-                futures = [executor.submit(worker, key) for key in keys]
-                for future in futures:
-                    resultados.append(future.result())
-            return JsonResponse({'success': True, 'message': '¡Archivos Sincronizados Correctamente!'})
+            if body.get('modo') == 'delta':
+                return JsonResponse(sincronizar_cambios_lote(keys))
+            precargar_carpetas(keys)
+            if body.get('async'):
+                return JsonResponse(iniciar_sync_job(keys))
+            return JsonResponse(resumen_sync(get_scheduler().map(DRIVE, sincronizar_key, keys, prioridad=LOTE)))
         except Exception as e:
             msg = _log_print("ERROR",f"{e}")
             logger.error(msg)
             return JsonResponse({'success': False, 'message': str(e)})
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
 
+# Pasos de syncDrive compartidos con views_async.py.
+
+# Solo lo que cambió en Drive desde la última sincronización.
+def sincronizar_cambios_lote(keys: list) -> dict:
+    with con_prioridad(LOTE):
+        return sincronizar_cambios(keys or None)
+
+def sincronizar_key(key: str) -> dict:
+    return {'key': key, 'resultado': download_all_files(key)}
+
+def iniciar_sync_job(keys: list) -> dict:
+    job = get_job_manager().crear('syncDrive', keys, sincronizar_key, DRIVE)
+    return {'success': True, 'message': 'Sincronización iniciada.', 'job_id': job.id}
+
+def resumen_sync(resultados: list) -> dict:
+    fallidos = [r['key'] for r in resultados if not r['resultado'].get('success')]
+    if fallidos:
+        return {'success': False, 'message': f'No se pudieron sincronizar {len(fallidos)} key(s).', 'fallidos': fallidos}
+    return {'success': True, 'message': '¡Archivos Sincronizados Correctamente!'}
+
 @csrf_exempt
 def subir_karafun(request):
     if request.method == 'POST':
@@ -54,15 +81,14 @@ def subir_karafun(request):
             keys = body.get('keys', [])
             if not isinstance(keys, list):
                 return JsonResponse({'success': False, 'message': 'Formato inválido: se esperaba una lista de keys'})
-            cantidad = len(keys)
-            resultados = []
             def worker(key):
                 result = render_song_ini(key)
                 return {'key': key, 'resultado': result}
-            with ThreadPoolExecutor(max_workers= cantidad) as executor:
-                futures = [executor.submit(worker, key) for key in keys]
-                for future in futures:
-                    resultados.append(future.result())
+            precargar_carpetas(keys)
+            if body.get('async'):
+                job = get_job_manager().crear('subirKarafun', keys, worker, DRIVE)
+                return JsonResponse({'success': True, 'message': 'Validación de Song.ini iniciada.', 'job_id': job.id})
+            render_song_inis(keys, prioridad=LOTE)
             return JsonResponse({'success': True, 'message': '¡Validación de Song.ini Completada!'})
         except Exception as e:
             msg = _log_print("ERROR",f"{e}")
@@ -75,80 +101,79 @@ def abrir_karafun(request):
     if request.method == 'POST':
         try:
             body = json.loads(request.body)
-            key = body.get('key')
-            result = search_kfn(key)
-            if not result.get("success") and "No hay KFN" in result.get("message", ""):
-                download_all_files(key)
-                return JsonResponse({"success": False, "message": "No hay KFN."})
-            return JsonResponse(result)
+            return JsonResponse(abrir_kfn(body.get('key')))
         except Exception as e:
             msg = _log_print("ERROR",f"{e}")
             logger.error(msg)
             return JsonResponse({'success': False, 'message': str(e)})
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
 
+# Abre el KFN local; si no existe, sincroniza la key para la próxima vez.
+def abrir_kfn(key: str) -> dict:
+    result = search_kfn(key)
+    if not result.get("success") and "No hay KFN" in result.get("message", ""):
+        download_all_files(key)
+        return {"success": False, "message": "No hay KFN."}
+    return result
+
 @csrf_exempt
 def crear_karafun(request):
     if request.method == 'POST':
         try:
             repo = CancionRepository()
             body = json.loads(request.body)
-            # Propiedades.
-            cancion_id = body.get('cancion_id')
-            key = body.get('key')
-            nombre = body.get('nombre')
-            artista = body.get('artista')
-            cliente = body.get('cliente')
-            path_imagen_cliente = body.get('path_imagen_cliente')
-            # Path a Main.
-            song_dir = os.path.join(config.get_path_main(), key)
-            mp3_path = os.path.join(song_dir, 'main.mp3')
-            if not mp3_path:
-                msg = _log_print("ERROR","El archivo main.mp3 es obligatorio.")
-                logger.error(msg)
-                return JsonResponse({'success': False, 'message': 'El archivo main.mp3 es obligatorio.'})
-            datos = repo.get_song_ini(cancion_id)
+            datos = repo.get_song_ini(body.get('cancion_id'))
             if not datos:
-                msg = _log_print("ERROR","No se pudieron obtener datos de Songini.")
-                logger.error(msg)
-                return JsonResponse({'success': False, 'message': 'No se pudieron obtener datos de Songini.'})
-            song_ini = datos.get("songini") or ""
-            letra = datos.get("letra") or ""
-            # Construir Objeto de Cancion.
-            cancion = Cancion(
-                id=cancion_id,
-                artista=artista,
-                nombre=nombre,
-                cliente=cliente,
-                letra_ref_orginal=letra,
-                path_file_mp3=mp3_path,
-                song_ini=song_ini,
-                key=key,
-                path_imagen_cliente=path_imagen_cliente
-            )
-            if not verificar_recursos():
-                msg = _log_print("WARNING","No se pudieron verificar los recursos.")
-                logger.info(msg)
-                return JsonResponse({'success': False, 'message': 'No se pudieron verificar los recursos.'})
-            # Crear Karafun.
-            kfun = KaraokeFunForm(cancion)
-            result = kfun.genera_archivo_kfun()
+                return JsonResponse(sin_song_ini())
+            result = generar_karafun(armar_cancion(body, datos))
             if result[0] == "0":  # Éxito
                 # Actualizar porcentaje a 40%
-                repo.update_porcentaje_avance(cancion_id=cancion_id, porcentaje=40)
-                search_kfn(key)
-                return JsonResponse({
-                    'success': True,
-                    'message': result[1]
-                })
-            else:  # Error en la generación
-                return JsonResponse({'success': False, 'message': result[1]})
+                repo.update_porcentaje_avance(cancion_id=body.get('cancion_id'), porcentaje=40)
+                search_kfn(body.get('key'))
+            return JsonResponse(respuesta_karafun(result))
         except Exception as e:
             msg = _log_print("ERROR",f"{e}")
             logger.error(msg)
             return JsonResponse({'success': False, 'message': str(e)})
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
 
+# Pasos de crearKarafun compartidos con views_async.py.
+
+def sin_song_ini() -> dict:
+    msg = _log_print("ERROR","No se pudieron obtener datos de Songini.")
+    logger.error(msg)
+    return {'success': False, 'message': 'No se pudieron obtener datos de Songini.'}
+
+# Verifica los recursos y crea el KFN; devuelve [código, mensaje].
+def generar_karafun(cancion: Cancion) -> list:
+    if not verificar_recursos():
+        msg = _log_print("WARNING","No se pudieron verificar los recursos.")
+        logger.info(msg)
+        return ["1", "No se pudieron verificar los recursos."]
+    return KaraokeFunForm(cancion).genera_archivo_kfun()
+
+def respuesta_karafun(result: list) -> dict:
+    return {'success': result[0] == "0", 'message': result[1]}
+
+# Construye la Cancion a partir de las propiedades del body y de los datos
+# de Song.ini/letra de la base de datos.
+def armar_cancion(props: dict, datos: dict) -> Cancion:
+    key = props.get('key')
+    # Path a Main.
+    song_dir = os.path.join(config.get_path_main(), key)
+    mp3_path = os.path.join(song_dir, 'main.mp3')
+    return Cancion(
+        id=props.get('cancion_id'),
+        artista=props.get('artista'),
+        nombre=props.get('nombre'),
+        cliente=props.get('cliente'),
+        letra_ref_orginal=datos.get("letra") or "",
+        path_file_mp3=mp3_path,
+        song_ini=datos.get("songini") or "",
+        key=key,
+        path_imagen_cliente=props.get('path_imagen_cliente')
+    )
+
 def verificar_recursos():
     try:
         path_fondos = config.get_path_img_fondo()
@@ -180,11 +205,7 @@ def download_karaoke(request):
     if request.method == 'POST':
         try:
             body = json.loads(request.body)
-            key = body.get('key')
-            drive_id = body.get('drive_id')
-            tipo = body.get('tipo')
-            result = download_k(key, drive_id, tipo)
-            return JsonResponse(result)
+            return JsonResponse(download_k(body.get('key'), body.get('drive_id'), body.get('tipo')))
         except Exception as e:
             msg = _log_print("ERROR",f"{e}")
             logger.error(msg)
@@ -306,7 +327,6 @@ def delete_carpeta(request):
             if not isinstance(keys, list):
                 return JsonResponse({'success': False, 'message': 'Formato inválido: se esperaba una lista de keys'})
             dir_path = Path(config.get_path_main())
-            cantidad = len(keys)
             def worker(key):
                 carpeta_path = dir_path / key
                 if carpeta_path.exists() and carpeta_path.is_dir():
@@ -318,9 +338,7 @@ def delete_carpeta(request):
                 else:
                     msg = _log_print("WARNING",f"key: {key}, No encontrada.")
                     logger.warning(msg)
-            with ThreadPoolExecutor(max_workers=max(cantidad, 1)) as executor:
-                for key in keys:
-                    executor.submit(worker, key)
+            get_scheduler().map(DISK, worker, keys, prioridad=LOTE)
             return JsonResponse({'success': True, 'message': '¡Archivo(s) Locales eliminados!'})
         except Exception as e:
             msg = _log_print("ERROR",f"{e}")
@@ -335,17 +353,23 @@ def comprobar_audio(request):
             body = json.loads(request.body)
             keys = body.get('keys', [])
             tipo_proceso = body.get('tipo_proceso')
+            # 'sin_cache': true vuelve a consultar Drive aunque haya resultados guardados.
+            usar_cache = not body.get('sin_cache')
             if not isinstance(keys, list):
                 return JsonResponse({'success': False, 'message': 'Formato inválido: se esperaba una lista de keys'})
-            cantidad = len(keys)
-            resultados = []
-            def worker(key):
-                result = verificar_audio(key, tipo_proceso)
-                return {'key': key, 'resultado': result}
-            with ThreadPoolExecutor(max_workers= cantidad) as executor:
-                futures = [executor.submit(worker, key) for key in keys]
-                for future in futures:
-                    resultados.append(future.result())
+            if body.get('stream'):
+                # Una tarea por key para que cada línea llegue (y se mida) por
+                # separado; las carpetas se resuelven antes en una sola consulta.
+                precargar_carpetas(keys)
+                def worker(key):
+                    return [{'key': key, 'resultado': verificar_audios([key], tipo_proceso, usar_cache)[key]}]
+                return _respuesta_stream(DRIVE, worker, keys, '¡Audios Comprobados Correctamente!')
+            # Las keys se verifican por grupos: cada grupo es un par de peticiones batch.
+            grupos = [keys[i:i + 100] for i in range(0, len(keys), 100)]
+            verificados = {}
+            for parcial in get_scheduler().map(DRIVE, lambda grupo: verificar_audios(grupo, tipo_proceso, usar_cache), grupos, prioridad=LOTE):
+                verificados.update(parcial)
+            resultados = [{'key': key, 'resultado': verificados[key]} for key in keys]
             return JsonResponse({'success': True, 'message': '¡Audios Comprobados Correctamente!','resultados':resultados})
         except Exception as e:
             msg = _log_print("ERROR",f"{e}")
@@ -360,23 +384,25 @@ def comprobar_kfn(request):
             body = json.loads(request.body)
             canciones = body.get('data', [])
             tipo_proceso = body.get('tipo_proceso')
+            # 'sin_cache': true vuelve a leer cada KFN aunque haya resultados guardados.
+            usar_cache = not body.get('sin_cache')
             if not isinstance(canciones, list):
                 return JsonResponse({'success': False, 'message': 'Formato inválido: se esperaba una lista de canciones'})
-            cantidad = len(canciones)
-            resultados = []
             def worker(cancion):
                 key = cancion['key']
-                result = verificar_kfn(key, tipo_proceso)
+                result = verificar_kfn(key, tipo_proceso, usar_cache)
                 return {**cancion, "resultado": result}
-            with ThreadPoolExecutor(max_workers= cantidad) as executor:
-                futures = [executor.submit(worker, c) for c in canciones]
-                for future in futures:
-                    resultados.append(future.result())
-            # Filtrar solo canciones completas.
-            canciones_validas = [
-                {k: v for k, v in r.items() if k != "resultado"}
-                for r in resultados if r["resultado"]["success"]
-            ]
+            if body.get('async'):
+                job = get_job_manager().crear(
+                    'validarKFN', canciones, worker, CPU,
+                    key_fn=lambda c: c.get('key'),
+                    finalizar=lambda resultados: {'Cantidad': len(_canciones_validas(resultados)), 'data': _canciones_validas(resultados)}
+                )
+                return JsonResponse({'success': True, 'message': 'Validación iniciada.', 'job_id': job.id})
+            if body.get('stream'):
+                return _respuesta_stream(CPU, lambda cancion: [worker(cancion)], canciones, 'Validación completada')
+            resultados = get_scheduler().map(CPU, worker, canciones, prioridad=LOTE)
+            canciones_validas = _canciones_validas(resultados)
             msg = _log_print("INFO","Comprobación completada")
             logger.info(msg)
             return JsonResponse({
@@ -391,7 +417,12 @@ def comprobar_kfn(request):
             return JsonResponse({'success': False, 'message': str(e)})
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
 
-
+# Filtrar solo canciones completas.
+def _canciones_validas(resultados):
+    return [
+        {k: v for k, v in r.items() if k != "resultado"}
+        for r in resultados if r.get("resultado", {}).get("success")
+    ]
 
 @csrf_exempt
 def terminar_canciones(request):
@@ -401,15 +432,19 @@ def terminar_canciones(request):
             keys = body.get('keys', [])
             if not isinstance(keys, list):
                 return JsonResponse({'success': False, 'message': 'Formato inválido: se esperaba una lista de keys'})
-            cantidad = len(keys)
-            resultados = []
             def worker(key):
                 result = finalizar_karaoke(key)
                 return {'key': key, 'resultado': result}
-            with ThreadPoolExecutor(max_workers= cantidad) as executor:
-                futures = [executor.submit(worker, key) for key in keys]
-                for future in futures:
-                    resultados.append(future.result())
+            precargar_carpetas(keys)
+            if body.get('async'):
+                job = get_job_manager().crear('terminarCancion', keys, worker, DRIVE)
+                return JsonResponse({'success': True, 'message': 'Terminación de canciones iniciada.', 'job_id': job.id})
+            if body.get('stream'):
+                # Cada key se termina completa (con su propia actualización de
+                # Song.ini) para poder informarla en cuanto acaba.
+                return _respuesta_stream(DRIVE, lambda key: [worker(key)], keys, '¡Canciones Terminadas!')
+            # Song.ini de todas las canciones en una sola transacción.
+            resultados = finalizar_karaokes(keys, prioridad=LOTE)
             return JsonResponse({'success': True, 'message': '¡Canciones Terminadas!','resultados':resultados})
         except Exception as e:
             msg = _log_print("ERROR",f"{e}")
@@ -417,4 +452,111 @@ def terminar_canciones(request):
             return JsonResponse({'success': False, 'message': str(e)})
     return JsonResponse({'success': False, 'message': 'Método no permitido'})
 
+# Modo stream de los endpoints por lotes ('stream': true): respuesta NDJSON con
+# una línea por key en el orden en que terminan, con su duración en 'ms', y
+# una línea final {'resumen': true, ...}. `worker` devuelve la lista de líneas
+# de cada elemento (un grupo de keys puede producir varias).
+def _respuesta_stream(lane, worker, items, message) -> StreamingHttpResponse:
+    def lineas():
+        inicio = time.monotonic()
+        total, correctas = 0, 0
+        try:
+            for _, resultado, segundos in get_scheduler().as_completed(lane, worker, items, prioridad=LOTE):
+                for linea in resultado:
+                    total += 1
+                    if linea.get('resultado', {}).get('success'):
+                        correctas += 1
+                    yield {**linea, 'ms': round(segundos * 1000, 1)}
+        except Exception as e:
+            msg = _log_print("ERROR",f"{e}")
+            logger.error(msg)
+            yield {'resumen': True, 'success': False, 'message': str(e), 'total': total, 'correctas': correctas,
+                   'ms': round((time.monotonic() - inicio) * 1000, 1)}
+            return
+        yield {'resumen': True, 'success': True, 'message': message, 'total': total, 'correctas': correctas,
+               'ms': round((time.monotonic() - inicio) * 1000, 1)}
+    return StreamingHttpResponse(
+        (json.dumps(linea, ensure_ascii=False) + "\n" for linea in lineas()),
+        content_type='application/x-ndjson'
+    )
+
+def estado_scheduler(request):
+    return JsonResponse({
+        'success': True,
+        'lanes': get_scheduler().metricas(),
+        'single_flight': get_single_flight().metricas(),
+        'ancho_banda_lote': get_limite_lote().metricas(),
+        'cache_resultados': metricas_cache_resultados(),
+    })
+
+# Métricas en formato de texto de Prometheus (latencias por URL, Drive, base
+# de datos, KFN, carriles del planificador y jobs).
+def metricas(request):
+    return HttpResponse(metrics.exponer(), content_type=metrics.CONTENT_TYPE)
+
+# Ajusta en caliente el ancho de banda (MB/s) de las transferencias por lotes.
+@csrf_exempt
+def ajustar_ancho_banda(request):
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body)
+            mb_s = float(body.get('mb_s', 0))
+            if mb_s < 0:
+                return JsonResponse({'success': False, 'message': 'El ancho de banda no puede ser negativo.'})
+            get_limite_lote().ajustar(mb_s)
+            return JsonResponse({'success': True, 'ancho_banda_lote': get_limite_lote().metricas()})
+        except Exception as e:
+            msg = _log_print("ERROR",f"{e}")
+            logger.error(msg)
+            return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+
+def estado_drive(request):
+    return JsonResponse({
+        'success': True,
+        'clientes': get_drive_provider().metricas(),
+        'transferencia': get_sync_totales().to_dict(),
+        'control': get_drive_control().metricas(),
+    })
+
+def estado_db(request):
+    return JsonResponse({
+        'success': True,
+        'pool': get_db_pool().metricas(),
+        'parametros': CancionRepository.metricas_parametros(),
+    })
+
+@csrf_exempt
+def estado_job(request):
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body)
+            job = get_job_manager().obtener(body.get('job_id'))
+            if job is None:
+                return JsonResponse({'success': False, 'message': 'No se encontró el proceso.'})
+            return JsonResponse({'success': True, 'job': job.to_dict(detalle=body.get('detalle', True))})
+        except Exception as e:
+            msg = _log_print("ERROR",f"{e}")
+            logger.error(msg)
+            return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+
+@csrf_exempt
+def cancelar_job(request):
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body)
+            job = get_job_manager().obtener(body.get('job_id'))
+            if job is None:
+                return JsonResponse({'success': False, 'message': 'No se encontró el proceso.'})
+            if not job.cancelar():
+                return JsonResponse({'success': False, 'message': 'El proceso ya terminó.'})
+            return JsonResponse({'success': True, 'message': 'Cancelación solicitada.'})
+        except Exception as e:
+            msg = _log_print("ERROR",f"{e}")
+            logger.error(msg)
+            return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({'success': False, 'message': 'Método no permitido'})
 
+def listar_jobs(request):
+    return JsonResponse({'success': True, 'jobs': get_job_manager().listar()})
@@ -0,0 +1,139 @@
+import json
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from karafun_manager import views
+from karafun_manager.repositories.cancion_repository import CancionRepository
+from karafun_manager.repositories.db_pool import get_db_pool, metricas_async_db_pool
+from karafun_manager.utils.async_io import en_hilo, en_carril, map_carril, iterar_en_hilo, metricas as metricas_async
+from karafun_manager.utils.drive_manager import search_kfn, download_k, precargar_carpetas
+from karafun_manager.utils.print import _log_print
+from karafun_manager.utils.scheduler import get_scheduler, DRIVE, DISK
+from karafun_manager.utils.prioridad import LOTE, get_limite_lote
+from karafun_manager.utils.single_flight import get_single_flight
+from karafun_manager.utils.result_cache import metricas as metricas_cache_resultados
+import logging
+from karafun_manager.utils import logs
+logger = logging.getLogger(__name__)
+
+# Versiones async de las vistas para servir con ASGI (ver ms_karafun/asgi.py).
+# La lógica y los mensajes son los de views.py (sus pasos compartidos); aquí
+# solo se espera en el event loop: el trabajo de Drive/disco va a su carril
+# del planificador y la base de datos usa psycopg async. El resto delega la
+# vista síncrona en un hilo acotado (async_io.en_hilo).
+
+# Envuelve una vista síncrona para ejecutarla fuera del event loop. Las
+# respuestas en stream se recorren también desde hilos: Django consumiría un
+# iterador síncrono completo antes de enviar la primera línea.
+def _en_hilo(vista):
+    @csrf_exempt
+    async def vista_async(request):
+        respuesta = await en_hilo(vista, request)
+        if respuesta.streaming and not respuesta.is_async:
+            respuesta.streaming_content = iterar_en_hilo(respuesta.streaming_content)
+        return respuesta
+    vista_async.__name__ = vista.__name__
+    return vista_async
+
+async def check_connection(request):
+    return JsonResponse({'status': True})
+
+@csrf_exempt
+async def sync_drive(request):
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body)
+            keys = body.get('keys', [])
+            if not isinstance(keys, list):
+                return JsonResponse({'success': False, 'message': 'Formato inválido: se esperaba una lista de keys'})
+            if body.get('modo') == 'delta':
+                return JsonResponse(await en_hilo(views.sincronizar_cambios_lote, keys))
+            await en_carril(DRIVE, precargar_carpetas, keys)
+            if body.get('async'):
+                return JsonResponse(views.iniciar_sync_job(keys))
+            return JsonResponse(views.resumen_sync(await map_carril(DRIVE, views.sincronizar_key, keys, prioridad=LOTE)))
+        except Exception as e:
+            msg = _log_print("ERROR",f"{e}")
+            logger.error(msg)
+            return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+
+@csrf_exempt
+async def abrir_karafun(request):
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body)
+            return JsonResponse(await en_carril(DRIVE, views.abrir_kfn, body.get('key')))
+        except Exception as e:
+            msg = _log_print("ERROR",f"{e}")
+            logger.error(msg)
+            return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+
+@csrf_exempt
+async def crear_karafun(request):
+    if request.method == 'POST':
+        try:
+            repo = CancionRepository()
+            body = json.loads(request.body)
+            datos = await repo.get_song_ini_async(body.get('cancion_id'))
+            if not datos:
+                return JsonResponse(views.sin_song_ini())
+            result = await en_carril(DISK, views.generar_karafun, views.armar_cancion(body, datos))
+            if result[0] == "0":  # Éxito
+                # Actualizar porcentaje a 40%
+                await repo.update_porcentaje_avance_async(cancion_id=body.get('cancion_id'), porcentaje=40)
+                await en_carril(DRIVE, search_kfn, body.get('key'))
+            return JsonResponse(views.respuesta_karafun(result))
+        except Exception as e:
+            msg = _log_print("ERROR",f"{e}")
+            logger.error(msg)
+            return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+
+@csrf_exempt
+async def download_karaoke(request):
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body)
+            return JsonResponse(await en_carril(DRIVE, download_k, body.get('key'), body.get('drive_id'), body.get('tipo')))
+        except Exception as e:
+            msg = _log_print("ERROR",f"{e}")
+            logger.error(msg)
+            return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({'success': False, 'message': 'Método no permitido'})
+
+async def estado_scheduler(request):
+    return JsonResponse({
+        'success': True,
+        'lanes': get_scheduler().metricas(),
+        'single_flight': get_single_flight().metricas(),
+        'ancho_banda_lote': get_limite_lote().metricas(),
+        'cache_resultados': metricas_cache_resultados(),
+        'hilos_async': metricas_async(),
+    })
+
+async def estado_db(request):
+    return JsonResponse({
+        'success': True,
+        'pool': get_db_pool().metricas(),
+        'pool_async': metricas_async_db_pool(),
+        'parametros': CancionRepository.metricas_parametros(),
+    })
+
+subir_karafun = _en_hilo(views.subir_karafun)
+delete_karaoke = _en_hilo(views.delete_karaoke)
+abrir_audacity = _en_hilo(views.abrir_audacity)
+manipular_karafun = _en_hilo(views.manipular_karafun)
+recrear_karafun = _en_hilo(views.recrear_karafun)
+abrir_carpeta = _en_hilo(views.abrir_carpeta)
+ver_archivos = _en_hilo(views.ver_archivos)
+delete_carpeta = _en_hilo(views.delete_carpeta)
+comprobar_audio = _en_hilo(views.comprobar_audio)
+comprobar_kfn = _en_hilo(views.comprobar_kfn)
+terminar_canciones = _en_hilo(views.terminar_canciones)
+ajustar_ancho_banda = _en_hilo(views.ajustar_ancho_banda)
+estado_drive = _en_hilo(views.estado_drive)
+estado_job = _en_hilo(views.estado_job)
+cancelar_job = _en_hilo(views.cancelar_job)
+listar_jobs = _en_hilo(views.listar_jobs)
+metricas = _en_hilo(views.metricas)
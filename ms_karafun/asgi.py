@@ -5,12 +5,49 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Con ASGI se sirven las vistas async de karafun_manager/views_async.py:
+    uvicorn ms_karafun.asgi:application --host 127.0.0.1 --port 5000 --loop ms_karafun.asgi:selector_loop
+psycopg async no funciona con el ProactorEventLoop de Windows, por eso se
+indica el loop.
 """
 
+import asyncio
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ms_karafun.settings')
+os.environ.setdefault('VISTAS_ASYNC', 'true')
 
 application = get_asgi_application()
+
+# Los receptores síncronos de request_started hacen que Django reserve un hilo
+# durante toda la petición. Solo se quitan cuando se sirven las vistas async,
+# que no usan el ORM: las consultas van por los pools de psycopg. Sin
+# close_old_connections al empezar la petición, una conexión del ORM podría
+# quedar abierta y vencida entre peticiones, así que abrir una con ASGI es un
+# error en lugar de un fallo silencioso.
+from django.core import signals  # noqa: E402
+from django.core.exceptions import ImproperlyConfigured  # noqa: E402
+from django.db import close_old_connections, reset_queries  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from ms_karafun import config  # noqa: E402
+
+
+def _orm_no_soportado(sender, connection, **kwargs):
+    connection.close()
+    raise ImproperlyConfigured(
+        "El ORM de Django no se usa con ASGI (request_started no cierra las "
+        "conexiones viejas); usar los pools de psycopg del repositorio."
+    )
+
+
+if config.get_vistas_async():
+    signals.request_started.disconnect(reset_queries)
+    signals.request_started.disconnect(close_old_connections)
+    connection_created.connect(_orm_no_soportado)
+
+# Fábrica de event loop para uvicorn (--loop ms_karafun.asgi:selector_loop).
+def selector_loop() -> asyncio.AbstractEventLoop:
+    return asyncio.SelectorEventLoop()
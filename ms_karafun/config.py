@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 import environ
 
@@ -26,5 +27,87 @@ def get_path_img_fondo():
 def get_path_audacity():
     return env("PATH_AUDACITY", default="").strip()
 
+def get_path_kfn_index():
+    return env("PATH_KFN_INDEX", default="").strip() or os.path.join(get_path_main(), ".kfn_index.sqlite3")
+
+def get_path_hash_cache():
+    return env("PATH_HASH_CACHE", default="").strip() or os.path.join(get_path_main(), ".hash_cache.sqlite3")
+
+def get_path_drive_cursor():
+    return env("PATH_DRIVE_CURSOR", default="").strip() or os.path.join(get_path_main(), ".drive_changes.json")
+
+def get_path_jobs():
+    return env("PATH_JOBS", default="").strip()
+
+# Servidor de Drive alternativo (p. ej. benchmarks/fake_drive.py). Vacío: Google.
+def get_drive_api_endpoint():
+    return env("DRIVE_API_ENDPOINT", default="").strip()
+
+def get_pool_size(lane: str, default: int) -> int:
+    return env.int(f"POOL_{lane.upper()}", default=default)
+
+def get_db_pool_min() -> int:
+    return env.int("DB_POOL_MIN", default=1)
+
+def get_db_pool_max() -> int:
+    return env.int("DB_POOL_MAX", default=8)
+
+def get_db_pool_timeout() -> float:
+    return env.float("DB_POOL_TIMEOUT", default=30.0)
+
+def get_db_pool_max_lifetime() -> float:
+    return env.float("DB_POOL_MAX_LIFETIME", default=1800.0)
+
+def get_db_pool_max_idle() -> float:
+    return env.float("DB_POOL_MAX_IDLE", default=300.0)
+
+# Vistas async: las activa ms_karafun/asgi.py al servir con un servidor ASGI.
+def get_vistas_async() -> bool:
+    return env.bool("VISTAS_ASYNC", default=False)
+
+def get_async_hilos() -> int:
+    return env.int("ASYNC_HILOS", default=16)
+
+def get_result_cache_max() -> int:
+    return env.int("RESULT_CACHE_MAX", default=10000)
+
+def get_audio_cache_ttl() -> float:
+    return env.float("AUDIO_CACHE_TTL", default=120.0)
+
+def get_drive_rate() -> float:
+    return env.float("DRIVE_RATE", default=10.0)
+
+def get_drive_rate_min() -> float:
+    return env.float("DRIVE_RATE_MIN", default=1.0)
+
+def get_drive_rate_max() -> float:
+    return env.float("DRIVE_RATE_MAX", default=50.0)
+
+def get_drive_reintentos() -> int:
+    return env.int("DRIVE_REINTENTOS", default=5)
+
+def get_drive_breaker_fallos() -> int:
+    return env.int("DRIVE_BREAKER_FALLOS", default=5)
+
+def get_drive_breaker_espera() -> float:
+    return env.float("DRIVE_BREAKER_ESPERA", default=30.0)
+
+# Ancho de banda máximo (MB/s) de las transferencias por lotes; 0 = sin límite.
+def get_batch_mb_s() -> float:
+    return env.float("BATCH_MB_S", default=0.0)
+
+def get_upload_chunk_size() -> int:
+    # Drive exige múltiplos de 256 KB en las sesiones reanudables.
+    return env.int("UPLOAD_CHUNK_MB", default=8) * 1024 * 1024
+
+def get_download_chunk_size() -> int:
+    return env.int("DOWNLOAD_CHUNK_MB", default=8) * 1024 * 1024
+
+def get_download_partes() -> int:
+    return env.int("DOWNLOAD_PARTES", default=4)
+
+def get_download_umbral_paralelo() -> int:
+    return env.int("DOWNLOAD_UMBRAL_PARALELO_MB", default=64) * 1024 * 1024
+
 def reload_env():
     environ.Env.read_env(ENV_PATH, overwrite=True)
\ No newline at end of file